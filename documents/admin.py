@@ -1,6 +1,6 @@
 # documents/admin.py
 from django.contrib import admin
-from .models import DocumentTemplate, DocumentGenerationTask
+from .models import DocumentBlob, DocumentTemplate, DocumentGenerationTask
 
 @admin.register(DocumentTemplate)
 class DocumentTemplateAdmin(admin.ModelAdmin):
@@ -60,4 +60,11 @@ class DocumentGenerationTaskAdmin(admin.ModelAdmin):
             duration = obj.completed_at - obj.created_at
             return f"{duration.total_seconds():.1f}秒"
         return '-'
-    task_duration.short_description = '处理时长'
\ No newline at end of file
+    task_duration.short_description = '处理时长'
+
+
+@admin.register(DocumentBlob)
+class DocumentBlobAdmin(admin.ModelAdmin):
+    list_display = ['sha256', 'size', 'mime_type', 'page_count', 'ref_count', 'created_at']
+    search_fields = ['sha256']
+    readonly_fields = ['sha256', 'file', 'size', 'mime_type', 'page_count', 'ref_count', 'created_at']
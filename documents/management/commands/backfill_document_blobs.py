@@ -0,0 +1,32 @@
+# documents/management/commands/backfill_document_blobs.py
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from documents.models import DocumentGenerationTask
+from documents.services import blob_store
+
+class Command(BaseCommand):
+    help = 'Move documents generated before the content-addressed store into it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be moved without writing')
+
+    def handle(self, *args, **options):
+        legacy = DocumentGenerationTask.objects.filter(blob__isnull=True).exclude(
+            generated_file=''
+        ).exclude(generated_file__isnull=True)
+
+        stored = missing = 0
+        for name in legacy.values_list('generated_file', flat=True).distinct().order_by():
+            if options['dry_run']:
+                found = os.path.exists(os.path.join(settings.MEDIA_ROOT, name))
+            else:
+                found = blob_store.adopt_legacy_file(name) is not None
+            if found:
+                stored += 1
+            else:
+                missing += 1
+
+        verb = 'Would store' if options['dry_run'] else 'Stored'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {stored} files; {missing} missing on disk'))
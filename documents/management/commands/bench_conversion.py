@@ -0,0 +1,95 @@
+# documents/management/commands/bench_conversion.py
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.core.management.base import BaseCommand
+from documents.services import converters
+from documents.services.docx_renderer import DocxRenderer
+from documents.services.section_tokenizer import SectionTokenizer
+from .bench_section_parser import SENTENCES, TITLES
+
+
+def _convert_one(job):
+    """Convert one file and return the seconds it took (runs in a pool process)"""
+    source_path, target_format, output_path = job
+    start = time.perf_counter()
+    converters.convert(source_path, target_format, output_path)
+    return time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = 'Benchmark document format conversion throughput, serially and in a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=100)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+        parser.add_argument('--formats', default=','.join(converters.SUPPORTED_FORMATS),
+                            help='Comma-separated target formats')
+        parser.add_argument('--paragraphs', type=int, default=20,
+                            help='Body lines per section')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def _generate_documents(self, directory, count, paragraphs, seed):
+        rng = random.Random(seed)
+        paths = []
+        for n in range(count):
+            lines = []
+            for i, title in enumerate(TITLES, start=1):
+                lines.append(f"{i}. {title}")
+                lines.extend(rng.choice(SENTENCES) for _ in range(paragraphs))
+            renderer = DocxRenderer()
+            renderer.create_document()
+            renderer.render_sections(SectionTokenizer().tokenize('\n'.join(lines)))
+            path = os.path.join(directory, f"document_{n}.docx")
+            renderer.save_document(path)
+            renderer.close()
+            paths.append(path)
+        return paths
+
+    def _run(self, executor, sources, target_format, output_dir):
+        jobs = [
+            (source, target_format, os.path.join(output_dir, f"{i}.{target_format}"))
+            for i, source in enumerate(sources)
+        ]
+        start = time.perf_counter()
+        latencies = list(executor.map(_convert_one, jobs) if executor else map(_convert_one, jobs))
+        return time.perf_counter() - start, latencies
+
+    def _report(self, label, elapsed, latencies):
+        latencies = sorted(latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self.stdout.write(
+            f"  {label:<12} {elapsed:8.2f} s  {len(latencies) / elapsed:8.1f} docs/s  "
+            f"p50 {statistics.median(latencies) * 1000:8.1f} ms  p95 {p95 * 1000:8.1f} ms"
+        )
+
+    def handle(self, *args, **options):
+        formats = [f.strip() for f in options['formats'].split(',') if f.strip()]
+        if 'pdf' in formats and not shutil.which(converters.settings.LIBREOFFICE_BINARY):
+            self.stdout.write(self.style.WARNING('LibreOffice not found, skipping pdf'))
+            formats.remove('pdf')
+
+        workdir = tempfile.mkdtemp(prefix='bench_conversion_')
+        try:
+            sources = self._generate_documents(
+                workdir, options['documents'], options['paragraphs'], options['seed']
+            )
+            self.stdout.write(f"{len(sources)} documents, {options['workers']} workers")
+
+            # Pool processes set Django up themselves, so any start method works
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as executor:
+                for target_format in formats:
+                    self.stdout.write(f"{target_format}:")
+                    output_dir = tempfile.mkdtemp(dir=workdir)
+                    serial_time, serial_latencies = self._run(None, sources, target_format, output_dir)
+                    self._report('serial', serial_time, serial_latencies)
+                    pool_time, pool_latencies = self._run(executor, sources, target_format, output_dir)
+                    self._report('pool', pool_time, pool_latencies)
+                    self.stdout.write(self.style.SUCCESS(f"  Speedup: {serial_time / pool_time:.2f}x"))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,113 @@
+# documents/management/commands/bench_formulas.py
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from documents.services import formulas
+from documents.services.docx_renderer import DocxRenderer
+
+# Equations typical of generated academic papers (statistics, econometrics,
+# machine learning, physics), written the way the model tends to write them
+CORPUS = [
+    r'\bar{x} = \frac{1}{n}\sum_{i=1}^{n} x_i',
+    r's^2 = \frac{1}{n-1}\sum_{i=1}^{n} (x_i - \bar{x})^2',
+    r'\sigma = \sqrt{\frac{1}{N}\sum_{i=1}^{N} (x_i - \mu)^2}',
+    r'y_i = \beta_0 + \beta_1 x_i + \varepsilon_i',
+    r'Y = X\beta + \varepsilon',
+    r'\hat{\beta} = (X^T X)^{-1} X^T Y',
+    r'R^2 = 1 - \frac{\sum_{i}(y_i - \hat{y}_i)^2}{\sum_{i}(y_i - \bar{y})^2}',
+    r't = \frac{\bar{x} - \mu_0}{s / \sqrt{n}}',
+    r'\chi^2 = \sum_{i=1}^{k} \frac{(O_i - E_i)^2}{E_i}',
+    r'r = \frac{\sum (x_i - \bar{x})(y_i - \bar{y})}{\sqrt{\sum (x_i - \bar{x})^2 \sum (y_i - \bar{y})^2}}',
+    r'f(x) = \frac{1}{\sigma\sqrt{2\pi}} e^{-\frac{(x-\mu)^2}{2\sigma^2}}',
+    r'P(A \mid B) = \frac{P(B \mid A) P(A)}{P(B)}',
+    r'\mathbb{E}[X] = \int_{-\infty}^{\infty} x f(x)\,dx',
+    r'\mathrm{Var}(X) = \mathbb{E}[X^2] - (\mathbb{E}[X])^2',
+    r'L(\theta) = \prod_{i=1}^{n} f(x_i \mid \theta)',
+    r'\ln L(\theta) = \sum_{i=1}^{n} \ln f(x_i \mid \theta)',
+    r'\sigma(z) = \frac{1}{1 + e^{-z}}',
+    r'J(\theta) = -\frac{1}{m}\sum_{i=1}^{m} \left[ y^{(i)} \log h_\theta(x^{(i)}) + (1 - y^{(i)}) \log (1 - h_\theta(x^{(i)})) \right]',
+    r'\theta_{t+1} = \theta_t - \eta \nabla_\theta J(\theta_t)',
+    r'\mathrm{softmax}(z)_j = \frac{e^{z_j}}{\sum_{k=1}^{K} e^{z_k}}',
+    r'F1 = 2 \cdot \frac{\mathrm{precision} \cdot \mathrm{recall}}{\mathrm{precision} + \mathrm{recall}}',
+    r'NPV = \sum_{t=0}^{T} \frac{CF_t}{(1+r)^t}',
+    r'CAGR = \left(\frac{V_f}{V_i}\right)^{\frac{1}{n}} - 1',
+    r'\lim_{n \to \infty} \left(1 + \frac{1}{n}\right)^n = e',
+    r'E = mc^2',
+    r'F = G\frac{m_1 m_2}{r^2}',
+    r'\nabla \cdot \mathbf{E} = \frac{\rho}{\varepsilon_0}',
+    r'A = \begin{pmatrix} a_{11} & a_{12} \\ a_{21} & a_{22} \end{pmatrix}',
+    r'f(x) = \begin{cases} x^2 & x \geq 0 \\ -x & x < 0 \end{cases}',
+    r'x = \frac{-b \pm \sqrt{b^2 - 4ac}}{2a}',
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark LaTeX to OMML formula conversion, with and without the equation cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=500)
+        parser.add_argument('--formulas', type=int, default=8,
+                            help='Formulas per document')
+        parser.add_argument('--skew', type=float, default=1.2,
+                            help='Zipf exponent of how often each corpus equation recurs')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def _workload(self, options):
+        """Formula lists per document; popular equations recur, with spacing variations"""
+        rng = random.Random(options['seed'])
+        weights = [1 / (rank ** options['skew']) for rank in range(1, len(CORPUS) + 1)]
+        documents = []
+        for _ in range(options['documents']):
+            picks = rng.choices(CORPUS, weights=weights, k=options['formulas'])
+            documents.append([f"$ {latex} $" if rng.random() < 0.3 else latex for latex in picks])
+        return documents
+
+    def _run(self, documents, convert):
+        latencies = []
+        start = time.perf_counter()
+        for document in documents:
+            document_start = time.perf_counter()
+            for latex in document:
+                convert(latex)
+            latencies.append(time.perf_counter() - document_start)
+        return time.perf_counter() - start, latencies
+
+    def _report(self, label, elapsed, latencies, count):
+        latencies = sorted(latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self.stdout.write(
+            f"  {label:<12} {elapsed * 1000:9.1f} ms  {count / elapsed:10.0f} formulas/s  "
+            f"doc p50 {statistics.median(latencies) * 1e6:8.1f} us  p95 {p95 * 1e6:8.1f} us"
+        )
+
+    def handle(self, *args, **options):
+        # Every corpus equation must convert; a failure here is a converter regression
+        for latex in CORPUS:
+            formulas.latex_to_omml(latex)
+
+        documents = self._workload(options)
+        count = sum(len(document) for document in documents)
+        self.stdout.write(f"{len(documents)} documents, {count} formulas, {len(CORPUS)} distinct equations")
+
+        uncached = lambda latex: formulas._convert(formulas.normalize_latex(latex))
+        uncached_time, uncached_latencies = self._run(documents, uncached)
+        self._report('uncached', uncached_time, uncached_latencies, count)
+
+        formulas.clear_formula_cache()
+        cached_time, cached_latencies = self._run(documents, formulas.latex_to_omml)
+        self._report('cached', cached_time, cached_latencies, count)
+        info = formulas.formula_cache_info()
+        self.stdout.write(f"  Cache: {info.hits} hits, {info.misses} misses "
+                          f"({info.hits / max(1, info.hits + info.misses):.1%} hit rate)")
+        self.stdout.write(self.style.SUCCESS(f"  Speedup: {uncached_time / cached_time:.2f}x"))
+
+        # Embedding cost, for scale: one document's formulas into a .docx
+        renderer = DocxRenderer()
+        renderer.create_document()
+        renderer.insert_content('\n'.join('[公式位置]' for _ in documents[0]))
+        start = time.perf_counter()
+        renderer.embed_formulas([formulas.latex_to_omml(latex) for latex in documents[0]])
+        self.stdout.write(f"  Embedding {len(documents[0])} formulas in a document: "
+                          f"{(time.perf_counter() - start) * 1000:.2f} ms")
+        renderer.close()
@@ -0,0 +1,110 @@
+# documents/management/commands/bench_section_parser.py
+import random
+import time
+from django.core.management.base import BaseCommand
+from documents.services.section_tokenizer import SectionTokenizer
+
+HEADING_STYLES = [
+    lambda i, title: f"{i}. {title}",
+    lambda i, title: f"## {title}",
+    lambda i, title: f"{'一二三四五六七八九十'[i % 10]}、{title}",
+    lambda i, title: title,
+]
+
+TITLES = ['摘要', '引言', '文献综述', '研究方法', '研究结果', '讨论与分析', '结论', '参考文献']
+
+SENTENCES = [
+    '本研究通过问卷调查收集了大量样本数据，并采用多元回归方法进行分析。',
+    '结果表明，该因素对整体绩效具有显著的正向影响。[图表位置]',
+    'The findings suggest a strong correlation between the two variables.',
+    '模型的拟合优度较高，说明变量选择合理。[公式位置]',
+    '从结论来看，相关政策仍有进一步优化的空间。',
+]
+
+
+def _legacy_parse(content):
+    """The keyword-scan parser and statistics this benchmark compares against"""
+    sections = []
+    current_section = {'title': '', 'content': '', 'is_heading': False}
+    for line in content.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        if (any(keyword in line for keyword in ['摘要', '引言', '结论', '参考文献',
+                                              'Abstract', 'Introduction', 'Conclusion', 'References']) and
+            len(line) < 100):
+            if current_section['content']:
+                sections.append(current_section.copy())
+            current_section = {'title': line, 'content': '', 'is_heading': True}
+        else:
+            current_section['content'] += line + '\n'
+            current_section['is_heading'] = False
+    if current_section['content']:
+        sections.append(current_section)
+
+    # Statistics, as generate_document_task used to compute them afterwards
+    len(content.split())
+    content.count('[图表位置]') + content.count('[CHART LOCATION]')
+    content.count('[公式位置]') + content.count('[FORMULA LOCATION]')
+
+    for section in sections:
+        title = section['title']
+        if any(keyword in title for keyword in ['摘要', 'Abstract', '引言', 'Introduction', '结论', 'Conclusion']):
+            section['level'] = 1
+        elif any(keyword in title for keyword in ['文献综述', '研究方法', '研究结果', '讨论',
+                                                'Literature Review', 'Methodology', 'Findings', 'Discussion']):
+            section['level'] = 2
+        else:
+            section['level'] = 3
+    return sections
+
+
+class Command(BaseCommand):
+    help = 'Benchmark section parsing and statistics over generated documents'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=1000)
+        parser.add_argument('--paragraphs', type=int, default=40,
+                            help='Body lines per section')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def _generate_documents(self, count, paragraphs, seed):
+        rng = random.Random(seed)
+        documents = []
+        for _ in range(count):
+            style = rng.choice(HEADING_STYLES)
+            lines = []
+            for i, title in enumerate(TITLES, start=1):
+                lines.append(style(i, title))
+                lines.extend(rng.choice(SENTENCES) for _ in range(paragraphs))
+            documents.append('\n'.join(lines))
+        return documents
+
+    def _time(self, parse, documents):
+        start = time.perf_counter()
+        sections = 0
+        for content in documents:
+            sections += len(parse(content))
+        return time.perf_counter() - start, sections
+
+    def handle(self, *args, **options):
+        documents = self._generate_documents(
+            options['documents'], options['paragraphs'], options['seed']
+        )
+        total_chars = sum(len(content) for content in documents)
+        self.stdout.write(
+            f"{len(documents)} documents, {total_chars / len(documents):.0f} characters each"
+        )
+
+        results = [
+            ('legacy keyword scan', self._time(_legacy_parse, documents)),
+            ('compiled tokenizer', self._time(lambda c: SectionTokenizer().tokenize(c), documents)),
+        ]
+        for name, (elapsed, sections) in results:
+            self.stdout.write(
+                f"{name:<20} {elapsed * 1000:9.1f} ms total  "
+                f"{elapsed / len(documents) * 1e6:8.1f} us/doc  {sections} sections"
+            )
+
+        legacy_time, tokenizer_time = results[0][1][0], results[1][1][0]
+        self.stdout.write(self.style.SUCCESS(f"Speedup: {legacy_time / tokenizer_time:.2f}x"))
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-17 09:00
+
+import hashlib
+from django.db import migrations, models
+
+
+def backfill_template_hashes(apps, schema_editor):
+    DocumentTemplate = apps.get_model('documents', 'DocumentTemplate')
+    for template in DocumentTemplate.objects.exclude(file_path='').filter(file_hash=''):
+        try:
+            with template.file_path.open('rb') as f:
+                file_hash = hashlib.sha256(f.read()).hexdigest()
+        except (OSError, ValueError):
+            continue
+        DocumentTemplate.objects.filter(pk=template.pk).update(file_hash=file_hash)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documenttemplate',
+            name='file_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.RunPython(backfill_template_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.7 on 2026-10-17 10:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import documents.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('documents', '0002_documenttemplate_file_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentGenerationBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group_id', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': '批量生成任务',
+                'verbose_name_plural': '批量生成任务',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='documentgenerationtask',
+            options={'ordering': ['-created_at'], 'verbose_name': '文档生成任务', 'verbose_name_plural': '文档生成任务'},
+        ),
+        migrations.AddField(
+            model_name='documentgenerationtask',
+            name='file_format',
+            field=models.CharField(default='docx', max_length=10, verbose_name='文件格式'),
+        ),
+        migrations.AddField(
+            model_name='documentgenerationtask',
+            name='file_size',
+            field=models.BigIntegerField(default=0, verbose_name='文件大小'),
+        ),
+        migrations.AlterField(
+            model_name='documentgenerationtask',
+            name='generated_file',
+            field=models.FileField(blank=True, null=True, upload_to=documents.models.document_upload_path, verbose_name='生成的文件'),
+        ),
+        migrations.AddField(
+            model_name='documentgenerationtask',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tasks', to='documents.documentgenerationbatch'),
+        ),
+    ]
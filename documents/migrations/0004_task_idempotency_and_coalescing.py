@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('documents', '0003_documentgenerationbatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentgenerationtask',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='documentgenerationtask',
+            name='request_fingerprint',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='documentgenerationtask',
+            name='coalesced_into',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='coalesced_tasks', to='documents.documentgenerationtask'),
+        ),
+        migrations.AddConstraint(
+            model_name='documentgenerationtask',
+            constraint=models.UniqueConstraint(condition=models.Q(('idempotency_key', ''), _negated=True), fields=('user', 'idempotency_key'), name='unique_task_idempotency_key'),
+        ),
+    ]
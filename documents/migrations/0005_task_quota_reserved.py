@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0004_task_idempotency_and_coalescing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentgenerationtask',
+            name='quota_reserved',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0005_task_quota_reserved'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentgenerationtask',
+            name='quota_period_start',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
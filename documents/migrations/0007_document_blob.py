@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0006_task_quota_period_start'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('file', models.FileField(upload_to='blobs/', verbose_name='文件')),
+                ('size', models.BigIntegerField(default=0, verbose_name='文件大小')),
+                ('mime_type', models.CharField(max_length=100, verbose_name='MIME类型')),
+                ('page_count', models.IntegerField(blank=True, null=True, verbose_name='页数')),
+                ('ref_count', models.PositiveIntegerField(default=0, verbose_name='引用数')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': '文档文件',
+                'verbose_name_plural': '文档文件',
+            },
+        ),
+        migrations.AddField(
+            model_name='documentgenerationtask',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='tasks', to='documents.documentblob'),
+        ),
+    ]
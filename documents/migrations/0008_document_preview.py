@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0007_document_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentPreview',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('html_gz', models.BinaryField()),
+                ('text_gz', models.BinaryField()),
+                ('version', models.PositiveSmallIntegerField(default=1)),
+                ('created_at', models.DateTimeField(auto_now=True)),
+                ('blob', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='preview', to='documents.documentblob')),
+            ],
+            options={
+                'verbose_name': '文档预览',
+                'verbose_name_plural': '文档预览',
+            },
+        ),
+    ]
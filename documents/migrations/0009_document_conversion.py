@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-17 13:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0008_document_preview'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentConversion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target_format', models.CharField(max_length=10, verbose_name='目标格式')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('error_message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('output', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='documents.documentblob')),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversions', to='documents.documentblob')),
+            ],
+            options={
+                'verbose_name': '格式转换',
+                'verbose_name_plural': '格式转换',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='documentconversion',
+            constraint=models.UniqueConstraint(fields=('source', 'target_format'), name='unique_blob_conversion'),
+        ),
+    ]
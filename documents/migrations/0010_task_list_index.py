@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 13:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0009_document_conversion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='documentgenerationtask',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='task_user_created_idx'),
+        ),
+    ]
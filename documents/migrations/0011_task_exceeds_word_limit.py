@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0010_task_list_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentgenerationtask',
+            name='exceeds_word_limit',
+            field=models.BooleanField(default=False),
+        ),
+    ]
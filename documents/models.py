@@ -2,6 +2,8 @@
 from django.db import models
 from django.conf import settings
 
+import hashlib
+import json
 import os
 import uuid
 from django.db import models
@@ -25,12 +27,102 @@ class DocumentTemplate(models.Model):
     template_type = models.CharField(max_length=20, choices=TEMPLATE_TYPES)
     description = models.TextField(blank=True)
     file_path = models.FileField(upload_to='templates/')
+    file_hash = models.CharField(max_length=64, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return self.name
 
+class DocumentBlob(models.Model):
+    """A generated file stored once under its content hash, shared by every task that produced it"""
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to='blobs/', verbose_name="文件")
+    size = models.BigIntegerField(default=0, verbose_name="文件大小")
+    mime_type = models.CharField(max_length=100, verbose_name="MIME类型")
+    page_count = models.IntegerField(null=True, blank=True, verbose_name="页数")
+    ref_count = models.PositiveIntegerField(default=0, verbose_name="引用数")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "文档文件"
+        verbose_name_plural = "文档文件"
+
+    def __str__(self):
+        return self.sha256
+
+class DocumentPreview(models.Model):
+    """Gzipped HTML rendition and text excerpt of a stored document"""
+    blob = models.OneToOneField(DocumentBlob, on_delete=models.CASCADE, related_name='preview')
+    html_gz = models.BinaryField()
+    text_gz = models.BinaryField()
+    version = models.PositiveSmallIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "文档预览"
+        verbose_name_plural = "文档预览"
+
+class DocumentConversion(models.Model):
+    """A document converted to another format, stored as a blob of its own"""
+    PENDING = 'pending'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (COMPLETED, 'Completed'),
+        (FAILED, 'Failed'),
+    ]
+
+    source = models.ForeignKey(DocumentBlob, on_delete=models.CASCADE, related_name='conversions')
+    target_format = models.CharField(max_length=10, verbose_name="目标格式")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    output = models.ForeignKey(
+        DocumentBlob,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    error_message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "格式转换"
+        verbose_name_plural = "格式转换"
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'target_format'], name='unique_blob_conversion'),
+        ]
+
+class DocumentGenerationBatch(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    group_id = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "批量生成任务"
+        verbose_name_plural = "批量生成任务"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Batch {self.id}"
+
+    def get_progress(self):
+        """Aggregate task statuses for the whole batch in one query"""
+        counts = {status: 0 for status, _ in DocumentGenerationTask.STATUS_CHOICES}
+        for row in self.tasks.values('status').annotate(count=models.Count('id')):
+            counts[row['status']] = row['count']
+
+        total = sum(counts.values())
+        done = counts[DocumentGenerationTask.COMPLETED] + counts[DocumentGenerationTask.FAILED]
+        return {
+            'total': total,
+            'counts': counts,
+            'percent': int(done * 100 / total) if total else 0,
+            'finished': total > 0 and done == total,
+        }
+
 class DocumentGenerationTask(models.Model):
     PENDING = 'pending'
     PROCESSING = 'processing'
@@ -51,7 +143,38 @@ class DocumentGenerationTask(models.Model):
     word_count = models.IntegerField(default=0)
     charts_count = models.IntegerField(default=0)
     formulas_count = models.IntegerField(default=0)
+    # Set when the measured word_count is over the plan's max_words_per_document
+    exceeds_word_limit = models.BooleanField(default=False)
     error_message = models.TextField(blank=True)
+    batch = models.ForeignKey(
+        DocumentGenerationBatch,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='tasks'
+    )
+    blob = models.ForeignKey(
+        DocumentBlob,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='tasks'
+    )
+    # Set while the task holds reserved quota (in the billing period starting
+    # at quota_period_start), cleared when it is committed or released
+    quota_reserved = models.BooleanField(default=False)
+    quota_period_start = models.DateTimeField(null=True, blank=True)
+    # Client-supplied Idempotency-Key and a hash of the request, used to
+    # replay retries and to coalesce identical in-flight requests
+    idempotency_key = models.CharField(max_length=255, blank=True)
+    request_fingerprint = models.CharField(max_length=64, blank=True, db_index=True)
+    coalesced_into = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='coalesced_tasks'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
 
@@ -72,4 +195,38 @@ class DocumentGenerationTask(models.Model):
     class Meta:
         verbose_name = "文档生成任务"
         verbose_name_plural = "文档生成任务"
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+        indexes = [
+            # Serves the keyset-paginated task lists
+            models.Index(fields=['user', '-created_at', '-id'], name='task_user_created_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'idempotency_key'],
+                condition=~models.Q(idempotency_key=''),
+                name='unique_task_idempotency_key',
+            ),
+        ]
+
+    @staticmethod
+    def make_fingerprint(topic, requirements):
+        """Hash what determines the generated document"""
+        payload = json.dumps({'topic': topic.strip(), 'requirements': requirements},
+                             sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def propagate_result(self):
+        """Copy this task's outcome to the requests that were coalesced into it"""
+        return self.coalesced_tasks.update(
+            status=self.status,
+            generated_file=self.generated_file.name if self.generated_file else None,
+            blob=self.blob_id,
+            file_size=self.file_size,
+            file_format=self.file_format,
+            word_count=self.word_count,
+            charts_count=self.charts_count,
+            formulas_count=self.formulas_count,
+            exceeds_word_limit=self.exceeds_word_limit,
+            error_message=self.error_message,
+            completed_at=self.completed_at,
+        )
\ No newline at end of file
@@ -0,0 +1,45 @@
+# documents/routing.py
+from django.conf import settings
+from subscriptions.models import SubscriptionPlan, UserSubscription
+
+PRIORITY_QUEUE = 'priority'
+STANDARD_QUEUE = 'standard'
+FREE_QUEUE = 'free'
+
+# Priority within a queue, 0-9 with higher meaning more urgent
+TIER_PRIORITIES = {
+    SubscriptionPlan.ENTERPRISE: 9,
+    SubscriptionPlan.PROFESSIONAL: 7,
+    SubscriptionPlan.BASIC: 5,
+    SubscriptionPlan.FREE: 0,
+}
+
+
+def _broker_priority(priority):
+    """Translate to the broker's priority order
+
+    AMQP serves higher numbers first; the Redis transport serves priority
+    step 0 first, so the scale is inverted there.
+    """
+    broker_url = getattr(settings, 'CELERY_BROKER_URL', '') or ''
+    if broker_url.startswith(('redis://', 'rediss://')):
+        return 9 - priority
+    return priority
+
+
+def route_for_plan(plan):
+    """Return apply_async routing options for a subscription plan (or None)"""
+    if plan is None or plan.tier == SubscriptionPlan.FREE:
+        return {'queue': FREE_QUEUE, 'priority': _broker_priority(TIER_PRIORITIES[SubscriptionPlan.FREE])}
+
+    queue = PRIORITY_QUEUE if plan.priority_processing else STANDARD_QUEUE
+    priority = TIER_PRIORITIES.get(plan.tier, TIER_PRIORITIES[SubscriptionPlan.BASIC])
+    return {'queue': queue, 'priority': _broker_priority(priority)}
+
+
+def get_task_route(user):
+    """Pick the queue and priority for a user's generation task"""
+    subscription = UserSubscription.objects.select_related('plan').filter(user=user).first()
+    if subscription is None or not subscription.is_active():
+        return route_for_plan(None)
+    return route_for_plan(subscription.plan)
@@ -1,6 +1,8 @@
 # documents/serializers.py
 from rest_framework import serializers
-from .models import DocumentTemplate, DocumentGenerationTask
+from django.conf import settings
+from utils.pagination import ListQuerySerializer
+from .models import DocumentTemplate, DocumentGenerationTask, DocumentGenerationBatch
 
 class DocumentTemplateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -8,12 +10,21 @@ class DocumentTemplateSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'template_type', 'description', 'is_active']
 
 class DocumentGenerationTaskSerializer(serializers.ModelSerializer):
+    file_hash = serializers.CharField(source='blob.sha256', read_only=True, default=None)
+    mime_type = serializers.CharField(source='blob.mime_type', read_only=True, default=None)
+    page_count = serializers.IntegerField(source='blob.page_count', read_only=True, default=None)
+
     class Meta:
         model = DocumentGenerationTask
         fields = ['id', 'topic', 'requirements', 'status', 'word_count', 
-                 'charts_count', 'formulas_count', 'created_at', 'completed_at']
+                 'charts_count', 'formulas_count', 'exceeds_word_limit', 'coalesced_into', 'file_size', 'file_format',
+                 'file_hash', 'mime_type', 'page_count', 'created_at', 'completed_at']
         read_only_fields = ['id', 'status', 'word_count', 'charts_count', 
-                          'formulas_count', 'created_at', 'completed_at']
+                          'formulas_count', 'exceeds_word_limit', 'coalesced_into', 'file_size', 'file_format',
+                          'created_at', 'completed_at']
+
+class DocumentTaskListQuerySerializer(ListQuerySerializer):
+    status = serializers.ChoiceField(choices=DocumentGenerationTask.STATUS_CHOICES, required=False)
 
 class DocumentGenerationRequestSerializer(serializers.Serializer):
     topic = serializers.CharField(max_length=500)
@@ -22,8 +33,41 @@ class DocumentGenerationRequestSerializer(serializers.Serializer):
     include_charts = serializers.BooleanField(default=True)
     include_formulas = serializers.BooleanField(default=True)
     language = serializers.ChoiceField(choices=[('zh', 'Chinese'), ('en', 'English')], default='zh')
+    use_cache = serializers.BooleanField(default=True)
     
     def validate_template_id(self, value):
         if value and not DocumentTemplate.objects.filter(id=value, is_active=True).exists():
             raise serializers.ValidationError("Invalid template ID")
-        return value
\ No newline at end of file
+        return value
+
+class DocumentGenerationBatchRequestSerializer(serializers.Serializer):
+    documents = DocumentGenerationRequestSerializer(many=True, allow_empty=False)
+
+    def validate_documents(self, value):
+        max_size = getattr(settings, 'DOCUMENT_BATCH_MAX_SIZE', 500)
+        if len(value) > max_size:
+            raise serializers.ValidationError(f"A batch can contain at most {max_size} documents")
+        return value
+
+class DocumentExportRequestSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, allow_empty=False)
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+
+    def validate(self, data):
+        if not data.get('ids') and not data.get('start_date') and not data.get('end_date'):
+            raise serializers.ValidationError("Provide task ids or a date range")
+        if data.get('start_date') and data.get('end_date') and data['start_date'] > data['end_date']:
+            raise serializers.ValidationError("start_date must not be after end_date")
+        return data
+
+class DocumentGenerationBatchSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DocumentGenerationBatch
+        fields = ['id', 'created_at', 'progress']
+        read_only_fields = fields
+
+    def get_progress(self, obj):
+        return obj.get_progress()
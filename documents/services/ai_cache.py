@@ -0,0 +1,142 @@
+# documents/services/ai_cache.py
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+
+
+class PromptCache:
+    """Two-tier cache for AI completions keyed on a normalized prompt hash
+
+    The first tier is an in-process LRU bounded by entry count and total
+    size. The second tier is a shared Django cache (Redis or file based) so
+    every worker benefits from a completion generated by any other.
+    """
+
+    KEY_PREFIX = 'ai_prompt'
+
+    def __init__(self, max_entries=256, max_bytes=16 * 1024 * 1024, ttl=86400,
+                 shared_alias='ai_responses'):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.shared_alias = shared_alias
+
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'evictions': 0}
+
+    @staticmethod
+    def normalize_prompt(prompt):
+        """Fold full-width characters and collapse whitespace"""
+        prompt = unicodedata.normalize('NFKC', prompt)
+        return re.sub(r'\s+', ' ', prompt).strip()
+
+    def make_key(self, prompt, **params):
+        """Hash the normalized prompt together with the request parameters"""
+        digest = hashlib.sha256(self.normalize_prompt(prompt).encode('utf-8'))
+        for name in sorted(params):
+            digest.update(f"|{name}={params[name]}".encode('utf-8'))
+        return f"{self.KEY_PREFIX}:{digest.hexdigest()}"
+
+    def _shared(self):
+        if not self.shared_alias:
+            return None
+        try:
+            return caches[self.shared_alias]
+        except InvalidCacheBackendError:
+            return None
+
+    def get(self, key):
+        """Return the cached completion or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value, size = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.stats['local_hits'] += 1
+                    return value
+                self._discard(key)
+
+        shared = self._shared()
+        value = None
+        if shared is not None:
+            try:
+                value = shared.get(key)
+            except Exception as e:
+                # An unreachable cache is a miss; it must never fail the generation
+                print(f"AI cache read error: {e}")
+        with self._lock:
+            if value is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['shared_hits'] += 1
+        self._store_local(key, value)
+        return value
+
+    def set(self, key, value):
+        """Store a completion in both tiers"""
+        self._store_local(key, value)
+        shared = self._shared()
+        if shared is not None:
+            try:
+                shared.set(key, value, self.ttl)
+            except Exception as e:
+                print(f"AI cache write error: {e}")
+
+    def _store_local(self, key, value):
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, size)
+            self._size += size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+                self.stats['evictions'] += 1
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[2]
+
+    def clear(self):
+        """Drop the in-process tier"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._size
+        lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_rate'] = (lookups - stats['misses']) / lookups if lookups else 0
+        return stats
+
+
+_prompt_cache = None
+_prompt_cache_lock = threading.Lock()
+
+
+def get_prompt_cache():
+    """Return this process's prompt cache"""
+    global _prompt_cache
+    with _prompt_cache_lock:
+        if _prompt_cache is None:
+            _prompt_cache = PromptCache(
+                max_entries=getattr(settings, 'AI_CACHE_MAX_ENTRIES', 256),
+                max_bytes=getattr(settings, 'AI_CACHE_MAX_BYTES', 16 * 1024 * 1024),
+                ttl=getattr(settings, 'AI_CACHE_TTL', 86400),
+            )
+        return _prompt_cache
@@ -1,22 +1,301 @@
 # documents/services/ai_integration.py
 import requests
 import json
+import re
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
+from .ai_cache import get_prompt_cache
+from .http_client import AIServiceError, CircuitOpenError, get_http_client
 
 class DeepSeekIntegration:
+    # Default outlines, matching the sections requested by the single-shot prompts
+    DEFAULT_OUTLINES = {
+        ('academic', 'zh'): ['摘要', '引言', '文献综述', '研究方法', '研究结果',
+                             '讨论与分析', '结论', '参考文献'],
+        ('academic', 'en'): ['Abstract', 'Introduction', 'Literature Review', 'Methodology',
+                             'Findings', 'Discussion and Analysis', 'Conclusion', 'References'],
+        ('business', 'zh'): ['执行摘要', '背景介绍', '市场分析', '数据分析', '建议与策略',
+                             '实施计划', '风险评估', '结论'],
+        ('business', 'en'): ['Executive Summary', 'Background', 'Market Analysis', 'Data Analysis',
+                             'Recommendations and Strategies', 'Implementation Plan',
+                             'Risk Assessment', 'Conclusion'],
+    }
+    
     def __init__(self):
         self.api_key = settings.DEEPSEEK_API_KEY
-        self.base_url = "https://api.deepseek.com/v1"
+        self.base_url = getattr(settings, 'DEEPSEEK_BASE_URL', "https://api.deepseek.com/v1")
+        self.max_parallel_sections = getattr(settings, 'DEEPSEEK_MAX_PARALLEL_SECTIONS', 4)
+        self.section_retries = getattr(settings, 'DEEPSEEK_SECTION_RETRIES', 2)
+        self.cache = get_prompt_cache() if getattr(settings, 'AI_CACHE_ENABLED', True) else None
+        self.http = get_http_client()
     
     def generate_academic_content(self, topic, requirements):
         """Generate academic article content using DeepSeek API"""
+        if self._use_parallel_generation(requirements):
+            return ''.join(self._generate_sections(topic, requirements, 'academic'))
         prompt = self._build_academic_prompt(topic, requirements)
-        return self._call_api(prompt)
+        return self._call_api(prompt, use_cache=requirements.get('use_cache', True))
     
     def generate_business_content(self, topic, requirements):
         """Generate business report content using DeepSeek API"""
+        if self._use_parallel_generation(requirements):
+            return ''.join(self._generate_sections(topic, requirements, 'business'))
         prompt = self._build_business_prompt(topic, requirements)
-        return self._call_api(prompt)
+        return self._call_api(prompt, use_cache=requirements.get('use_cache', True),
+                              template_type='business')
+    
+    def stream_academic_content(self, topic, requirements):
+        """Yield academic article content as it is generated"""
+        if self._use_parallel_generation(requirements):
+            return self._generate_sections(topic, requirements, 'academic')
+        prompt = self._build_academic_prompt(topic, requirements)
+        return self._stream_api(prompt, use_cache=requirements.get('use_cache', True))
+    
+    def stream_business_content(self, topic, requirements):
+        """Yield business report content as it is generated"""
+        if self._use_parallel_generation(requirements):
+            return self._generate_sections(topic, requirements, 'business')
+        prompt = self._build_business_prompt(topic, requirements)
+        return self._stream_api(prompt, use_cache=requirements.get('use_cache', True),
+                                template_type='business')
+    
+    def _use_parallel_generation(self, requirements):
+        """Check whether to fan out one request per section"""
+        mode = requirements.get('generation_mode') or getattr(settings, 'DEEPSEEK_GENERATION_MODE', 'single')
+        return mode == 'parallel' and bool(self.api_key)
+    
+    def _generate_sections(self, topic, requirements, template_type):
+        """Request an outline, then generate its sections concurrently
+        
+        Sections are yielded in outline order as soon as each one (and every
+        section before it) is ready, so callers can render them incrementally.
+        """
+        language = requirements.get('language', 'zh')
+        use_cache = requirements.get('use_cache', True)
+        outline = self._generate_outline(topic, requirements, template_type)
+        words_per_section = max(100, requirements.get('word_count', 2000) // len(outline))
+        
+        executor = ThreadPoolExecutor(max_workers=self.max_parallel_sections)
+        try:
+            futures = [
+                executor.submit(
+                    self._generate_section, topic, template_type, language,
+                    outline, title, words_per_section, use_cache
+                )
+                for title in outline
+            ]
+            for title, future in zip(outline, futures):
+                yield f"# {title}\n{future.result()}\n\n"
+        finally:
+            # If a section failed or the consumer stopped early, don't pay for
+            # sections nobody will read; running requests are waited for
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    def _generate_outline(self, topic, requirements, template_type):
+        """Ask the model for section titles, falling back to the default outline"""
+        language = requirements.get('language', 'zh')
+        default_outline = self.DEFAULT_OUTLINES[(template_type, language)]
+        prompt = self._build_outline_prompt(topic, template_type, language, default_outline)
+        
+        try:
+            response = self._request_completion(
+                prompt, max_tokens=500, use_cache=requirements.get('use_cache', True)
+            )
+        except CircuitOpenError:
+            raise
+        except AIServiceError as e:
+            print(f"DeepSeek outline error: {e}")
+            return default_outline
+        
+        outline = []
+        for line in response.split('\n'):
+            title = self._strip_list_marker(line)
+            if title and len(title) < 50:
+                outline.append(title)
+        return outline or default_outline
+    
+    def _generate_section(self, topic, template_type, language, outline, title, word_count,
+                          use_cache=True):
+        """Generate one section, retrying only this section on failure"""
+        prompt = self._build_section_prompt(topic, template_type, language, outline, title, word_count)
+        
+        for attempt in range(self.section_retries + 1):
+            try:
+                body = self._request_completion(
+                    prompt, max_tokens=getattr(settings, 'DEEPSEEK_SECTION_MAX_TOKENS', 2000),
+                    use_cache=use_cache
+                ).strip()
+                break
+            except CircuitOpenError:
+                raise
+            except AIServiceError as e:
+                print(f"DeepSeek section error ({title}, attempt {attempt + 1}): {e}")
+                if attempt == self.section_retries:
+                    raise AIServiceError(f"Failed to generate section '{title}': {e}")
+        
+        # The model often repeats the heading; the caller adds it back
+        first_line, _, rest = body.partition('\n')
+        if self._strip_list_marker(first_line).rstrip(':：') == title:
+            body = rest.strip()
+        return body
+    
+    def _strip_list_marker(self, line):
+        """Drop list markers such as "1.", "-", "##", "一、" from a line"""
+        return re.sub(r'^\s*(?:[-*#]+|\d+[.、)]|[一二三四五六七八九十]+、)\s*', '', line).strip()
+    
+    def generate_chart_specs(self, topic, contexts, language='zh', use_cache=True):
+        """Ask for the data behind every chart marker in one request
+        
+        Returns one spec dict (type, title, labels, series) per context, or
+        None where the model gave nothing usable.
+        """
+        if not self.api_key:
+            return self._get_fallback_chart_specs(contexts)
+        
+        prompt = self._build_chart_prompt(topic, contexts, language)
+        response = self._request_completion(
+            prompt, max_tokens=min(4000, 300 * len(contexts)), use_cache=use_cache
+        )
+        # Models tend to wrap JSON in a Markdown code fence
+        response = re.sub(r'^\s*```(?:json)?|```\s*$', '', response.strip())
+        try:
+            specs = json.loads(response)
+        except ValueError as e:
+            raise AIServiceError(f"Invalid chart data from AI service: {e}")
+        if isinstance(specs, dict):
+            specs = specs.get('charts', [])
+        if not isinstance(specs, list):
+            raise AIServiceError("Invalid chart data from AI service")
+        return (specs + [None] * len(contexts))[:len(contexts)]
+    
+    def _build_chart_prompt(self, topic, contexts, language):
+        """Prompt for a JSON array with one chart per placeholder"""
+        places = '\n'.join(
+            f"{i}. [{context['section']}] {context['text']}" for i, context in enumerate(contexts, start=1)
+        )
+        if language == 'zh':
+            return f"""
+            文档主题：{topic}
+            文档中有 {len(contexts)} 个图表位置，每个位置所在的章节和上下文如下：
+            {places}
+            
+            请为每个位置提供合理的图表数据，只返回一个 JSON 数组，按位置顺序排列，每项格式为：
+            {{"type": "bar|line|pie", "title": "图表标题", "labels": ["类别1", "类别2"],
+              "series": [{{"name": "系列名称", "values": [数值1, 数值2]}}]}}
+            要求：labels 不超过 12 个，series 不超过 4 个，values 与 labels 一一对应，不要输出其他文字。
+            """
+        return f"""
+            Document topic: {topic}
+            The document has {len(contexts)} chart locations; the section and context of each are:
+            {places}
+            
+            Provide plausible chart data for every location. Reply with a JSON array only, in
+            location order, each item shaped like:
+            {{"type": "bar|line|pie", "title": "Chart title", "labels": ["Category 1", "Category 2"],
+              "series": [{{"name": "Series name", "values": [value1, value2]}}]}}
+            Use at most 12 labels and 4 series, with one value per label. Output nothing else.
+            """
+    
+    def generate_formulas(self, topic, contexts, language='zh', use_cache=True):
+        """Ask for the LaTeX of every formula marker in one request
+        
+        Returns one LaTeX string (or None) per context. The model answers one
+        numbered line per formula rather than JSON, whose escaping rules clash
+        with LaTeX backslashes ("\\frac" would read as a form feed).
+        """
+        if not self.api_key:
+            return self._get_fallback_formulas(contexts)
+        
+        prompt = self._build_formula_prompt(topic, contexts, language)
+        response = self._request_completion(
+            prompt, max_tokens=min(4000, 150 * len(contexts)), use_cache=use_cache
+        )
+        formulas = [None] * len(contexts)
+        for line in response.splitlines():
+            match = re.match(r'^\s*(\d+)\s*[.)、:：]\s*(.+?)\s*$', line)
+            if match and 1 <= int(match.group(1)) <= len(contexts):
+                formulas[int(match.group(1)) - 1] = match.group(2).strip('`')
+        return formulas
+    
+    def _build_formula_prompt(self, topic, contexts, language):
+        """Prompt for one numbered LaTeX line per placeholder"""
+        places = '\n'.join(
+            f"{i}. [{context['section']}] {context['text']}" for i, context in enumerate(contexts, start=1)
+        )
+        if language == 'zh':
+            return f"""
+            文档主题：{topic}
+            文档中有 {len(contexts)} 个公式位置，每个位置所在的章节和上下文如下：
+            {places}
+            
+            请为每个位置给出合适的数学公式，使用 LaTeX 表示。每行一个公式，格式为"序号. 公式"，
+            例如：1. \\bar{{x}} = \\frac{{1}}{{n}}\\sum_{{i=1}}^{{n}} x_i
+            不要使用 $ 符号，不要输出其他文字。
+            """
+        return f"""
+            Document topic: {topic}
+            The document has {len(contexts)} formula locations; the section and context of each are:
+            {places}
+            
+            Give a suitable formula for every location, written in LaTeX. One formula per line,
+            formatted as "number. formula", for example:
+            1. \\bar{{x}} = \\frac{{1}}{{n}}\\sum_{{i=1}}^{{n}} x_i
+            Do not use $ delimiters and output nothing else.
+            """
+    
+    def _build_outline_prompt(self, topic, template_type, language, default_outline):
+        """Build prompt asking only for the document outline"""
+        sections = '\n'.join(default_outline)
+        if language == 'zh':
+            kind = '学术论文' if template_type == 'academic' else '商业报告'
+            return f"""
+            请为一篇关于"{topic}"的{kind}拟定章节大纲。
+
+            要求：
+            - 参考以下章节，可根据主题调整：
+            {sections}
+            - 每行只输出一个章节标题，不要输出其他内容
+            """
+        else:
+            kind = 'academic paper' if template_type == 'academic' else 'business report'
+            return f"""
+            Draft the section outline for a {kind} on the topic: "{topic}"
+
+            Requirements:
+            - Use these sections as a guide, adapting them to the topic:
+            {sections}
+            - Output one section title per line and nothing else
+            """
+    
+    def _build_section_prompt(self, topic, template_type, language, outline, title, word_count):
+        """Build prompt for a single section of the document"""
+        sections = '、'.join(outline) if language == 'zh' else ', '.join(outline)
+        if language == 'zh':
+            kind = '学术论文' if template_type == 'academic' else '商业报告'
+            markers = '[图表位置]' + ('、[公式位置]' if template_type == 'academic' else '')
+            return f"""
+            你正在撰写一篇关于"{topic}"的{kind}，全文章节为：{sections}。
+
+            请只撰写"{title}"这一章节的正文：
+            - 字数约{word_count}字
+            - 使用专业的语言，与其他章节保持一致
+            - 在适当位置标注 {markers}
+            - 需要列出数据时使用 Markdown 表格（| 列名 | 列名 |，第二行为 | --- | --- |）
+            - 不要重复章节标题，不要撰写其他章节
+            """
+        else:
+            kind = 'academic paper' if template_type == 'academic' else 'business report'
+            markers = '[CHART LOCATION]' + (' and [FORMULA LOCATION]' if template_type == 'academic' else '')
+            return f"""
+            You are writing a {kind} on the topic "{topic}" with these sections: {sections}.
+
+            Write only the body of the "{title}" section:
+            - Approximately {word_count} words
+            - Use professional language consistent with the other sections
+            - Mark places with {markers} where appropriate
+            - Present tabular data as Markdown tables (| Column | Column |, then | --- | --- |)
+            - Do not repeat the section title or write other sections
+            """
     
     def _build_academic_prompt(self, topic, requirements):
         """Build prompt for academic article generation"""
@@ -42,6 +321,7 @@ class DeepSeekIntegration:
             
             - 使用专业的学术语言
             - 在适当位置标注需要插入图表的地方 [图表位置]
+            - 需要列出数据时使用 Markdown 表格（| 列名 | 列名 |，第二行为 | --- | --- |）
             - 在需要数学公式的地方标注 [公式位置]
             - 确保逻辑严谨，论证充分
             - 提供真实的参考文献格式
@@ -67,6 +347,7 @@ class DeepSeekIntegration:
 
             - Use professional academic language
             - Mark places for charts with [CHART LOCATION]
+            - Present tabular data as Markdown tables (| Column | Column |, then | --- | --- |)
             - Mark places for formulas with [FORMULA LOCATION]
             - Ensure logical rigor and sufficient argumentation
             - Provide proper reference formatting
@@ -98,6 +379,7 @@ class DeepSeekIntegration:
 
             - 使用专业的商业语言
             - 在适当位置标注需要插入图表的地方 [图表位置]
+            - 需要列出数据时使用 Markdown 表格（| 列名 | 列名 |，第二行为 | --- | --- |）
             - 提供具体的数据分析和建议
             - 结构清晰，重点突出
 
@@ -122,17 +404,15 @@ class DeepSeekIntegration:
 
             - Use professional business language
             - Mark places for charts with [CHART LOCATION]
+            - Present tabular data as Markdown tables (| Column | Column |, then | --- | --- |)
             - Provide specific data analysis and recommendations
             - Clear structure with emphasized key points
 
             Please generate the complete report content:
             """
     
-    def _call_api(self, prompt):
-        """Make API call to DeepSeek"""
-        if not self.api_key:
-            return self._get_fallback_content()
-        
+    def _build_request(self, prompt, stream=False, max_tokens=4000):
+        """Build headers and payload for a chat completion request"""
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
@@ -146,25 +426,108 @@ class DeepSeekIntegration:
                     "content": prompt
                 }
             ],
-            "max_tokens": 4000,
+            "max_tokens": max_tokens,
             "temperature": 0.7
         }
+        if stream:
+            payload["stream"] = True
         
+        return headers, payload
+    
+    def _cache_key(self, prompt, payload):
+        """Cache key covering the prompt and every parameter that shapes the output"""
+        return self.cache.make_key(
+            prompt, model=payload['model'], max_tokens=payload['max_tokens'],
+            temperature=payload['temperature']
+        )
+    
+    def _request_completion(self, prompt, max_tokens=4000, use_cache=True):
+        """Make API call to DeepSeek, raising on request errors"""
+        headers, payload = self._build_request(prompt, max_tokens=max_tokens)
+        
+        cache_key = None
+        if use_cache and self.cache is not None:
+            cache_key = self._cache_key(prompt, payload)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        response = self.http.post(
+            f"{self.base_url}/chat/completions",
+            headers=headers,
+            json=payload,
+            timeout=60
+        )
         try:
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=60
-            )
-            response.raise_for_status()
-            return response.json()['choices'][0]['message']['content']
-        except requests.exceptions.RequestException as e:
-            print(f"DeepSeek API Error: {e}")
-            return self._get_fallback_content()
-    
-    def _get_fallback_content(self):
-        """Return fallback content when API fails"""
+            content = response.json()['choices'][0]['message']['content']
+        except (ValueError, KeyError, IndexError) as e:
+            raise AIServiceError(f"Unexpected response from AI service: {e}")
+        
+        if cache_key:
+            self.cache.set(cache_key, content)
+        return content
+    
+    def _call_api(self, prompt, use_cache=True, template_type='academic'):
+        """Make API call to DeepSeek"""
+        if not self.api_key:
+            # Development mode without credentials
+            return self._get_fallback_content(template_type)
+        
+        return self._request_completion(prompt, use_cache=use_cache)
+    
+    def _stream_api(self, prompt, use_cache=True, template_type='academic'):
+        """Make a streaming (SSE) API call to DeepSeek and yield content deltas"""
+        if not self.api_key:
+            # Development mode without credentials
+            yield self._get_fallback_content(template_type)
+            return
+        
+        headers, payload = self._build_request(prompt, stream=True)
+        
+        cache_key = None
+        if use_cache and self.cache is not None:
+            cache_key = self._cache_key(prompt, payload)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        response = self.http.post(
+            f"{self.base_url}/chat/completions",
+            headers=headers,
+            json=payload,
+            stream=True,
+            timeout=(10, 60)  # Read timeout applies between chunks
+        )
+        
+        chunks = []
+        try:
+            with response:
+                # chunk_size=None hands over each chunk as soon as it arrives
+                for raw_line in response.iter_lines(chunk_size=None):
+                    line = raw_line.decode('utf-8')
+                    if not line.startswith('data:'):
+                        continue  # Blank separators and SSE comments
+                    data = line[len('data:'):].strip()
+                    if data == '[DONE]':
+                        break
+                    choices = json.loads(data).get('choices') or [{}]
+                    delta = choices[0].get('delta', {}).get('content')
+                    if delta:
+                        chunks.append(delta)
+                        yield delta
+        except (requests.exceptions.RequestException, ValueError) as e:
+            self.http.record_failure()
+            raise AIServiceError(f"AI service stream interrupted: {e}")
+        
+        if cache_key and chunks:
+            self.cache.set(cache_key, ''.join(chunks))
+    
+    def _get_fallback_content(self, template_type='academic'):
+        """Return sample content when no API key is configured"""
+        if template_type == 'business':
+            return self._get_business_fallback_content()
+        
         return f"""
         学术论文示例内容
 
@@ -200,4 +563,63 @@ class DeepSeekIntegration:
         参考文献
         1. 作者 (年份). 文章标题. 期刊名称.
         2. 作者 (年份). 书籍名称. 出版社.
-        """
\ No newline at end of file
+        """
+    
+    def _get_business_fallback_content(self):
+        """Return sample business report content"""
+        return f"""
+        商业报告示例内容
+
+        执行摘要
+        本报告分析了相关市场的现状与机会，并提出了具体的发展建议。
+
+        1. 背景介绍
+        行业背景和项目目标在此阐述。
+
+        2. 市场分析
+        市场规模和增长趋势如下：[图表位置]
+        主要竞争对手包括...
+
+        3. 数据分析
+        关键业务指标分析：[图表位置]
+        | 指标 | 2023年 | 2024年 |
+        | --- | --- | --- |
+        | 营业收入 | 1200 | 1500 |
+        | 客户数量 | 320 | 410 |
+        数据表明...
+
+        4. 建议与策略
+        基于以上分析，建议采取以下策略...
+
+        5. 实施计划
+        分阶段实施步骤和时间安排...
+
+        6. 风险评估
+        主要风险及应对措施...
+
+        结论
+        总结主要发现和建议...
+        """
+    
+    def _get_fallback_chart_specs(self, contexts):
+        """Return sample chart data when no API key is configured"""
+        specs = []
+        for i, context in enumerate(contexts):
+            chart_type = ('bar', 'line', 'pie')[i % 3]
+            specs.append({
+                'type': chart_type,
+                'title': context['section'] or f"图表 {i + 1}",
+                'labels': ['2020', '2021', '2022', '2023', '2024'],
+                'series': [{'name': '示例数据', 'values': [12, 18, 25, 31, 40]}],
+            })
+        return specs
+    
+    def _get_fallback_formulas(self, contexts):
+        """Return sample formulas when no API key is configured"""
+        samples = [
+            r'\bar{x} = \frac{1}{n}\sum_{i=1}^{n} x_i',
+            r'y = \beta_0 + \beta_1 x + \varepsilon',
+            r'\sigma = \sqrt{\frac{1}{n-1}\sum_{i=1}^{n} (x_i - \bar{x})^2}',
+        ]
+        return [samples[i % len(samples)] for i in range(len(contexts))]
+
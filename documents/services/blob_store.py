@@ -0,0 +1,123 @@
+# documents/services/blob_store.py
+import hashlib
+import os
+import tempfile
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from utils.downloads import guess_content_type
+from ..models import DocumentBlob, DocumentGenerationTask
+
+BLOB_DIR = 'blobs'
+SCRATCH_DIR = 'tmp'
+CHUNK_SIZE = 1024 * 1024
+STORE_ATTEMPTS = 3
+
+
+def new_output_path(prefix, extension='docx'):
+    """Reserve a unique scratch file under MEDIA_ROOT for one render
+
+    It lives on the same filesystem as the store, so store_output can move it
+    into place atomically.
+    """
+    directory = os.path.join(settings.MEDIA_ROOT, SCRATCH_DIR)
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=f"{prefix}_", suffix=f".{extension}", dir=directory)
+    os.close(fd)
+    return path
+
+
+def blob_name(sha256, extension):
+    """Storage name of a blob, fanned out by hash prefix"""
+    return f"{BLOB_DIR}/{sha256[:2]}/{sha256}.{extension}"
+
+
+def hash_file(path):
+    """Return (sha256, size) of a file, read in chunks"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def store_output(path, page_count=None, references=1):
+    """Move a rendered file into the store and return its blob with references added
+
+    Identical content is stored once: if the hash is already known the
+    existing blob just gains the references. The counter update locks the
+    row, so a concurrent release() cannot delete the file we are placing.
+    """
+    extension = os.path.splitext(path)[1].lstrip('.') or 'bin'
+    sha256, size = hash_file(path)
+    name = blob_name(sha256, extension)
+    final_path = os.path.join(settings.MEDIA_ROOT, name)
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+
+    for _ in range(STORE_ATTEMPTS):
+        with transaction.atomic():
+            DocumentBlob.objects.bulk_create([
+                DocumentBlob(sha256=sha256, file=name, size=size,
+                             mime_type=guess_content_type(name), page_count=page_count)
+            ], ignore_conflicts=True)
+            # Zero rows means release() deleted the blob in between: try again
+            if DocumentBlob.objects.filter(sha256=sha256).update(ref_count=F('ref_count') + references):
+                # Same name means same bytes, so replacing an existing copy is harmless
+                os.replace(path, final_path)
+                return DocumentBlob.objects.get(sha256=sha256)
+    raise Exception(f"Failed to store document {sha256}")
+
+
+def adopt_legacy_file(name):
+    """Move a file generated before the store into it, repointing every task that uses it
+
+    Coalesced requests share one file, so this works per file rather than
+    per task. Returns the blob, or None if the file is missing.
+    """
+    path = os.path.join(settings.MEDIA_ROOT, name)
+    if not os.path.exists(path):
+        return None
+
+    tasks = DocumentGenerationTask.objects.filter(generated_file=name, blob__isnull=True)
+    task_ids = list(tasks.values_list('id', flat=True))
+    blob = store_output(path, references=len(task_ids))
+    DocumentGenerationTask.objects.filter(id__in=task_ids).update(
+        blob=blob,
+        generated_file=blob.file.name,
+        file_size=blob.size,
+        file_format=os.path.splitext(blob.file.name)[1].lstrip('.'),
+    )
+    return blob
+
+
+def add_references(blob_id, count):
+    """Count more tasks sharing a stored blob"""
+    if blob_id and count:
+        DocumentBlob.objects.filter(pk=blob_id).update(ref_count=F('ref_count') + count)
+
+
+def release(blob_id):
+    """Drop one reference, deleting the blob and its file with the last one
+
+    Returns True if the blob was deleted.
+    """
+    with transaction.atomic():
+        # Write first, so the row (or, on SQLite, the database) is locked throughout
+        DocumentBlob.objects.filter(pk=blob_id, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+        blob = DocumentBlob.objects.filter(pk=blob_id, ref_count=0, tasks__isnull=True).first()
+        if blob is None:
+            return False
+
+        file_path = os.path.join(settings.MEDIA_ROOT, blob.file.name)
+        # Converted copies hold a reference to their own output blob
+        output_ids = list(blob.conversions.exclude(output=None).values_list('output_id', flat=True))
+        blob.delete()
+        for output_id in output_ids:
+            release(output_id)
+        try:
+            os.remove(file_path)
+        except OSError as e:
+            print(f"Blob cleanup warning: {e}")
+        return True
@@ -0,0 +1,277 @@
+# documents/services/charts.py
+import hashlib
+import io
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from django.conf import settings
+from PIL import Image, ImageDraw, ImageFont
+from .content_stats import CHART_MARKERS
+from .section_tokenizer import find_marker_contexts
+
+CHART_PATTERN = re.compile('|'.join(map(re.escape, CHART_MARKERS)))
+CHART_TYPES = ('bar', 'line', 'pie')
+# Bump when the drawing code changes, so cached images are not reused
+CHART_RENDER_VERSION = 1
+MAX_LABELS = 12
+MAX_SERIES = 4
+
+PALETTE = [(54, 110, 181), (230, 126, 34), (46, 160, 67), (192, 57, 43),
+           (142, 68, 173), (22, 160, 133), (241, 196, 15), (127, 140, 141)]
+
+# CJK-capable fonts tried when CHART_FONT_PATH is not set (Windows first: WPS hosts)
+FONT_CANDIDATES = [
+    'C:/Windows/Fonts/msyh.ttc',
+    'C:/Windows/Fonts/simhei.ttf',
+    '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+]
+
+
+def find_chart_contexts(content):
+    """Return {'section', 'text'} for every chart marker, in document order"""
+    return find_marker_contexts(content, CHART_PATTERN)
+
+
+def normalize_spec(spec):
+    """Validate a chart spec from the model, returning None if it cannot be drawn"""
+    if not isinstance(spec, dict):
+        return None
+    labels = [str(label)[:20] for label in (spec.get('labels') or [])][:MAX_LABELS]
+    series = []
+    for item in (spec.get('series') or [])[:MAX_SERIES]:
+        if not isinstance(item, dict):
+            continue
+        try:
+            values = [float(value) for value in item.get('values', [])][:len(labels)]
+        except (TypeError, ValueError):
+            continue
+        if len(values) == len(labels) and all(math.isfinite(value) for value in values):
+            series.append({'name': str(item.get('name', ''))[:30], 'values': values})
+    if not labels or not series:
+        return None
+
+    chart_type = spec.get('type') if spec.get('type') in CHART_TYPES else 'bar'
+    if chart_type == 'pie':
+        series = series[:1]
+        if any(value < 0 for value in series[0]['values']) or not sum(series[0]['values']):
+            chart_type = 'bar'
+    return {'type': chart_type, 'title': str(spec.get('title', ''))[:60], 'labels': labels, 'series': series}
+
+
+def spec_hash(spec, width, height):
+    """Key identifying the image a spec renders to"""
+    payload = json.dumps([spec, width, height, CHART_RENDER_VERSION], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+@lru_cache(maxsize=8)
+def _font(size):
+    paths = [getattr(settings, 'CHART_FONT_PATH', '')] + FONT_CANDIDATES
+    for path in paths:
+        if path and os.path.exists(path):
+            try:
+                return ImageFont.truetype(path, size)
+            except OSError:
+                continue
+    return ImageFont.load_default()
+
+
+def _value_label(value):
+    return f"{value:,.0f}" if abs(value) >= 100 or value == int(value) else f"{value:.2f}"
+
+
+def render_chart(spec, width=800, height=480):
+    """Draw a normalized spec and return PNG bytes"""
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+    title_font, label_font = _font(22), _font(14)
+
+    draw.text((width // 2, 16), spec['title'], fill=(33, 33, 33), font=title_font, anchor='mt')
+    labels, series = spec['labels'], spec['series']
+
+    # Legend along the bottom
+    legend_names = labels if spec['type'] == 'pie' else [item['name'] for item in series]
+    x = 40
+    for i, name in enumerate(legend_names):
+        draw.rectangle((x, height - 28, x + 12, height - 16), fill=PALETTE[i % len(PALETTE)])
+        draw.text((x + 18, height - 22), name, fill=(66, 66, 66), font=label_font, anchor='lm')
+        x += 30 + int(draw.textlength(name, font=label_font))
+
+    if spec['type'] == 'pie':
+        values = series[0]['values']
+        total = sum(values)
+        size = min(width, height - 110)
+        box = ((width - size) // 2, 56, (width + size) // 2, 56 + size)
+        start = -90.0
+        for i, value in enumerate(values):
+            end = start + 360.0 * value / total
+            draw.pieslice(box, start, end, fill=PALETTE[i % len(PALETTE)], outline='white')
+            start = end
+    else:
+        left, top, right, bottom = 70, 60, width - 30, height - 70
+        values = [value for item in series for value in item['values']]
+        low, high = min(0.0, min(values)), max(0.0, max(values))
+        span = (high - low) or 1.0
+
+        def y_for(value):
+            return bottom - (value - low) / span * (bottom - top)
+
+        for step in range(5):
+            value = low + span * step / 4
+            y = y_for(value)
+            draw.line((left, y, right, y), fill=(225, 225, 225))
+            draw.text((left - 8, y), _value_label(value), fill=(97, 97, 97), font=label_font, anchor='rm')
+        draw.line((left, y_for(0), right, y_for(0)), fill=(120, 120, 120))
+
+        slot = (right - left) / len(labels)
+        for j, label in enumerate(labels):
+            draw.text((left + slot * (j + 0.5), bottom + 8), label, fill=(66, 66, 66), font=label_font, anchor='mt')
+
+        if spec['type'] == 'bar':
+            bar = slot * 0.8 / len(series)
+            for i, item in enumerate(series):
+                for j, value in enumerate(item['values']):
+                    x0 = left + slot * j + slot * 0.1 + bar * i
+                    y0, y1 = sorted((y_for(value), y_for(0)))
+                    draw.rectangle((x0, y0, x0 + bar - 2, y1), fill=PALETTE[i % len(PALETTE)])
+        else:
+            for i, item in enumerate(series):
+                points = [(left + slot * (j + 0.5), y_for(value)) for j, value in enumerate(item['values'])]
+                color = PALETTE[i % len(PALETTE)]
+                draw.line(points, fill=color, width=3)
+                for px, py in points:
+                    draw.ellipse((px - 4, py - 4, px + 4, py + 4), fill=color)
+
+    output = io.BytesIO()
+    image.save(output, format='PNG', optimize=True)
+    return output.getvalue()
+
+
+class ChartImageCache:
+    """Rendered charts on disk, named by spec hash and shared by all workers"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.png")
+
+    def get(self, key):
+        path = self.path(key)
+        return path if os.path.exists(path) else None
+
+    def put(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, scratch = tempfile.mkstemp(suffix='.png', dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        # Atomic: a concurrent reader sees the old state or the whole image
+        os.replace(scratch, path)
+        return path
+
+
+def render_charts(specs, cache=None, pool=None):
+    """Return an image path (or None) for each spec, rendering cache misses in the pool
+
+    Identical specs within a document are rendered once.
+    """
+    width = getattr(settings, 'CHART_WIDTH', 800)
+    height = getattr(settings, 'CHART_HEIGHT', 480)
+    cache = cache or get_chart_cache()
+    pool = pool or get_chart_pool()
+
+    keys = [spec_hash(spec, width, height) if spec else None for spec in specs]
+    paths = {}
+    pending = {}
+    for key, spec in zip(keys, specs):
+        if key is None or key in paths or key in pending:
+            continue
+        cached = cache.get(key)
+        if cached:
+            paths[key] = cached
+        else:
+            pending[key] = pool.submit(render_chart, spec, width, height)
+
+    for key, future in pending.items():
+        try:
+            paths[key] = cache.put(key, future.result())
+        except Exception as e:
+            print(f"Chart rendering warning: {e}")
+    return [paths.get(key) if key else None for key in keys]
+
+
+class ChartStage:
+    """Fetch chart data for every marker and render the images on a background thread
+
+    Started as soon as the text exists, it overlaps the AI request and the
+    image work with rendering the document body. Charts are best effort: on
+    any failure the markers are simply removed.
+    """
+
+    def __init__(self, ai_service, topic, content, requirements):
+        self.ai_service = ai_service
+        self.topic = topic
+        self.content = content
+        self.requirements = requirements
+        self.images = []
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        contexts = find_chart_contexts(self.content)
+        limit = getattr(settings, 'CHART_MAX_PER_DOCUMENT', 10)
+        self.images = [None] * len(contexts)
+        if not contexts:
+            return
+        try:
+            specs = self.ai_service.generate_chart_specs(
+                self.topic, contexts[:limit], self.requirements.get('language', 'zh'),
+                use_cache=self.requirements.get('use_cache', True)
+            )
+            specs = [normalize_spec(spec) for spec in specs]
+            self.images[:len(specs)] = render_charts(specs)
+        except Exception as e:
+            print(f"Chart stage warning: {e}")
+
+    def result(self):
+        """Wait for the stage and return one image path (or None) per marker"""
+        self._thread.join()
+        return self.images
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_chart_pool():
+    """Return this process's chart rendering pool, rebuilding it after a fork
+
+    Threads rather than processes: Celery's prefork children cannot start
+    child processes, and Pillow releases the GIL while rasterising and
+    encoding PNGs.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'CHART_RENDER_WORKERS', 4),
+                thread_name_prefix='chart-render',
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def get_chart_cache():
+    return ChartImageCache(getattr(settings, 'CHART_CACHE_DIR', os.path.join(settings.MEDIA_ROOT, 'charts')))
@@ -0,0 +1,79 @@
+# documents/services/com_instrumentation.py
+import threading
+from contextlib import contextmanager
+
+_PLAIN_TYPES = (str, bytes, int, float, bool, type(None))
+
+
+class COMCallCounter:
+    """Counts cross-process round-trips made through counted COM objects"""
+
+    def __init__(self):
+        self.count = 0
+        # Calls made by each measured operation, e.g. {'table': [6, 6]}
+        self.operations = {}
+        self._lock = threading.Lock()
+
+    def increment(self):
+        with self._lock:
+            self.count += 1
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+            self.operations = {}
+
+    @contextmanager
+    def measure(self, operation):
+        """Record the calls made inside the block under the operation's name"""
+        start = self.count
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.operations.setdefault(operation, []).append(self.count - start)
+
+    def summary(self):
+        """One line for the log: the total and the calls per measured operation"""
+        parts = [f"{self.count} total"]
+        for operation, calls in sorted(self.operations.items()):
+            parts.append(f"{operation} x{len(calls)}: {sum(calls)} ({max(calls)} max)")
+        return ', '.join(parts)
+
+    def wrap(self, com_object):
+        """Return a proxy that counts every access to com_object"""
+        return CountedCOMObject(com_object, self)
+
+
+class CountedCOMObject:
+    """Proxy that counts attribute reads, writes and calls on a COM object
+
+    Each one is an IDispatch round-trip in the worst case, so the count is
+    an upper bound on the traffic to the WPS process.
+    """
+
+    __slots__ = ('_target', '_counter')
+
+    def __init__(self, target, counter):
+        object.__setattr__(self, '_target', target)
+        object.__setattr__(self, '_counter', counter)
+
+    def _wrap(self, value):
+        if isinstance(value, _PLAIN_TYPES):
+            return value
+        return CountedCOMObject(value, self._counter)
+
+    def __getattr__(self, name):
+        self._counter.increment()
+        return self._wrap(getattr(self._target, name))
+
+    def __setattr__(self, name, value):
+        self._counter.increment()
+        setattr(self._target, name, value)
+
+    def __call__(self, *args, **kwargs):
+        self._counter.increment()
+        return self._wrap(self._target(*args, **kwargs))
+
+    def __bool__(self):
+        return self._target is not None
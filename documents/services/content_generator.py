@@ -2,148 +2,165 @@
 import os
 import tempfile
 from django.conf import settings
-from .wps_automation import WPSAutomation
+from .renderers import get_renderer
+from ..models import DocumentTemplate
 from .ai_integration import DeepSeekIntegration
+from .streaming import IncrementalRenderPipeline
+from .section_tokenizer import SectionTokenizer
+from .progress import GENERATING, RENDERING, CHARTS, FORMULAS, SAVING
+from .blob_store import new_output_path
+from .charts import ChartStage
+from .formulas import FormulaStage
 
 class ContentGenerator:
-    def __init__(self):
-        self.wps_auto = WPSAutomation()
+    def __init__(self, renderer=None, progress=None):
+        self.renderer = renderer or get_renderer()
         self.ai_service = DeepSeekIntegration()
+        self.progress = progress
+        self.statistics = None
+        self.sections = []
     
     def generate_academic_paper(self, topic, requirements, user):
         """Generate complete academic paper"""
-        try:
-            # Step 1: Generate content with AI
-            content = self.ai_service.generate_academic_content(topic, requirements)
-            
-            # Step 2: Create WPS document
-            output_filename = f"academic_paper_{user.id}_{int(os.times().elapsed)}.docx"
-            output_path = os.path.join(settings.MEDIA_ROOT, 'documents', output_filename)
-            
-            # Initialize WPS and create document
-            if not self.wps_auto.initialize_wps():
-                raise Exception("Failed to initialize WPS Office")
-            
-            self.wps_auto.create_document()
-            
-            # Step 3: Apply document styles
-            self.wps_auto.apply_document_styles()
-            
-            # Step 4: Insert content with proper formatting
-            self._insert_formatted_content(content, requirements)
-            
-            # Step 5: Save document
-            self.wps_auto.save_document(output_path)
-            
-            # Step 6: Clean up
-            self.wps_auto.close()
-            
-            return output_path, content
-            
-        except Exception as e:
-            # Ensure cleanup on error
-            try:
-                self.wps_auto.close()
-            except:
-                pass
-            raise e
+        return self._generate_document(
+            'academic_paper', topic, requirements, user,
+            self.ai_service.generate_academic_content,
+            self.ai_service.stream_academic_content
+        )
     
     def generate_business_report(self, topic, requirements, user):
         """Generate complete business report"""
+        return self._generate_document(
+            'business_report', topic, requirements, user,
+            self.ai_service.generate_business_content,
+            self.ai_service.stream_business_content
+        )
+    
+    def _generate_document(self, filename_prefix, topic, requirements, user,
+                           generate_content, stream_content):
+        """Generate content with AI and render it into a document"""
+        streaming = getattr(settings, 'DEEPSEEK_STREAMING', False)
+        output_path = None
+        chart_stage = formula_stage = None
+        
         try:
-            # Step 1: Generate content with AI
-            content = self.ai_service.generate_business_content(topic, requirements)
-            
-            # Step 2: Create WPS document
-            output_filename = f"business_report_{user.id}_{int(os.times().elapsed)}.docx"
-            output_path = os.path.join(settings.MEDIA_ROOT, 'documents', output_filename)
-            
-            # Initialize WPS and create document
-            if not self.wps_auto.initialize_wps():
-                raise Exception("Failed to initialize WPS Office")
-            
-            self.wps_auto.create_document()
+            # Step 1: Generate content with AI (streamed content is generated in step 4)
+            self._report(GENERATING, 0)
+            if not streaming:
+                content = generate_content(topic, requirements)
+                # Charts and formulas are prepared while the body is rendered
+                chart_stage = self._start_chart_stage(topic, content, requirements)
+                formula_stage = self._start_formula_stage(topic, content, requirements)
+            
+            # Step 2: Create document (rendered to a unique scratch file, then stored by hash)
+            output_path = new_output_path(f"{filename_prefix}_{user.id}")
+            
+            # Initialize renderer and create document
+            if not self.renderer.initialize():
+                raise Exception("Failed to initialize document renderer")
+            
+            template = self._get_template(requirements)
+            if template:
+                self.renderer.create_document(template.file_path.path, template.file_hash)
+            else:
+                self.renderer.create_document()
             
             # Step 3: Apply document styles
-            self.wps_auto.apply_document_styles()
+            self.renderer.apply_document_styles()
             
             # Step 4: Insert content with proper formatting
-            self._insert_formatted_content(content, requirements)
-            
-            # Step 5: Save document
-            self.wps_auto.save_document(output_path)
-            
-            # Step 6: Clean up
-            self.wps_auto.close()
-            
-            return output_path, content
+            if streaming:
+                deltas = stream_content(topic, requirements)
+                if self.progress:
+                    # Word counts are in characters for Chinese, roughly so for English
+                    deltas = self.progress.track_generation(deltas, requirements.get('word_count', 2000))
+                content = self._render_streamed_content(deltas)
+                chart_stage = self._start_chart_stage(topic, content, requirements)
+                formula_stage = self._start_formula_stage(topic, content, requirements)
+            else:
+                self._report(RENDERING)
+                self._insert_formatted_content(content, requirements)
+            
+            # Step 5: Replace chart markers, with images when the plan includes charts
+            if chart_stage:
+                self._report(CHARTS)
+                self.renderer.embed_charts(chart_stage.result())
+            elif self.statistics is not None and self.statistics.charts:
+                self.renderer.embed_charts([])
+            
+            # Step 6: Replace formula markers, with equations when the plan includes formulas
+            if formula_stage:
+                self._report(FORMULAS)
+                self.renderer.embed_formulas(formula_stage.result())
+            elif self.statistics is not None and self.statistics.formulas:
+                self.renderer.embed_formulas([])
+            
+            # Step 7: Save document
+            self._report(SAVING)
+            self.renderer.save_document(output_path)
+            if self.statistics is not None:
+                self.statistics.page_count = self.renderer.get_page_count()
+            
+            # Step 8: Clean up
+            self.renderer.close()
+            
+            return output_path, content, self.statistics
             
         except Exception as e:
             # Ensure cleanup on error
             try:
-                self.wps_auto.close()
+                self.renderer.abort()
             except:
                 pass
+            if output_path and os.path.exists(output_path):
+                os.remove(output_path)
             raise e
     
+    def _start_chart_stage(self, topic, content, requirements):
+        """Start preparing chart images when the plan includes charts"""
+        if not requirements.get('include_charts'):
+            return None
+        return ChartStage(self.ai_service, topic, content, requirements).start()
+    
+    def _start_formula_stage(self, topic, content, requirements):
+        """Start converting formulas when the plan includes them"""
+        if not requirements.get('include_formulas'):
+            return None
+        return FormulaStage(self.ai_service, topic, content, requirements).start()
+    
+    def _report(self, stage, percent=None):
+        if self.progress:
+            self.progress.publish(stage, percent)
+    
+    def _get_template(self, requirements):
+        """Look up the requested template, if it has a file"""
+        template_id = requirements.get('template_id')
+        if not template_id:
+            return None
+        template = DocumentTemplate.objects.filter(id=template_id, is_active=True).first()
+        if template and template.file_path:
+            return template
+        return None
+    
+    def _render_streamed_content(self, deltas):
+        """Render each section as soon as the model finishes writing it"""
+        tokenizer = SectionTokenizer()
+        pipeline = IncrementalRenderPipeline(self.renderer, tokenizer)
+        content = pipeline.run(deltas)
+        self.statistics = tokenizer.statistics
+        self.sections = pipeline.sections
+        return content
+    
     def _insert_formatted_content(self, content, requirements):
         """Insert content with proper formatting"""
         # Split content by sections
         sections = self._parse_content_sections(content)
-        
-        for section in sections:
-            if section['is_heading']:
-                # Insert as heading
-                level = self._get_heading_level(section['title'])
-                self.wps_auto.insert_heading(section['title'], level)
-            else:
-                # Insert as normal content
-                self.wps_auto.insert_content(section['content'])
+        self.renderer.render_sections(sections)
     
     def _parse_content_sections(self, content):
-        """Parse content into sections"""
-        sections = []
-        lines = content.split('\n')
-        
-        current_section = {'title': '', 'content': '', 'is_heading': False}
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-                
-            # Check if this is a heading (contains numbers or specific keywords)
-            if (any(keyword in line for keyword in ['摘要', '引言', '结论', '参考文献', 
-                                                  'Abstract', 'Introduction', 'Conclusion', 'References']) and
-                len(line) < 100):  # Likely a heading
-                
-                # Save previous section
-                if current_section['content']:
-                    sections.append(current_section.copy())
-                
-                # Start new section
-                current_section = {
-                    'title': line,
-                    'content': '',
-                    'is_heading': True
-                }
-            else:
-                # Add to current section content
-                current_section['content'] += line + '\n'
-                current_section['is_heading'] = False
-        
-        # Add the last section
-        if current_section['content']:
-            sections.append(current_section)
-        
+        """Parse content into sections, collecting statistics on the way"""
+        tokenizer = SectionTokenizer()
+        sections = tokenizer.tokenize(content)
+        self.statistics = tokenizer.statistics
+        self.sections = sections
         return sections
-    
-    def _get_heading_level(self, title):
-        """Determine heading level based on title content"""
-        if any(keyword in title for keyword in ['摘要', 'Abstract', '引言', 'Introduction', '结论', 'Conclusion']):
-            return 1
-        elif any(keyword in title for keyword in ['文献综述', '研究方法', '研究结果', '讨论', 
-                                                'Literature Review', 'Methodology', 'Findings', 'Discussion']):
-            return 2
-        else:
-            return 3
\ No newline at end of file
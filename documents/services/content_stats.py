@@ -0,0 +1,67 @@
+# documents/services/content_stats.py
+import re
+
+CHART_MARKERS = ('[图表位置]', '[CHART LOCATION]')
+FORMULA_MARKERS = ('[公式位置]', '[FORMULA LOCATION]')
+
+# One alternation per thing we count, so each line is scanned exactly once.
+# Placeholder markers come first so their text is not counted as words.
+_TOKEN_PATTERN = re.compile(
+    r'(?P<chart>\[(?:图表位置|CHART LOCATION)\])'
+    r'|(?P<formula>\[(?:公式位置|FORMULA LOCATION)\])'
+    r'|(?P<cjk>[㐀-䶿一-鿿豈-﫿]+)'
+    r"|(?P<word>[A-Za-z0-9]+(?:['’\-][A-Za-z0-9]+)*)"
+)
+
+
+class ContentStatistics:
+    """Document statistics accumulated line by line during parsing
+
+    Chinese text is counted per character and Latin text per word, which is
+    how both the prompts and the plan limits measure length.
+    """
+
+    def __init__(self):
+        self.cjk_characters = 0
+        self.latin_words = 0
+        self.paragraphs = 0
+        self.headings = 0
+        self.charts = 0
+        self.formulas = 0
+        self.tables = 0
+        # Filled in by the renderer after saving, when it can paginate
+        self.page_count = None
+
+    def add_line(self, line, is_heading=False):
+        """Count one stripped, non-empty line"""
+        if is_heading:
+            self.headings += 1
+        else:
+            self.paragraphs += 1
+
+        for match in _TOKEN_PATTERN.finditer(line):
+            kind = match.lastgroup
+            if kind == 'cjk':
+                self.cjk_characters += match.end() - match.start()
+            elif kind == 'word':
+                self.latin_words += 1
+            elif kind == 'chart':
+                self.charts += 1
+            else:
+                self.formulas += 1
+
+    @property
+    def word_count(self):
+        return self.cjk_characters + self.latin_words
+
+    def as_dict(self):
+        return {
+            'word_count': self.word_count,
+            'cjk_characters': self.cjk_characters,
+            'latin_words': self.latin_words,
+            'paragraphs': self.paragraphs,
+            'headings': self.headings,
+            'charts': self.charts,
+            'formulas': self.formulas,
+            'tables': self.tables,
+        }
@@ -0,0 +1,99 @@
+# documents/services/converters.py
+import os
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+from django.conf import settings
+from django.utils.html import escape
+from .blob_store import new_output_path
+from .previews import render_html, sections_from_docx
+
+
+def render_markdown(sections):
+    """Render parsed sections as Markdown"""
+    lines = []
+    for section in sections:
+        if section['is_heading']:
+            lines.append(f"{'#' * min(max(section.get('level', 1), 1), 6)} {section['title']}")
+            lines.append('')
+        for line in section['content'].splitlines():
+            if line.strip():
+                lines.append(line.strip())
+                lines.append('')
+        if section.get('table'):
+            header, *rows = section['table']
+            lines.append('| ' + ' | '.join(header) + ' |')
+            lines.append('|' + ' --- |' * len(header))
+            lines.extend('| ' + ' | '.join(row) + ' |' for row in rows)
+            lines.append('')
+    return '\n'.join(lines)
+
+
+def _to_html(source_path, output_path):
+    sections = sections_from_docx(source_path)
+    title = next((section['title'] for section in sections if section['is_heading']), '')
+    body = render_html(sections)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(f'<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n'
+                f'<title>{escape(title)}</title>\n</head>\n<body>\n{body}\n</body>\n</html>\n')
+
+
+def _to_markdown(source_path, output_path):
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(render_markdown(sections_from_docx(source_path)))
+
+
+def _to_pdf(source_path, output_path):
+    """Convert with LibreOffice in headless mode
+
+    Each worker process keeps its own LibreOffice profile: soffice refuses to
+    run twice on one profile, and creating a fresh one per call costs seconds.
+    """
+    binary = getattr(settings, 'LIBREOFFICE_BINARY', 'soffice')
+    timeout = getattr(settings, 'DOCUMENT_CONVERSION_TIMEOUT', 120)
+    profile = Path(tempfile.gettempdir(), f'wps_auto_lo_profile_{os.getpid()}').as_uri()
+
+    with tempfile.TemporaryDirectory() as outdir:
+        try:
+            subprocess.run(
+                [binary, f'-env:UserInstallation={profile}', '--headless', '--norestore',
+                 '--convert-to', 'pdf', '--outdir', outdir, source_path],
+                check=True, capture_output=True, timeout=timeout,
+            )
+        except FileNotFoundError:
+            raise Exception(f"LibreOffice not found: {binary}")
+        except subprocess.CalledProcessError as e:
+            raise Exception(f"LibreOffice conversion failed: {e.stderr.decode(errors='replace').strip()}")
+
+        produced = os.path.join(outdir, os.path.splitext(os.path.basename(source_path))[0] + '.pdf')
+        if not os.path.exists(produced):
+            raise Exception("LibreOffice produced no output")
+        shutil.move(produced, output_path)
+
+
+CONVERTERS = {
+    'pdf': _to_pdf,
+    'html': _to_html,
+    'md': _to_markdown,
+}
+SUPPORTED_FORMATS = tuple(CONVERTERS)
+
+
+def convert(source_path, target_format, output_path=None):
+    """Convert a .docx file and return the path of the result
+
+    Without output_path the result goes to a scratch file that the blob store
+    can take over.
+    """
+    if target_format not in CONVERTERS:
+        raise Exception(f"Unsupported format: {target_format}")
+
+    output_path = output_path or new_output_path('converted', target_format)
+    try:
+        CONVERTERS[target_format](source_path, output_path)
+    except Exception:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+    return output_path
@@ -0,0 +1,174 @@
+# documents/services/docx_renderer.py
+import os
+from django.utils.html import escape
+from docx import Document
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls, qn
+from docx.shared import Inches, Pt
+from docx.text.paragraph import Paragraph
+from .charts import CHART_PATTERN
+from .formulas import FORMULA_PATTERN, OMML_NAMESPACE
+from .renderers import BaseRenderer
+from .template_cache import get_template_cache
+
+
+class DocxRenderer(BaseRenderer):
+    """Pure-Python renderer that builds the document in memory with python-docx"""
+
+    def __init__(self):
+        self.doc = None
+
+    def create_document(self, template_path=None, template_hash=None):
+        """Create new document with optional template"""
+        try:
+            if template_path and template_hash:
+                # Clone the compiled skeleton instead of reopening the file
+                self.doc = get_template_cache().new_document(template_hash, template_path)
+            elif template_path and os.path.exists(template_path):
+                self.doc = Document(template_path)
+            else:
+                self.doc = Document()
+            return True
+        except Exception as e:
+            raise Exception(f"Failed to create document: {e}")
+
+    def insert_content(self, content, style="Normal"):
+        """Insert content into document with specified style"""
+        try:
+            for line in content.split('\n'):
+                line = line.strip()
+                if not line:
+                    continue
+                paragraph = self.doc.add_paragraph(line)
+                if style != "Normal":
+                    try:
+                        paragraph.style = style
+                    except KeyError:
+                        pass  # Style might not exist
+            return True
+        except Exception as e:
+            raise Exception(f"Failed to insert content: {e}")
+
+    def insert_heading(self, text, level=1):
+        """Insert heading with specified level"""
+        try:
+            self.doc.add_heading(text.strip(), level=min(max(level, 1), 3))
+            return True
+        except Exception as e:
+            raise Exception(f"Failed to insert heading: {e}")
+
+    def insert_table(self, data, rows, cols):
+        """Insert a table with data
+
+        The rows are built as XML and parsed in one go: filling cells through
+        table.rows[i].cells rebuilds the cell grid on every access.
+        """
+        try:
+            table = self.doc.add_table(rows=0, cols=cols)
+            widths = [grid_col.w for grid_col in table._tbl.tblGrid.gridCol_lst]
+            row_xml = []
+            for row_data in data[:rows]:
+                cells = [str(cell) for cell in row_data[:cols]]
+                cells += [''] * (cols - len(cells))
+                row_xml.append('<w:tr>' + ''.join(
+                    f'<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{width.twips}"/></w:tcPr>'
+                    + (f'<w:p><w:r><w:t xml:space="preserve">{escape(cell)}</w:t></w:r></w:p>' if cell else '<w:p/>')
+                    + '</w:tc>'
+                    for cell, width in zip(cells, widths)
+                ) + '</w:tr>')
+            table._tbl.extend(parse_xml(f"<w:tbl {nsdecls('w')}>{''.join(row_xml)}</w:tbl>"))
+
+            try:
+                table.style = "Table Grid"
+            except KeyError:
+                pass  # Table style might not exist
+
+            return True
+        except Exception as e:
+            raise Exception(f"Failed to insert table: {e}")
+
+    def _all_paragraphs(self):
+        """Every body paragraph in document order, table cells included
+
+        doc.paragraphs only lists top-level ones; skipping a marker in a cell
+        would shift every later image or equation onto the wrong marker.
+        """
+        body = self.doc._body
+        return [Paragraph(p, body) for p in self.doc.element.body.iter(qn('w:p'))]
+
+    def embed_charts(self, chart_paths):
+        """Replace chart markers, in document order, with the given images"""
+        try:
+            images = iter(chart_paths)
+            for paragraph in self._all_paragraphs():
+                text = paragraph.text
+                if not CHART_PATTERN.search(text):
+                    continue
+                parts = CHART_PATTERN.split(text)
+                paragraph.clear()
+                for i, part in enumerate(parts):
+                    if i:
+                        image = next(images, None)
+                        if image:
+                            paragraph.add_run().add_picture(image, width=Inches(6))
+                    if part:
+                        paragraph.add_run(part)
+            return True
+        except Exception as e:
+            raise Exception(f"Failed to embed charts: {e}")
+
+    def embed_formulas(self, formulas):
+        """Replace formula markers, in document order, with the given OMML equations"""
+        try:
+            equations = iter(formulas)
+            for paragraph in self._all_paragraphs():
+                text = paragraph.text
+                if not FORMULA_PATTERN.search(text):
+                    continue
+                parts = FORMULA_PATTERN.split(text)
+                # A formula on a line of its own is a display equation
+                display = not ''.join(parts).strip()
+                paragraph.clear()
+                for i, part in enumerate(parts):
+                    if i:
+                        omml = next(equations, None)
+                        if omml:
+                            if display:
+                                omml = f'<m:oMathPara xmlns:m="{OMML_NAMESPACE}">{omml}</m:oMathPara>'
+                            paragraph._p.append(parse_xml(omml))
+                    if part and not display:
+                        paragraph.add_run(part)
+            return True
+        except Exception as e:
+            raise Exception(f"Failed to embed formulas: {e}")
+
+    def apply_document_styles(self):
+        """Apply professional document styling"""
+        try:
+            for section in self.doc.sections:
+                section.top_margin = Inches(1)
+                section.bottom_margin = Inches(1)
+                section.left_margin = Inches(1)
+                section.right_margin = Inches(1)
+
+            normal_font = self.doc.styles['Normal'].font
+            normal_font.name = "Times New Roman"
+            normal_font.size = Pt(12)
+
+            return True
+        except Exception as e:
+            print(f"Style application warning: {e}")
+            return True  # Non-critical, continue
+
+    def save_document(self, file_path):
+        """Save document to specified path"""
+        try:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            self.doc.save(file_path)
+            return True
+        except Exception as e:
+            raise Exception(f"Failed to save document: {e}")
+
+    def close(self):
+        """Drop the in-memory document"""
+        self.doc = None
@@ -0,0 +1,480 @@
+# documents/services/formulas.py
+import re
+import threading
+from functools import lru_cache
+from django.conf import settings
+from django.utils.html import escape
+from .content_stats import FORMULA_MARKERS
+from .section_tokenizer import find_marker_contexts
+
+FORMULA_PATTERN = re.compile('|'.join(map(re.escape, FORMULA_MARKERS)))
+OMML_NAMESPACE = 'http://schemas.openxmlformats.org/officeDocument/2006/math'
+
+TOKEN_PATTERN = re.compile(r'\\[a-zA-Z]+|\\.|\s+|\d+(?:\.\d+)?|.', re.DOTALL)
+
+# Run properties (m:rPr content) for the font commands
+STYLES = {
+    'mathrm': '<m:sty m:val="p"/>',
+    'operatorname': '<m:sty m:val="p"/>',
+    'mathit': '<m:sty m:val="i"/>',
+    'mathbf': '<m:sty m:val="b"/>',
+    'boldsymbol': '<m:sty m:val="bi"/>',
+    'mathbb': '<m:scr m:val="double-struck"/><m:sty m:val="p"/>',
+    'mathcal': '<m:scr m:val="script"/><m:sty m:val="p"/>',
+    'mathfrak': '<m:scr m:val="fraktur"/><m:sty m:val="p"/>',
+    'mathsf': '<m:scr m:val="sans-serif"/><m:sty m:val="p"/>',
+}
+TEXT_COMMANDS = ('text', 'textrm', 'textit', 'textbf', 'mbox')
+UPRIGHT = '<m:sty m:val="p"/>'
+
+SYMBOLS = {
+    'alpha': 'α', 'beta': 'β', 'gamma': 'γ', 'delta': 'δ', 'epsilon': 'ϵ', 'varepsilon': 'ε',
+    'zeta': 'ζ', 'eta': 'η', 'theta': 'θ', 'vartheta': 'ϑ', 'iota': 'ι', 'kappa': 'κ',
+    'lambda': 'λ', 'mu': 'μ', 'nu': 'ν', 'xi': 'ξ', 'pi': 'π', 'varpi': 'ϖ', 'rho': 'ρ',
+    'varrho': 'ϱ', 'sigma': 'σ', 'varsigma': 'ς', 'tau': 'τ', 'upsilon': 'υ', 'phi': 'ϕ',
+    'varphi': 'φ', 'chi': 'χ', 'psi': 'ψ', 'omega': 'ω',
+    'Gamma': 'Γ', 'Delta': 'Δ', 'Theta': 'Θ', 'Lambda': 'Λ', 'Xi': 'Ξ', 'Pi': 'Π',
+    'Sigma': 'Σ', 'Upsilon': 'Υ', 'Phi': 'Φ', 'Psi': 'Ψ', 'Omega': 'Ω',
+    'times': '×', 'cdot': '⋅', 'cdotp': '⋅', 'pm': '±', 'mp': '∓', 'div': '÷', 'ast': '∗',
+    'star': '⋆', 'circ': '∘', 'bullet': '∙', 'oplus': '⊕', 'otimes': '⊗', 'setminus': '∖',
+    'leq': '≤', 'le': '≤', 'geq': '≥', 'ge': '≥', 'neq': '≠', 'ne': '≠', 'approx': '≈',
+    'equiv': '≡', 'sim': '∼', 'simeq': '≃', 'cong': '≅', 'propto': '∝', 'll': '≪', 'gg': '≫',
+    'in': '∈', 'notin': '∉', 'ni': '∋', 'subset': '⊂', 'subseteq': '⊆', 'supset': '⊃',
+    'supseteq': '⊇', 'cup': '∪', 'cap': '∩', 'emptyset': '∅', 'varnothing': '∅',
+    'forall': '∀', 'exists': '∃', 'neg': '¬', 'lnot': '¬', 'land': '∧', 'wedge': '∧',
+    'lor': '∨', 'vee': '∨', 'top': '⊤', 'bot': '⊥', 'perp': '⊥', 'parallel': '∥', 'mid': '∣',
+    'to': '→', 'rightarrow': '→', 'leftarrow': '←', 'leftrightarrow': '↔', 'Rightarrow': '⇒',
+    'Leftarrow': '⇐', 'Leftrightarrow': '⇔', 'implies': '⟹', 'iff': '⟺', 'mapsto': '↦',
+    'uparrow': '↑', 'downarrow': '↓', 'infty': '∞', 'partial': '∂', 'nabla': '∇',
+    'prime': '′', 'angle': '∠', 'degree': '°', 'hbar': 'ℏ', 'ell': 'ℓ', 'Re': 'ℜ', 'Im': 'ℑ',
+    'aleph': 'ℵ', 'ldots': '…', 'dots': '…', 'cdots': '⋯', 'vdots': '⋮', 'ddots': '⋱',
+    'langle': '⟨', 'rangle': '⟩', 'lfloor': '⌊', 'rfloor': '⌋', 'lceil': '⌈', 'rceil': '⌉',
+    'lvert': '|', 'rvert': '|', 'vert': '|', 'lVert': '‖', 'rVert': '‖', 'Vert': '‖',
+    'quad': ' ', 'qquad': '  ',
+    '|': '‖', '{': '{', '}': '}', '%': '%', '$': '$', '&': '&', '#': '#', '_': '_',
+    ',': ' ', ':': ' ', ';': ' ', ' ': ' ', '!': '',
+}
+# Large operators: symbol and where their limits go
+NARY = {
+    'sum': ('∑', 'undOvr'), 'prod': ('∏', 'undOvr'), 'coprod': ('∐', 'undOvr'),
+    'bigcup': ('⋃', 'undOvr'), 'bigcap': ('⋂', 'undOvr'), 'bigoplus': ('⨁', 'undOvr'),
+    'bigotimes': ('⨂', 'undOvr'), 'int': ('∫', 'subSup'), 'iint': ('∬', 'subSup'),
+    'iiint': ('∭', 'subSup'), 'oint': ('∮', 'subSup'),
+}
+FUNCTIONS = {
+    'sin', 'cos', 'tan', 'cot', 'sec', 'csc', 'arcsin', 'arccos', 'arctan', 'sinh', 'cosh',
+    'tanh', 'log', 'ln', 'lg', 'exp', 'det', 'dim', 'ker', 'deg', 'gcd', 'Pr', 'arg',
+}
+# Functions whose subscript goes underneath
+LIMIT_FUNCTIONS = {'lim', 'max', 'min', 'sup', 'inf', 'limsup', 'liminf', 'argmax', 'argmin'}
+ACCENTS = {
+    'hat': '̂', 'widehat': '̂', 'tilde': '̃', 'widetilde': '̃',
+    'bar': '̅', 'vec': '⃗', 'dot': '̇', 'ddot': '̈', 'check': '̌',
+}
+# Matrix environments and their delimiters
+MATRICES = {
+    'matrix': ('', ''), 'pmatrix': ('(', ')'), 'bmatrix': ('[', ']'), 'Bmatrix': ('{', '}'),
+    'vmatrix': ('|', '|'), 'Vmatrix': ('‖', '‖'), 'cases': ('{', ''), 'array': ('', ''),
+}
+# Environments rendered as a column of equations
+EQUATION_ARRAYS = {'align', 'align*', 'aligned', 'gather', 'gather*', 'gathered', 'split',
+                   'eqnarray', 'eqnarray*'}
+# Sizing and layout commands with no OMML counterpart
+IGNORED = {'displaystyle', 'textstyle', 'scriptstyle', 'limits', 'nolimits', 'nonumber',
+           'notag', 'big', 'Big', 'bigg', 'Bigg', 'bigl', 'bigr', 'Bigl', 'Bigr', 'biggl',
+           'biggr', 'Biggl', 'Biggr', 'middle'}
+
+
+class FormulaError(Exception):
+    """LaTeX that cannot be converted"""
+
+
+def normalize_latex(latex):
+    """Canonical form of a LaTeX expression: no math delimiters, minimal whitespace
+
+    Equations that differ only in spacing or delimiters share one cache entry.
+    """
+    latex = latex.strip()
+    for opening, closing in (('$$', '$$'), ('\\[', '\\]'), ('\\(', '\\)'), ('$', '$')):
+        if latex.startswith(opening) and latex.endswith(closing) and len(latex) > len(opening) + len(closing):
+            latex = latex[len(opening):-len(closing)].strip()
+            break
+    latex = re.sub(r'\s+', ' ', latex)
+    # Spaces next to symbols are insignificant ("\alpha x" keeps its space, "\ " is kept)
+    return re.sub(r'(?<!\\) (?=[^\w\\ ])|(?<=[^\w\s\\]) ', '', latex)
+
+
+def _run(text, style=''):
+    props = f"<m:rPr>{style}</m:rPr>" if style else ''
+    return f'<m:r>{props}<m:t xml:space="preserve">{escape(text)}</m:t></m:r>'
+
+
+def _arg(tag, content):
+    return f"<m:{tag}>{content}</m:{tag}>" if content else f"<m:{tag}/>"
+
+
+def _delimited(content, opening, closing):
+    return (f'<m:d><m:dPr><m:begChr m:val="{escape(opening)}"/><m:endChr m:val="{escape(closing)}"/>'
+            f'</m:dPr>{_arg("e", content)}</m:d>')
+
+
+class _Parser:
+    """Recursive-descent LaTeX parser producing OMML fragments
+
+    Atoms are ('run', text, style) for plain characters, merged into one m:r
+    when adjacent, or ('xml', fragment) for structures. Scripts apply to the
+    atom just before them, as in TeX.
+    """
+
+    def __init__(self, latex):
+        self.tokens = TOKEN_PATTERN.findall(latex)
+        self.pos = 0
+        self.styles = ['']
+
+    def parse(self):
+        atoms = self._expression(stops=())
+        if self.pos < len(self.tokens):
+            raise FormulaError(f"Unexpected '{self.tokens[self.pos]}'")
+        return self._serialize(atoms)
+
+    # Token access
+
+    def _peek(self, skip_space=True):
+        if skip_space:
+            while self.pos < len(self.tokens) and self.tokens[self.pos].isspace():
+                self.pos += 1
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _take(self):
+        token = self._peek()
+        if token is None:
+            raise FormulaError("Unexpected end of formula")
+        self.pos += 1
+        return token
+
+    def _expect(self, token):
+        if self._take() != token:
+            raise FormulaError(f"Expected '{token}'")
+
+    def _raw_group(self):
+        """Source text of a braced argument, for \\text and environment names"""
+        self._expect('{')
+        depth, parts = 1, []
+        while True:
+            if self.pos >= len(self.tokens):
+                raise FormulaError("Unbalanced braces")
+            token = self.tokens[self.pos]
+            self.pos += 1
+            depth += {'{': 1, '}': -1}.get(token, 0)
+            if depth == 0:
+                return ''.join(parts)
+            parts.append(token)
+
+    # Grammar
+
+    def _expression(self, stops):
+        atoms = []
+        while True:
+            token = self._peek()
+            if token is None or token in stops:
+                return atoms
+            if token == '}':
+                raise FormulaError("Unbalanced braces")
+            if token in ('^', '_'):
+                # A script with no base, e.g. "^{14}C"
+                base = [('run', '', '')]
+            else:
+                base = self._atom()
+                if base is None:
+                    continue
+            atoms.extend(self._scripts(base))
+
+    def _argument(self):
+        """One atom or braced group, as serialized OMML"""
+        token = self._peek()
+        if token == '{':
+            self._take()
+            atoms = self._expression(stops=('}',))
+            self._expect('}')
+            return self._serialize(atoms)
+        atom = self._atom()
+        return self._serialize(atom or [])
+
+    def _scripts(self, base):
+        sub = sup = None
+        while self._peek() in ('^', '_'):
+            marker = self._take()
+            if marker == '^' and sup is None:
+                sup = self._argument()
+            elif marker == '_' and sub is None:
+                sub = self._argument()
+            else:
+                raise FormulaError("Double script")
+
+        kind = base[0][0] if len(base) == 1 else None
+        if kind == 'nary':
+            symbol, location = base[0][1]
+            return [self._nary(symbol, location, sub, sup)]
+        if sub is None and sup is None:
+            return base
+        if kind == 'limit':
+            name = self._serialize([('run', base[0][1], UPRIGHT)])
+            result = f"<m:limLow><m:e>{name}</m:e>{_arg('lim', sub)}</m:limLow>" if sub else name
+            return self._scripts_on([('xml', result)], None, sup)
+        return self._scripts_on(base, sub, sup)
+
+    def _scripts_on(self, base, sub, sup):
+        body = _arg('e', self._serialize(base))
+        if sub is not None and sup is not None:
+            return [('xml', f"<m:sSubSup>{body}{_arg('sub', sub)}{_arg('sup', sup)}</m:sSubSup>")]
+        if sub is not None:
+            return [('xml', f"<m:sSub>{body}{_arg('sub', sub)}</m:sSub>")]
+        if sup is not None:
+            return [('xml', f"<m:sSup>{body}{_arg('sup', sup)}</m:sSup>")]
+        return base
+
+    def _nary(self, symbol, location, sub=None, sup=None):
+        # The operand is the next atom; OMML draws nothing around it either way
+        operand = ''
+        if self._peek() not in (None, '}', '&', '\\\\', '\\right', '\\end', ']'):
+            atom = self._atom()
+            operand = self._serialize(self._scripts(atom)) if atom else ''
+        hide = ('<m:subHide m:val="1"/>' if sub is None else '') + \
+               ('<m:supHide m:val="1"/>' if sup is None else '')
+        return ('xml', f'<m:nary><m:naryPr><m:chr m:val="{symbol}"/><m:limLoc m:val="{location}"/>'
+                       f'{hide}</m:naryPr>{_arg("sub", sub)}{_arg("sup", sup)}{_arg("e", operand)}</m:nary>')
+
+    def _atom(self):
+        """Parse one atom and return it as a list of atoms (None for no output)"""
+        token = self._take()
+        style = self.styles[-1]
+        if token == '{':
+            atoms = self._expression(stops=('}',))
+            self._expect('}')
+            return [('xml', self._serialize(atoms))]
+        if token == '~':
+            return [('run', ' ', style)]
+        if token == "'":
+            return [('run', '′', style)]
+        if not token.startswith('\\'):
+            return [('run', token, style)]
+
+        name = token[1:]
+        if name in SYMBOLS:
+            return [('run', SYMBOLS[name], style)]
+        if name in NARY:
+            return [('nary', NARY[name])]
+        if name in FUNCTIONS:
+            return [('run', name, UPRIGHT)]
+        if name in LIMIT_FUNCTIONS:
+            return [('limit', name)]
+        if name in IGNORED:
+            return None
+        if name in ('frac', 'dfrac', 'tfrac', 'cfrac'):
+            return [('xml', f"<m:f>{_arg('num', self._argument())}{_arg('den', self._argument())}</m:f>")]
+        if name == 'binom':
+            fraction = (f'<m:f><m:fPr><m:type m:val="noBar"/></m:fPr>{_arg("num", self._argument())}'
+                        f'{_arg("den", self._argument())}</m:f>')
+            return [('xml', _delimited(fraction, '(', ')'))]
+        if name == 'sqrt':
+            return [('xml', self._radical())]
+        if name in ACCENTS:
+            return [('xml', f'<m:acc><m:accPr><m:chr m:val="{ACCENTS[name]}"/></m:accPr>'
+                            f'{_arg("e", self._argument())}</m:acc>')]
+        if name in ('overline', 'underline'):
+            position = 'top' if name == 'overline' else 'bot'
+            return [('xml', f'<m:bar><m:barPr><m:pos m:val="{position}"/></m:barPr>'
+                            f'{_arg("e", self._argument())}</m:bar>')]
+        if name in STYLES:
+            self.styles.append(STYLES[name])
+            try:
+                return [('xml', self._argument())]
+            finally:
+                self.styles.pop()
+        if name in TEXT_COMMANDS:
+            return [('run', self._raw_group(), '<m:nor/>')]
+        if name == 'left':
+            return [('xml', self._left())]
+        if name == 'begin':
+            return [('xml', self._environment())]
+        if name in ('label', 'tag'):
+            self._raw_group()
+            return None
+        if name in ('right', 'end'):
+            raise FormulaError(f"Unmatched \\{name}")
+        # Unknown command: show its name upright rather than fail the formula
+        return [('run', name, UPRIGHT)]
+
+    def _radical(self):
+        degree = None
+        if self._peek() == '[':
+            self._take()
+            degree = self._serialize(self._expression(stops=(']',)))
+            self._expect(']')
+        body = _arg('e', self._argument())
+        if degree:
+            return f"<m:rad>{_arg('deg', degree)}{body}</m:rad>"
+        return f'<m:rad><m:radPr><m:degHide m:val="1"/></m:radPr><m:deg/>{body}</m:rad>'
+
+    def _delimiter(self):
+        token = self._take()
+        if token == '.':
+            return ''
+        if token.startswith('\\'):
+            return SYMBOLS.get(token[1:], token[1:])
+        return token
+
+    def _left(self):
+        opening = self._delimiter()
+        content = self._serialize(self._expression(stops=('\\right',)))
+        self._expect('\\right')
+        return _delimited(content, opening, self._delimiter())
+
+    def _environment(self):
+        name = self._raw_group().strip()
+        if name == 'array' and self._peek() == '{':
+            self._raw_group()  # column specification
+
+        rows = [[]]
+        while True:
+            cell = self._serialize(self._expression(stops=('&', '\\\\', '\\end')))
+            rows[-1].append(cell)
+            token = self._take()
+            if token == '\\\\':
+                rows.append([])
+            elif token == '\\end':
+                break
+        if self._raw_group().strip() != name:
+            raise FormulaError(f"Unmatched \\begin{{{name}}}")
+        if rows[-1] == [''] and len(rows) > 1:
+            rows.pop()  # trailing \\
+
+        if name in MATRICES:
+            columns = max(len(row) for row in rows)
+            body = ''.join(
+                '<m:mr>' + ''.join(_arg('e', cell) for cell in row + [''] * (columns - len(row))) + '</m:mr>'
+                for row in rows
+            )
+            matrix = f"<m:m>{body}</m:m>"
+            opening, closing = MATRICES[name]
+            return _delimited(matrix, opening, closing) if opening or closing else matrix
+        if name in EQUATION_ARRAYS:
+            return '<m:eqArr>' + ''.join(_arg('e', ''.join(row)) for row in rows) + '</m:eqArr>'
+        # equation and unknown environments: the content as it is
+        return ''.join(''.join(row) for row in rows)
+
+    def _serialize(self, atoms):
+        parts = []
+        text, text_style = [], None
+        for atom in atoms:
+            if atom[0] == 'run' and atom[1] and (text_style is None or atom[2] == text_style):
+                text.append(atom[1])
+                text_style = atom[2]
+                continue
+            if text:
+                parts.append(_run(''.join(text), text_style))
+                text, text_style = [], None
+            if atom[0] == 'run':
+                if atom[1]:
+                    text, text_style = [atom[1]], atom[2]
+            elif atom[0] == 'limit':
+                parts.append(_run(atom[1], UPRIGHT))
+            elif atom[0] == 'nary':
+                parts.append(_run(atom[1][0]))  # bare operator used as a script
+            else:
+                parts.append(atom[1])
+        if text:
+            parts.append(_run(''.join(text), text_style))
+        return ''.join(parts)
+
+
+def _convert(latex):
+    body = _Parser(latex).parse()
+    return f'<m:oMath xmlns:m="{OMML_NAMESPACE}">{body}</m:oMath>'
+
+
+_cached_convert = None
+_cache_lock = threading.Lock()
+
+
+def _converter():
+    global _cached_convert
+    with _cache_lock:
+        if _cached_convert is None:
+            _cached_convert = lru_cache(maxsize=getattr(settings, 'FORMULA_CACHE_SIZE', 1024))(_convert)
+        return _cached_convert
+
+
+def latex_to_omml(latex):
+    """Convert LaTeX to an OMML <m:oMath> element (as a string)
+
+    Conversions are memoized per process on the normalized LaTeX, so the
+    equations that recur across documents are parsed once.
+    """
+    return _converter()(normalize_latex(latex))
+
+
+def text_to_omml(text):
+    """OMML showing text as-is, for LaTeX that could not be converted"""
+    return f'<m:oMath xmlns:m="{OMML_NAMESPACE}">{_run(text, "<m:nor/>")}</m:oMath>'
+
+
+def formula_cache_info():
+    return _converter().cache_info()
+
+
+def clear_formula_cache():
+    _converter().cache_clear()
+
+
+def find_formula_contexts(content):
+    """Return {'section', 'text'} for every formula marker, in document order"""
+    return find_marker_contexts(content, FORMULA_PATTERN)
+
+
+class FormulaStage:
+    """Fetch LaTeX for every formula marker and convert it on a background thread
+
+    Like the chart stage, it runs while the document body is rendered and is
+    best effort: a formula that fails to convert is shown as its LaTeX source,
+    and if the whole stage fails the markers are removed.
+    """
+
+    def __init__(self, ai_service, topic, content, requirements):
+        self.ai_service = ai_service
+        self.topic = topic
+        self.content = content
+        self.requirements = requirements
+        self.formulas = []
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        contexts = find_formula_contexts(self.content)
+        limit = getattr(settings, 'FORMULA_MAX_PER_DOCUMENT', 20)
+        self.formulas = [None] * len(contexts)
+        if not contexts:
+            return
+        try:
+            sources = self.ai_service.generate_formulas(
+                self.topic, contexts[:limit], self.requirements.get('language', 'zh'),
+                use_cache=self.requirements.get('use_cache', True)
+            )
+            for i, latex in enumerate(sources):
+                if not latex:
+                    continue
+                try:
+                    self.formulas[i] = latex_to_omml(latex)
+                except FormulaError as e:
+                    print(f"Formula conversion warning: {e}")
+                    self.formulas[i] = text_to_omml(normalize_latex(latex))
+        except Exception as e:
+            print(f"Formula stage warning: {e}")
+
+    def result(self):
+        """Wait for the stage and return one OMML string (or None) per marker"""
+        self._thread.join()
+        return self.formulas
@@ -0,0 +1,277 @@
+# documents/services/http_client.py
+import os
+import random
+import socket
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class AIServiceError(Exception):
+    """Raised when the AI backend cannot produce a response"""
+
+
+class CircuitOpenError(AIServiceError):
+    """Raised without contacting the backend while the circuit is open"""
+
+
+def _shared_cache():
+    try:
+        return caches[getattr(settings, 'AI_METRICS_CACHE_ALIAS', 'ai_responses')]
+    except InvalidCacheBackendError:
+        return None
+
+
+class CircuitBreaker:
+    """Fail fast after repeated upstream failures
+
+    After failure_threshold consecutive failures the circuit opens and
+    requests are rejected for reset_timeout seconds. The next request is then
+    let through as a probe: success closes the circuit, failure reopens it.
+    Opening is also announced through the shared cache so other workers stop
+    calling a dead upstream without paying for their own failures first.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    SHARED_KEY = 'ai_circuit_open_until'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.time() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self.opened_at = time.time()
+                return True
+            if self.state == self.HALF_OPEN:
+                if time.time() - self.opened_at < self.reset_timeout:
+                    return False  # A probe is already in flight
+                # The probe never reported back; let another one through
+                self.opened_at = time.time()
+                return True
+
+        shared = _shared_cache()
+        open_until = None
+        if shared is not None:
+            try:
+                open_until = shared.get(self.SHARED_KEY)
+            except Exception as e:
+                # Fall back to this process's own view of the upstream
+                print(f"Circuit breaker shared state error: {e}")
+        if open_until and open_until > time.time():
+            with self._lock:
+                self._open(opened_at=open_until - self.reset_timeout)
+            return False
+        return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self._open()
+                opened_at = self.opened_at
+            else:
+                return
+
+        shared = _shared_cache()
+        if shared is not None:
+            try:
+                shared.set(self.SHARED_KEY, opened_at + self.reset_timeout, self.reset_timeout)
+            except Exception as e:
+                print(f"Circuit breaker shared state error: {e}")
+
+    def _open(self, opened_at=None):
+        if self.state != self.OPEN:
+            self.times_opened += 1
+        self.state = self.OPEN
+        self.opened_at = opened_at or time.time()
+
+    def get_state(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'times_opened': self.times_opened,
+                'opened_at': self.opened_at,
+            }
+
+
+class ResilientHTTPClient:
+    """Keep-alive session with bounded, jittered retries and a circuit breaker"""
+
+    def __init__(self, max_retries=3, backoff_base=1.0, backoff_max=20.0,
+                 pool_size=10, breaker=None):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._lock = threading.Lock()
+        self._last_published = 0
+        self.metrics = {
+            'requests': 0,
+            'retries': 0,
+            'failures': 0,
+            'rejected_by_breaker': 0,
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self.metrics[name] += 1
+
+    def _backoff(self, attempt, response=None):
+        """Exponential backoff with full jitter, honouring Retry-After"""
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def post(self, url, **kwargs):
+        """POST with retries on connection errors, timeouts, 429 and 5xx"""
+        if not self.breaker.allow_request():
+            self._count('rejected_by_breaker')
+            self.publish_metrics()
+            raise CircuitOpenError("AI service is unavailable, please try again later")
+
+        for attempt in range(self.max_retries + 1):
+            self._count('requests')
+            response = None
+            try:
+                response = self.session.post(url, **kwargs)
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    response.raise_for_status()
+                    self.breaker.record_success()
+                    self.publish_metrics()
+                    return response
+                error = requests.exceptions.HTTPError(
+                    f"{response.status_code} from AI service", response=response
+                )
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+            except requests.exceptions.RequestException as e:
+                # Other 4xx responses will not improve with a retry, but they
+                # do show the upstream is reachable
+                self.breaker.record_success()
+                self._count('failures')
+                self.publish_metrics()
+                raise AIServiceError(f"AI service request failed: {e}")
+            except Exception:
+                # Anything unexpected still settles the breaker, or a
+                # half-open probe would never report back
+                self.record_failure()
+                raise
+
+            if attempt < self.max_retries:
+                self._count('retries')
+                if response is not None:
+                    response.close()
+                time.sleep(self._backoff(attempt, response))
+
+        self.record_failure()
+        raise AIServiceError(f"AI service request failed after {self.max_retries + 1} attempts: {error}")
+
+    def record_failure(self):
+        """Count a failed call, including one that failed after post() returned
+
+        A stream that breaks mid-response is a failure of the upstream even
+        though the request itself succeeded.
+        """
+        self._count('failures')
+        self.breaker.record_failure()
+        self.publish_metrics()
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self.metrics)
+        metrics['circuit_breaker'] = self.breaker.get_state()
+        return metrics
+
+    def publish_metrics(self, force=False):
+        """Share this process's metrics so the web process can report them"""
+        now = time.time()
+        if not force and now - self._last_published < 10:
+            return
+        self._last_published = now
+
+        shared = _shared_cache()
+        if shared is None:
+            return
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        try:
+            shared.set(f"ai_metrics:{worker_id}", self.get_metrics(), 300)
+            workers = shared.get('ai_metrics:workers') or []
+            if worker_id not in workers:
+                shared.set('ai_metrics:workers', (workers + [worker_id])[-100:], None)
+        except Exception as e:
+            print(f"AI metrics publish error: {e}")
+
+
+def collect_worker_metrics():
+    """Return the latest metrics published by every process
+
+    Empty when the shared cache is unavailable, so callers still get this
+    process's own snapshot.
+    """
+    shared = _shared_cache()
+    if shared is None:
+        return {}
+    try:
+        workers = shared.get('ai_metrics:workers') or []
+        snapshots = shared.get_many([f"ai_metrics:{worker_id}" for worker_id in workers])
+    except Exception as e:
+        print(f"AI metrics read error: {e}")
+        return {}
+    return {key.split(':', 1)[1]: value for key, value in snapshots.items()}
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """Return this worker process's HTTP client, rebuilding it after a fork"""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = ResilientHTTPClient(
+                max_retries=getattr(settings, 'AI_HTTP_MAX_RETRIES', 3),
+                backoff_base=getattr(settings, 'AI_HTTP_BACKOFF_BASE', 1.0),
+                backoff_max=getattr(settings, 'AI_HTTP_BACKOFF_MAX', 20.0),
+                pool_size=getattr(settings, 'AI_HTTP_POOL_SIZE', 10),
+                breaker=CircuitBreaker(
+                    failure_threshold=getattr(settings, 'AI_CIRCUIT_FAILURE_THRESHOLD', 5),
+                    reset_timeout=getattr(settings, 'AI_CIRCUIT_RESET_TIMEOUT', 30),
+                ),
+            )
+            _client_pid = os.getpid()
+        return _client
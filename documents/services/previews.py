@@ -0,0 +1,108 @@
+# documents/services/previews.py
+import gzip
+from django.conf import settings
+from django.utils.html import escape
+from ..models import DocumentPreview
+
+# Bump to have stored previews rebuilt (from the .docx) on their next request
+PREVIEW_VERSION = 1
+HTML = 'html'
+TEXT = 'text'
+PREVIEW_KINDS = (HTML, TEXT)
+
+
+def render_html(sections):
+    """Render parsed sections as an HTML fragment, escaping all text"""
+    parts = ['<article class="document-preview">']
+    for section in sections:
+        if section['is_heading']:
+            level = min(max(section.get('level', 1), 1), 5) + 1
+            parts.append(f"<h{level}>{escape(section['title'])}</h{level}>")
+        for line in section['content'].splitlines():
+            if line.strip():
+                parts.append(f"<p>{escape(line.strip())}</p>")
+        if section.get('table'):
+            header, *rows = section['table']
+            parts.append('<table>')
+            parts.append('<tr>' + ''.join(f"<th>{escape(cell)}</th>" for cell in header) + '</tr>')
+            for row in rows:
+                parts.append('<tr>' + ''.join(f"<td>{escape(cell)}</td>" for cell in row) + '</tr>')
+            parts.append('</table>')
+    parts.append('</article>')
+    return '\n'.join(parts)
+
+
+def render_text(sections, max_chars=None):
+    """Plain-text excerpt of the first max_chars characters"""
+    max_chars = max_chars or getattr(settings, 'DOCUMENT_PREVIEW_TEXT_CHARS', 2000)
+    lines = []
+    length = 0
+    for section in sections:
+        table_lines = [' | '.join(row) for row in section.get('table') or []]
+        for line in ([section['title']] if section['is_heading'] else []) + section['content'].splitlines() + table_lines:
+            line = line.strip()
+            if not line:
+                continue
+            lines.append(line)
+            length += len(line) + 1
+            if length >= max_chars:
+                return '\n'.join(lines)[:max_chars].rstrip() + '…'
+    return '\n'.join(lines)
+
+
+def sections_from_docx(file_path):
+    """Rebuild sections from a saved .docx (older tasks' previews, format conversion)"""
+    from docx import Document
+    from docx.oxml.ns import qn
+    from docx.table import Table
+
+    document = Document(file_path)
+    # paragraph.style searches the styles part on every call; map ids once instead
+    style_names = {style.style_id: style.name for style in document.styles}
+    sections = []
+    for element in document.element.body.iterchildren():
+        if element.tag == qn('w:tbl'):
+            rows = [[cell.text.strip() for cell in row.cells] for row in Table(element, document).rows]
+            if not rows:
+                continue
+            if not sections or sections[-1].get('table'):
+                sections.append({'title': '', 'content': '', 'is_heading': False, 'level': 0})
+            sections[-1]['table'] = rows
+            continue
+        if element.tag != qn('w:p'):
+            continue
+
+        text = ''.join(node.text or '' for node in element.iter(qn('w:t'))).strip()
+        if not text:
+            continue
+        style = style_names.get(element.style, '')
+        if style.startswith(('Heading', '标题')) and style[-1:].isdigit():
+            sections.append({'title': text, 'content': '', 'is_heading': True, 'level': int(style[-1])})
+        elif sections and not sections[-1].get('table'):
+            sections[-1]['content'] += text + '\n'
+        else:
+            sections.append({'title': '', 'content': text + '\n', 'is_heading': False, 'level': 0})
+    return sections
+
+
+def build_preview(blob, sections):
+    """Render and store the compressed previews of a blob's document"""
+    preview, _ = DocumentPreview.objects.update_or_create(blob=blob, defaults={
+        'html_gz': gzip.compress(render_html(sections).encode('utf-8')),
+        'text_gz': gzip.compress(render_text(sections).encode('utf-8')),
+        'version': PREVIEW_VERSION,
+    })
+    return preview
+
+
+def get_preview(blob, file_path):
+    """Return the blob's current preview, building it from the file if needed"""
+    preview = DocumentPreview.objects.filter(blob=blob, version=PREVIEW_VERSION).first()
+    if preview is None:
+        preview = build_preview(blob, sections_from_docx(file_path))
+    return preview
+
+
+def preview_etag(blob, kind):
+    # The blob is content-addressed, so its hash identifies the preview too
+    return f'"{blob.sha256[:32]}-{kind}-{PREVIEW_VERSION}"'
@@ -0,0 +1,184 @@
+# documents/services/progress.py
+import json
+import os
+import threading
+import time
+import redis
+from django.conf import settings
+
+QUEUED = 'queued'
+GENERATING = 'generating'
+RENDERING = 'rendering'
+CHARTS = 'charts'
+FORMULAS = 'formulas'
+SAVING = 'saving'
+COMPLETED = 'completed'
+FAILED = 'failed'
+TERMINAL_STAGES = (COMPLETED, FAILED)
+
+
+def task_channel(task_id):
+    return f"doc_progress:task:{task_id}"
+
+
+def user_channel(user_id):
+    return f"doc_progress:user:{user_id}"
+
+
+def _last_event_key(task_id):
+    return f"doc_progress:last:{task_id}"
+
+
+def _publish_events(client, events):
+    """Publish events and remember each task's latest one, in one round trip"""
+    ttl = getattr(settings, 'PROGRESS_EVENT_TTL', 3600)
+    pipe = client.pipeline(transaction=False)
+    for event in events:
+        payload = json.dumps(event, ensure_ascii=False)
+        pipe.set(_last_event_key(event['task_id']), payload, ex=ttl)
+        pipe.publish(task_channel(event['task_id']), payload)
+        pipe.publish(user_channel(event['user_id']), payload)
+    pipe.execute()
+
+
+def make_event(task_id, user_id, stage, percent=None, **extra):
+    return {
+        'task_id': task_id,
+        'user_id': user_id,
+        'stage': stage,
+        'percent': percent,
+        'timestamp': time.time(),
+        **extra,
+    }
+
+
+class ProgressPublisher:
+    """Publish stage transitions of one task to its task and user channels
+
+    Publishing is best effort: a Redis outage must never fail a generation.
+    """
+
+    def __init__(self, task_id, user_id, client=None):
+        self.task_id = task_id
+        self.user_id = user_id
+        self.client = client
+        self._last = None
+
+    def publish(self, stage, percent=None, **extra):
+        # Skip repeats so per-delta progress costs at most one event per percent
+        if (stage, percent) == self._last and not extra:
+            return
+        self._last = (stage, percent)
+
+        event = make_event(self.task_id, self.user_id, stage, percent, **extra)
+        try:
+            _publish_events(self.client or get_progress_redis(), [event])
+        except Exception as e:
+            print(f"Progress publish warning: {e}")
+
+    def track_generation(self, deltas, target_chars):
+        """Pass content deltas through, reporting progress against the target length"""
+        received = 0
+        for delta in deltas:
+            received += len(delta)
+            if target_chars:
+                self.publish(GENERATING, min(99, received * 100 // target_chars))
+            yield delta
+
+
+def publish_queued(task_ids, user_id, client=None):
+    """Announce newly submitted tasks"""
+    events = [make_event(task_id, user_id, QUEUED, 0) for task_id in task_ids]
+    try:
+        _publish_events(client or get_progress_redis(), events)
+    except Exception as e:
+        print(f"Progress publish warning: {e}")
+
+
+def get_last_events(task_ids, client=None):
+    """Return the latest known event of each task, skipping tasks with none"""
+    if not task_ids:
+        return []
+    try:
+        payloads = (client or get_progress_redis()).mget(
+            [_last_event_key(task_id) for task_id in task_ids]
+        )
+    except Exception as e:
+        print(f"Progress read warning: {e}")
+        return []
+    return [json.loads(payload) for payload in payloads if payload]
+
+
+def format_event(event):
+    """Encode an event as one SSE frame"""
+    return f"event: progress\nid: {event['timestamp']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+def stream_events(channels, snapshot, until_task=None, client=None):
+    """Yield SSE frames for events published on channels
+
+    snapshot is called after subscribing, so no event can fall between the
+    initial state and the live stream. With until_task the stream ends when
+    that task reaches a terminal stage; otherwise it ends after
+    PROGRESS_STREAM_TIMEOUT seconds and the browser reconnects.
+    """
+    timeout = getattr(settings, 'PROGRESS_STREAM_TIMEOUT', 300)
+    heartbeat = getattr(settings, 'PROGRESS_HEARTBEAT_INTERVAL', 15)
+
+    yield "retry: 3000\n\n"
+    pubsub = (client or get_progress_redis()).pubsub(ignore_subscribe_messages=True)
+    try:
+        pubsub.subscribe(*channels)
+    except Exception as e:
+        # Without Redis, send the current state and let the browser retry
+        print(f"Progress subscribe warning: {e}")
+        for event in snapshot():
+            yield format_event(event)
+        return
+
+    try:
+
+        def finished(event):
+            return until_task is not None and event['task_id'] == until_task and \
+                event['stage'] in TERMINAL_STAGES
+
+        for event in snapshot():
+            yield format_event(event)
+            if finished(event):
+                return
+
+        deadline = time.monotonic() + timeout
+        last_sent = time.monotonic()
+        while time.monotonic() < deadline:
+            message = pubsub.get_message(timeout=1.0)
+            if message is None:
+                if time.monotonic() - last_sent >= heartbeat:
+                    yield ": keepalive\n\n"
+                    last_sent = time.monotonic()
+                continue
+
+            event = json.loads(message['data'])
+            yield format_event(event)
+            last_sent = time.monotonic()
+            if finished(event):
+                return
+    finally:
+        pubsub.close()
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_progress_redis():
+    """Return this process's Redis client for progress events, rebuilding it after a fork"""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = redis.Redis.from_url(
+                getattr(settings, 'PROGRESS_REDIS_URL', 'redis://localhost:6379/0'),
+                socket_connect_timeout=2,
+            )
+            _client_pid = os.getpid()
+        return _client
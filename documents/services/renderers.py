@@ -0,0 +1,95 @@
+# documents/services/renderers.py
+from django.conf import settings
+
+
+class BaseRenderer:
+    """Common interface for document rendering backends"""
+
+    def initialize(self):
+        """Prepare the backend for rendering"""
+        return True
+
+    def create_document(self, template_path=None, template_hash=None):
+        """Create new document with optional template"""
+        raise NotImplementedError
+
+    def insert_content(self, content, style="Normal"):
+        """Insert content into document with specified style"""
+        raise NotImplementedError
+
+    def insert_heading(self, text, level=1):
+        """Insert heading with specified level"""
+        raise NotImplementedError
+
+    def insert_table(self, data, rows, cols):
+        """Insert a table with data"""
+        raise NotImplementedError
+
+    def render_sections(self, sections):
+        """Insert parsed sections one element at a time"""
+        for section in sections:
+            if section['is_heading']:
+                self.insert_heading(section['title'], section.get('level', 1))
+            if section['content']:
+                self.insert_content(section['content'])
+            if section.get('table'):
+                rows = section['table']
+                self.insert_table(rows, len(rows), max(len(row) for row in rows))
+        return True
+
+    def embed_charts(self, chart_paths):
+        """Replace chart markers, in document order, with the given images
+
+        A None entry (or a marker beyond the list) just removes the marker.
+        """
+        return True
+
+    def embed_formulas(self, formulas):
+        """Replace formula markers, in document order, with the given OMML equations
+
+        A None entry (or a marker beyond the list) just removes the marker.
+        """
+        return True
+
+    def apply_document_styles(self):
+        """Apply professional document styling"""
+        return True
+
+    def save_document(self, file_path):
+        """Save document to specified path"""
+        raise NotImplementedError
+
+    def get_page_count(self):
+        """Number of pages of the saved document, or None if the backend cannot paginate"""
+        return None
+
+    def close(self):
+        """Release any resources held by the backend"""
+        pass
+
+    def abort(self):
+        """Release resources after a failed render"""
+        self.close()
+
+
+RENDERER_BACKENDS = {
+    'wps': 'documents.services.wps_automation.WPSAutomation',
+    'docx': 'documents.services.docx_renderer.DocxRenderer',
+}
+
+
+def get_renderer(backend=None):
+    """Instantiate the renderer configured for this deployment"""
+    from django.utils.module_loading import import_string
+
+    backend = backend or getattr(settings, 'DOCUMENT_RENDERER_BACKEND', 'wps')
+    try:
+        renderer_path = RENDERER_BACKENDS[backend]
+    except KeyError:
+        raise Exception(f"Unknown document renderer backend: {backend}")
+    renderer_class = import_string(renderer_path)
+
+    if backend == 'wps' and getattr(settings, 'WPS_POOL_ENABLED', False):
+        from .wps_pool import get_wps_pool
+        return renderer_class(pool=get_wps_pool())
+    return renderer_class()
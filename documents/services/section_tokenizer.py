@@ -0,0 +1,220 @@
+# documents/services/section_tokenizer.py
+import re
+from .content_stats import ContentStatistics
+
+# Bare section names the prompts ask for; matched only as a whole line
+SECTION_KEYWORDS = [
+    '摘要', '引言', '文献综述', '研究方法', '研究结果', '讨论与分析', '讨论', '结论', '参考文献',
+    '执行摘要', '背景介绍', '市场分析', '数据分析', '建议与策略', '实施计划', '风险评估',
+    'Abstract', 'Introduction', 'Literature Review', 'Methodology', 'Findings',
+    'Discussion and Analysis', 'Discussion', 'Conclusion', 'References',
+    'Executive Summary', 'Background', 'Market Analysis', 'Data Analysis',
+    'Recommendations and Strategies', 'Implementation Plan', 'Risk Assessment',
+]
+
+# A heading title: short, with no sentence punctuation
+_TITLE = r'[^。，,；;.!?！？]{1,60}?'
+
+_KEYWORDS = '|'.join(sorted(map(re.escape, SECTION_KEYWORDS), key=len, reverse=True))
+
+HEADING_PATTERN = re.compile(
+    r'^\**\s*(?:'
+    # ## 研究方法
+    r'(?P<hashes>#{1,6})\s*(?P<md_title>.+?)'
+    # 3. 研究方法 / 3.1 数据来源 / 3.1.2 样本
+    r'|(?P<number>\d{1,2}(?:\.\d{1,2}){1,2}[.、．]?|\d{1,2}[.、)．])\s*(?P<num_title>' + _TITLE + r')'
+    # 三、研究方法
+    r'|(?P<cjk>[一二三四五六七八九十]{1,3})[、.．]\s*(?P<cjk_title>' + _TITLE + r')'
+    # （一）样本选择
+    r'|[（(](?P<cjk_sub>[一二三四五六七八九十]{1,3})[）)]\s*(?P<cjk_sub_title>' + _TITLE + r')'
+    # 第一章 绪论 / 第二节 样本
+    r'|第(?P<chapter>[一二三四五六七八九十\d]{1,3})(?P<chapter_unit>[章节])\s*(?P<chapter_title>' + _TITLE + r')?'
+    # 摘要 / Conclusion
+    r'|(?P<keyword>' + _KEYWORDS + r')'
+    r')\s*[:：]?\s*\**\s*$',
+    re.IGNORECASE
+)
+
+MAX_HEADING_LENGTH = 100
+
+# Body lines almost always end a sentence; headings never do (except markdown)
+_SENTENCE_ENDINGS = frozenset('。，,；;.!?！？')
+
+
+def match_heading(line):
+    """Return (title, level) if the stripped line is a heading, else None"""
+    if len(line) >= MAX_HEADING_LENGTH:
+        return None
+    if line[-1] in _SENTENCE_ENDINGS and line[0] != '#':
+        return None
+    match = HEADING_PATTERN.match(line)
+    if not match:
+        return None
+
+    groups = match.groupdict()
+    if groups['hashes']:
+        return line.strip('*# ').strip(), min(len(groups['hashes']), 3)
+    if groups['number']:
+        return line.strip('* '), len(re.findall(r'\d+', groups['number']))
+    if groups['cjk']:
+        return line.strip('* '), 1
+    if groups['cjk_sub']:
+        return line.strip('* '), 2
+    if groups['chapter']:
+        return line.strip('* '), 1 if groups['chapter_unit'] == '章' else 2
+    return line.strip('*: ：'), 1
+
+
+# "1. " / "1、" / "1)" at the start of a line, but not "1.1": a top-level
+# heading or an item of a numbered list, which only its neighbours tell apart
+LIST_ITEM_PATTERN = re.compile(r'^\**\s*(\d{1,2})([.、)．])(?!\d)')
+
+
+def list_item_number(line):
+    """(number, delimiter) of a line starting like a numbered list item, else None"""
+    match = LIST_ITEM_PATTERN.match(line)
+    return (int(match.group(1)), match.group(2)) if match else None
+
+
+# Markdown pipe tables: "| a | b |" rows, with "| --- | :-: |" under the header
+TABLE_ROW_PATTERN = re.compile(r'^\|.*\|$')
+TABLE_SEPARATOR_PATTERN = re.compile(r'^\|(?:\s*:?-{3,}:?\s*\|)+$')
+
+
+def split_table_row(line):
+    """Cells of a pipe table row"""
+    return [cell.strip() for cell in line[1:-1].split('|')]
+
+
+def find_marker_contexts(content, pattern):
+    """Return {'section', 'text'} for every match of a marker pattern, in document order
+
+    The section is the nearest heading above the marker and the text is the
+    rest of its line, which is what the AI service needs to fill the marker in.
+    """
+    contexts = []
+    section = ''
+    for line in content.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        heading = match_heading(line)
+        if heading:
+            section = heading[0]
+        for _ in pattern.finditer(line):
+            contexts.append({'section': section, 'text': pattern.sub('', line).strip()[:200]})
+    return contexts
+
+
+class SectionTokenizer:
+    """Single-pass splitter of generated text into heading/body sections
+
+    Every line is classified by one precompiled pattern that also yields the
+    heading level, and section bodies are collected in lists so long sections
+    stay linear. The same object serves batch parsing (tokenize) and
+    streaming parsing (feed/finish). Content statistics are gathered in the
+    same pass.
+
+    A line like "1. 提高效率" is held back until the next line arrives: if
+    that continues the numbering (same delimiter, next number) both are list
+    items in the body, otherwise the held line is a heading.
+    """
+
+    def __init__(self, statistics=None):
+        self.statistics = statistics or ContentStatistics()
+        self._title = ''
+        self._level = 0
+        self._body = []
+        self._table = None
+        self._table_lines = []
+        self._held_heading = None
+        self._item_number = None
+
+    def _flush(self):
+        if not self._title and not self._body and not self._table:
+            return []
+        section = {
+            'title': self._title,
+            'content': '\n'.join(self._body) + '\n' if self._body else '',
+            'is_heading': bool(self._title),
+            'level': self._level,
+        }
+        if self._table:
+            section['table'] = self._table
+        self._title, self._level, self._body, self._table = '', 0, [], None
+        return [section]
+
+    def _add_line(self, line, heading):
+        """Count a classified line and add it to the current section"""
+        self.statistics.add_line(line, is_heading=heading is not None)
+        if heading is None:
+            self._body.append(line)
+            return []
+        finished = self._flush()
+        self._title, self._level = heading
+        return finished
+
+    def _release_held(self, as_heading):
+        """Resolve the held numbered line, as a heading or as a list item"""
+        if self._held_heading is None:
+            return []
+        line, heading = self._held_heading
+        self._held_heading = None
+        return self._add_line(line, heading if as_heading else None)
+
+    def _end_table(self):
+        """Resolve buffered pipe lines: a table if the second is a separator row, else text"""
+        lines, self._table_lines = self._table_lines, []
+        if len(lines) >= 2 and TABLE_SEPARATOR_PATTERN.match(lines[1]):
+            rows = [split_table_row(line) for line in lines[:1] + lines[2:]]
+            for line in lines[:1] + lines[2:]:
+                self.statistics.add_line(line)
+            self.statistics.tables += 1
+            self._table = rows
+            # The table closes its section, so text after it starts a new one
+            return self._flush()
+        for line in lines:
+            self.statistics.add_line(line)
+            self._body.append(line)
+        return []
+
+    def feed(self, line):
+        """Consume one line, returning the sections it completes"""
+        line = line.strip()
+        if not line:
+            return []
+        if TABLE_ROW_PATTERN.match(line):
+            finished = self._release_held(as_heading=True)
+            self._item_number = None
+            self._table_lines.append(line)
+            return finished
+
+        finished = self._end_table() if self._table_lines else []
+        item = list_item_number(line)
+        # The next number with the same delimiter continues the list
+        continues_list = (item is not None and self._item_number is not None
+                          and item == (self._item_number[0] + 1, self._item_number[1]))
+        self._item_number = item
+        if continues_list:
+            return finished + self._release_held(as_heading=False) + self._add_line(line, None)
+
+        finished += self._release_held(as_heading=True)
+        heading = match_heading(line)
+        if heading is not None and item is not None:
+            self._held_heading = (line, heading)
+            return finished
+        return finished + self._add_line(line, heading)
+
+    def finish(self):
+        """Return the trailing sections once the input is exhausted"""
+        finished = self._release_held(as_heading=True)
+        if self._table_lines:
+            finished += self._end_table()
+        return finished + self._flush()
+
+    def tokenize(self, content):
+        """Split a complete document into sections"""
+        sections = []
+        for line in content.splitlines():
+            sections += self.feed(line)
+        return sections + self.finish()
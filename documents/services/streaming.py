@@ -0,0 +1,68 @@
+# documents/services/streaming.py
+import queue
+import threading
+
+_END_OF_STREAM = object()
+
+
+class IncrementalRenderPipeline:
+    """Render sections while the model is still generating the rest
+
+    The AI stream is read on a background thread, which splits it into
+    finished sections. The calling thread owns the renderer (COM objects are
+    bound to the thread that created them) and renders each section as soon
+    as it arrives, so total time approaches max(generation, rendering).
+    """
+
+    def __init__(self, renderer, section_parser):
+        self.renderer = renderer
+        self.section_parser = section_parser
+        self.sections = []
+        self._queue = queue.Queue()
+        self._chunks = []
+        self._stop = threading.Event()
+
+    def _produce(self, deltas):
+        try:
+            pending = ''
+            for delta in deltas:
+                if self._stop.is_set():
+                    return
+                self._chunks.append(delta)
+                pending += delta
+                *lines, pending = pending.split('\n')
+                for line in lines:
+                    for section in self.section_parser.feed(line):
+                        self._queue.put(section)
+
+            for section in self.section_parser.feed(pending) + self.section_parser.finish():
+                self._queue.put(section)
+            self._queue.put(_END_OF_STREAM)
+        except Exception as e:
+            self._queue.put(e)
+        finally:
+            # Closing a generator is only allowed on the thread iterating it;
+            # this ends the HTTP stream instead of leaving it half read
+            close = getattr(deltas, 'close', None)
+            if close is not None:
+                close()
+
+    def run(self, deltas):
+        """Consume the delta stream, render every section and return the full text"""
+        producer = threading.Thread(target=self._produce, args=(deltas,), daemon=True)
+        producer.start()
+
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _END_OF_STREAM:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                self.sections.append(item)
+                self.renderer.render_sections([item])
+        finally:
+            # If rendering failed, stop reading a stream nobody will consume
+            self._stop.set()
+            producer.join()
+        return ''.join(self._chunks)
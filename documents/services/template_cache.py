@@ -0,0 +1,93 @@
+# documents/services/template_cache.py
+import io
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from docx import Document
+from docx.oxml.ns import qn
+
+
+def compile_template(source):
+    """Parse a .docx template into a reusable skeleton
+
+    The body content is dropped but the final section properties are kept,
+    so the skeleton carries the template's styles, numbering, page setup and
+    header/footer parts.
+    """
+    document = Document(source)
+    body = document.element.body
+    for child in list(body):
+        if child.tag != qn('w:sectPr'):
+            body.remove(child)
+
+    skeleton = io.BytesIO()
+    document.save(skeleton)
+    return skeleton.getvalue()
+
+
+class TemplateCache:
+    """Per-worker LRU of compiled template skeletons keyed on file hash"""
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._skeletons = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'compiles': 0}
+
+    def put(self, file_hash, skeleton):
+        with self._lock:
+            self._skeletons[file_hash] = skeleton
+            self._skeletons.move_to_end(file_hash)
+            while len(self._skeletons) > self.max_entries:
+                self._skeletons.popitem(last=False)
+
+    def get(self, file_hash, source):
+        """Return the skeleton for file_hash, compiling source on a miss"""
+        with self._lock:
+            skeleton = self._skeletons.get(file_hash)
+            if skeleton is not None:
+                self._skeletons.move_to_end(file_hash)
+                self.stats['hits'] += 1
+                return skeleton
+
+        skeleton = compile_template(source)
+        self.stats['compiles'] += 1
+        self.put(file_hash, skeleton)
+        return skeleton
+
+    def new_document(self, file_hash, source):
+        """Clone a fresh in-memory document from the cached skeleton"""
+        return Document(io.BytesIO(self.get(file_hash, source)))
+
+    def invalidate(self, file_hash):
+        with self._lock:
+            self._skeletons.pop(file_hash, None)
+
+
+_template_cache = None
+_template_cache_lock = threading.Lock()
+
+
+def get_template_cache():
+    """Return this worker process's template cache"""
+    global _template_cache
+    with _template_cache_lock:
+        if _template_cache is None:
+            _template_cache = TemplateCache(
+                max_entries=getattr(settings, 'TEMPLATE_CACHE_MAX_ENTRIES', 32)
+            )
+        return _template_cache
+
+
+def warm_up(templates):
+    """Compile templates into this worker process's cache ahead of their first render
+
+    Templates whose file cannot be compiled are skipped; a render compiles
+    them on demand as before.
+    """
+    cache = get_template_cache()
+    for template in templates:
+        try:
+            cache.get(template.file_hash, template.file_path.path)
+        except Exception as e:
+            print(f"Template compilation warning: {template.file_path.name}: {e}")
@@ -1,21 +1,61 @@
 # documents/services/wps_automation.py
 import os
-import pythoncom
+import re
+import tempfile
 from django.conf import settings
 from django.utils import timezone
+from .renderers import BaseRenderer
+from .content_stats import CHART_MARKERS, FORMULA_MARKERS
+from .com_instrumentation import COMCallCounter
 
-class WPSAutomation:
-    def __init__(self):
+# Word/WPS constant for collapsing a range to its end
+WD_COLLAPSE_END = 0
+# Word/WPS constant for Document.ComputeStatistics page counts
+WD_STATISTIC_PAGES = 2
+# Word/WPS constant for Range.ConvertToTable: cells separated by tabs
+WD_SEPARATE_BY_TABS = 1
+# Widest chart image, in points (6 inches: the text width with 1-inch margins)
+CHART_MAX_WIDTH = 432
+
+# Minimal Flat OPC package wrapping one paragraph, for Range.InsertXML
+FLAT_OPC_PARAGRAPH = (
+    '<?xml version="1.0" standalone="yes"?>'
+    '<pkg:package xmlns:pkg="http://schemas.microsoft.com/office/2006/xmlPackage">'
+    '<pkg:part pkg:name="/_rels/.rels" pkg:contentType="application/vnd.openxmlformats-package.relationships+xml">'
+    '<pkg:xmlData><Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="word/document.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+    '</Relationships></pkg:xmlData></pkg:part>'
+    '<pkg:part pkg:name="/word/document.xml" '
+    'pkg:contentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml">'
+    '<pkg:xmlData><w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+    '<w:body><w:p>{content}</w:p></w:body></w:document></pkg:xmlData></pkg:part>'
+    '</pkg:package>'
+)
+
+class WPSAutomation(BaseRenderer):
+    def __init__(self, pool=None):
         self.wps_app = None
         self.doc = None
         self.initialized = False
+        self.pool = pool
+        self.lease = None
+        self.com_calls = COMCallCounter()
+        self.bulk_assembly = getattr(settings, 'WPS_BULK_ASSEMBLY', True)
+        # Bulk assembly builds the body here and splices it in just before saving
+        self.pending_body = None
+        self.body_in_document = False
     
     def initialize_wps(self):
         """Initialize WPS Application"""
+        if self.pool is not None:
+            return self._acquire_from_pool()
+        
         try:
-            pythoncom.CoInitialize()
+            import pythoncom
             import win32com.client
-            self.wps_app = win32com.client.Dispatch("KWPS.Application")
+            pythoncom.CoInitialize()
+            self.wps_app = self.com_calls.wrap(win32com.client.Dispatch("KWPS.Application"))
             self.wps_app.Visible = False  # Run in background
             self.initialized = True
             return True
@@ -23,7 +63,24 @@ class WPSAutomation:
             print(f"WPS Initialization Error: {e}")
             return False
     
-    def create_document(self, template_path=None):
+    def _acquire_from_pool(self):
+        """Borrow a warm WPS instance instead of starting one"""
+        if self.lease is not None:
+            return True
+        try:
+            self.lease = self.pool.acquire()
+            self.wps_app = self.com_calls.wrap(self.lease.app)
+            self.initialized = True
+            return True
+        except Exception as e:
+            print(f"WPS Pool Error: {e}")
+            return False
+    
+    def initialize(self):
+        """Prepare the backend for rendering"""
+        return self.initialize_wps()
+    
+    def create_document(self, template_path=None, template_hash=None):
         """Create new document with optional template"""
         if not self.initialized:
             if not self.initialize_wps():
@@ -41,6 +98,10 @@ class WPSAutomation:
     def insert_content(self, content, style="Normal"):
         """Insert content into document with specified style"""
         try:
+            # Anything built off-COM goes in first, to keep the document order
+            self._splice_body()
+            self.body_in_document = True
+            
             # Select the end of document
             self.doc.Range().InsertAfter(content)
             
@@ -85,30 +146,132 @@ class WPSAutomation:
         except Exception as e:
             raise Exception(f"Failed to insert heading: {e}")
     
+    def render_sections(self, sections):
+        """Insert parsed sections, built off-COM when bulk assembly is on
+        
+        The sections, and later the chart images and equations, go into an
+        in-memory docx that is spliced in with one InsertFile call before
+        saving, so COM traffic does not grow with the document.
+        """
+        if not self.bulk_assembly:
+            return super().render_sections(sections)
+        
+        from .docx_renderer import DocxRenderer
+        
+        if self.pending_body is None:
+            self.pending_body = DocxRenderer()
+            self.pending_body.create_document()
+        return self.pending_body.render_sections(sections)
+    
+    def _splice_body(self):
+        """Insert the body built off-COM at the end of the document"""
+        if self.pending_body is None:
+            return
+        
+        fd, blob_path = tempfile.mkstemp(suffix='.docx')
+        os.close(fd)
+        try:
+            self.pending_body.save_document(blob_path)
+            end_range = self.doc.Content
+            end_range.Collapse(WD_COLLAPSE_END)
+            end_range.InsertFile(blob_path)
+            self.pending_body = None
+            self.body_in_document = True
+        except Exception as e:
+            raise Exception(f"Failed to insert document body: {e}")
+        finally:
+            os.remove(blob_path)
+    
+    def _markers_pending_only(self):
+        """True when every marker is still in the off-COM body"""
+        return self.pending_body is not None and not self.body_in_document
+    
     def insert_table(self, data, rows, cols):
         """Insert a table with data"""
         try:
-            # Add table
-            self.insert_content("\n")  # Add space before table
-            range_obj = self.doc.Range()
-            table = self.doc.Tables.Add(range_obj, rows, cols)
-            
-            # Populate table data
-            for i, row_data in enumerate(data):
-                for j, cell_data in enumerate(row_data):
-                    if i < rows and j < cols:
-                        table.Cell(i + 1, j + 1).Range.Text = str(cell_data)
-            
-            # Apply table style
-            try:
-                table.Style = "Grid Table 1 Light"
-            except:
-                pass  # Table style might not exist
+            with self.com_calls.measure('table'):
+                table = self._convert_text_to_table(data, rows, cols)
+                
+                # Apply table style
+                try:
+                    table.Style = "Grid Table 1 Light"
+                except:
+                    pass  # Table style might not exist
             
             return True
         except Exception as e:
             raise Exception(f"Failed to insert table: {e}")
     
+    def _convert_text_to_table(self, data, rows, cols):
+        """Write the cells as tab-separated text, then convert it in one call
+        
+        The COM traffic is constant per table, where filling cells costs two
+        or three calls per cell.
+        """
+        lines = []
+        for row_data in data[:rows]:
+            # Tabs and line breaks would split cells and rows
+            cells = [re.sub(r'[\t\r\n]+', ' ', str(cell)) for cell in row_data[:cols]]
+            lines.append('\t'.join(cells + [''] * (cols - len(cells))))
+        
+        self.insert_content("\n")  # Start the table on its own paragraph
+        range_obj = self.doc.Content
+        range_obj.Collapse(WD_COLLAPSE_END)
+        range_obj.InsertAfter('\n'.join(lines))
+        return range_obj.ConvertToTable(
+            Separator=WD_SEPARATE_BY_TABS, NumRows=len(lines), NumColumns=cols
+        )
+    
+    def _find_marker(self, markers):
+        """Range of the first of the given markers in the document, or None"""
+        found = None
+        for marker in markers:
+            rng = self.doc.Content
+            if rng.Find.Execute(FindText=marker, MatchCase=True, Forward=True, Wrap=0):
+                if found is None or rng.Start < found.Start:
+                    found = rng
+        return found
+    
+    def embed_charts(self, chart_paths):
+        """Replace chart markers, in document order, with the given images"""
+        if self._markers_pending_only():
+            return self.pending_body.embed_charts(chart_paths)
+        try:
+            self._splice_body()
+            images = iter(chart_paths)
+            rng = self._find_marker(CHART_MARKERS)
+            while rng is not None:
+                image = next(images, None)
+                rng.Text = ''
+                if image:
+                    shape = self.doc.InlineShapes.AddPicture(image, False, True, rng)
+                    if shape.Width > CHART_MAX_WIDTH:
+                        shape.LockAspectRatio = True
+                        shape.Width = CHART_MAX_WIDTH
+                rng = self._find_marker(CHART_MARKERS)
+            return True
+        except Exception as e:
+            raise Exception(f"Failed to embed charts: {e}")
+    
+    def embed_formulas(self, formulas):
+        """Replace formula markers, in document order, with the given OMML equations"""
+        if self._markers_pending_only():
+            return self.pending_body.embed_formulas(formulas)
+        try:
+            self._splice_body()
+            equations = iter(formulas)
+            rng = self._find_marker(FORMULA_MARKERS)
+            while rng is not None:
+                omml = next(equations, None)
+                rng.Text = ''
+                if omml:
+                    # One call per equation: WPS parses the OMML into a native equation
+                    rng.InsertXML(FLAT_OPC_PARAGRAPH.format(content=omml))
+                rng = self._find_marker(FORMULA_MARKERS)
+            return True
+        except Exception as e:
+            raise Exception(f"Failed to embed formulas: {e}")
+    
     def apply_document_styles(self):
         """Apply professional document styling"""
         try:
@@ -131,6 +294,8 @@ class WPSAutomation:
     def save_document(self, file_path):
         """Save document to specified path"""
         try:
+            self._splice_body()
+            
             # Create directory if it doesn't exist
             os.makedirs(os.path.dirname(file_path), exist_ok=True)
             
@@ -140,14 +305,55 @@ class WPSAutomation:
         except Exception as e:
             raise Exception(f"Failed to save document: {e}")
     
+    def get_page_count(self):
+        """Page count as laid out by WPS"""
+        try:
+            return self.doc.ComputeStatistics(WD_STATISTIC_PAGES)
+        except Exception as e:
+            print(f"Page count warning: {e}")
+            return None
+    
+    def abort(self):
+        """Clean up after a failed render, recycling a pooled instance"""
+        if self.lease is not None:
+            self.lease.failed = True
+        self.close()
+    
     def close(self):
         """Clean up WPS application"""
+        self.pending_body = None
+        self.body_in_document = False
+        if self.com_calls.count:
+            print(f"WPS COM calls: {self.com_calls.summary()}")
+            self.com_calls.reset()
+        
+        if self.lease is not None:
+            self._release_to_pool()
+            return
+        
         try:
             if self.doc:
                 self.doc.Close(SaveChanges=False)
             if self.wps_app:
                 self.wps_app.Quit()
-            pythoncom.CoUninitialize()
+            if self.initialized:
+                import pythoncom
+                pythoncom.CoUninitialize()
             self.initialized = False
         except Exception as e:
-            print(f"Warning during WPS cleanup: {e}")
\ No newline at end of file
+            print(f"Warning during WPS cleanup: {e}")
+    
+    def _release_to_pool(self):
+        """Close this task's document and hand the instance back"""
+        try:
+            if self.doc:
+                self.doc.Close(SaveChanges=False)
+        except Exception as e:
+            print(f"Warning during WPS cleanup: {e}")
+            self.lease.failed = True
+        finally:
+            self.pool.release(self.lease)
+            self.lease = None
+            self.doc = None
+            self.wps_app = None
+            self.initialized = False
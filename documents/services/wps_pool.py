@@ -0,0 +1,219 @@
+# documents/services/wps_pool.py
+import os
+import threading
+import time
+from django.conf import settings
+
+
+def _dispatch_wps():
+    """Start a new KWPS.Application COM server"""
+    import win32com.client
+    return win32com.client.Dispatch("KWPS.Application")
+
+
+class PooledWPSApplication:
+    """A long-lived WPS application instance owned by the pool"""
+
+    def __init__(self, app):
+        self.app = app
+        self.documents_rendered = 0
+        self.failed = False
+        self.created_at = time.monotonic()
+
+    def is_healthy(self):
+        """Check the COM server still answers"""
+        if self.failed:
+            return False
+        try:
+            self.app.Documents.Count
+            return True
+        except Exception:
+            return False
+
+    def reset(self):
+        """Close any documents left open by the previous task"""
+        documents = self.app.Documents
+        while documents.Count > 0:
+            documents(1).Close(SaveChanges=False)
+
+    def quit(self):
+        """Shut down the underlying application"""
+        try:
+            self.app.Quit()
+        except Exception as e:
+            print(f"Warning during WPS pool cleanup: {e}")
+
+
+class WPSApplicationPool:
+    """Per-worker pool of warm WPS application instances"""
+
+    def __init__(self, dispatch=None, max_size=2, min_spares=1, max_documents=50,
+                 acquire_timeout=120):
+        self.dispatch = dispatch or _dispatch_wps
+        self.max_size = max_size
+        self.min_spares = min(min_spares, max_size)
+        self.max_documents = max_documents
+        self.acquire_timeout = acquire_timeout
+
+        self._idle = []
+        self._in_use = set()
+        # Slots reserved for instances being started outside the lock
+        self._starting = 0
+        self._condition = threading.Condition()
+        self._com_threads = threading.local()
+
+        self.stats = {'created': 0, 'recycled': 0, 'acquired': 0}
+
+    def _co_initialize(self):
+        """Initialize COM once per thread that touches the pool"""
+        if getattr(self._com_threads, 'initialized', False):
+            return
+        try:
+            import pythoncom
+            pythoncom.CoInitialize()
+        except ImportError:
+            pass  # Non-Windows host with a fake dispatch
+        self._com_threads.initialized = True
+
+    def _create(self, in_use):
+        """Start an instance in a slot the caller reserved, and register it
+
+        Dispatch can take seconds on a cold start, so it runs without the
+        lock and other threads keep acquiring and releasing meanwhile. The
+        slot is given back if the start fails.
+        """
+        try:
+            self._co_initialize()
+            app = self.dispatch()
+            app.Visible = False  # Run in background
+            instance = PooledWPSApplication(app)
+        except Exception:
+            with self._condition:
+                self._starting -= 1
+                self._condition.notify()
+            raise
+
+        with self._condition:
+            self._starting -= 1
+            self.stats['created'] += 1
+            if in_use:
+                self._in_use.add(instance)
+                self.stats['acquired'] += 1
+            else:
+                self._idle.append(instance)
+                self._condition.notify()
+        return instance
+
+    def _destroy(self, instances):
+        """Quit retired instances; call without holding the lock"""
+        for instance in instances:
+            instance.quit()
+
+    @property
+    def size(self):
+        return len(self._idle) + len(self._in_use) + self._starting
+
+    def acquire(self):
+        """Hand out a healthy instance, starting one if none is idle"""
+        deadline = time.monotonic() + self.acquire_timeout
+        retired = []
+        try:
+            with self._condition:
+                while True:
+                    while self._idle:
+                        instance = self._idle.pop()
+                        if instance.is_healthy():
+                            self._in_use.add(instance)
+                            self.stats['acquired'] += 1
+                            return instance
+                        retired.append(instance)
+                        self.stats['recycled'] += 1
+
+                    if self.size < self.max_size:
+                        self._starting += 1
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise Exception("Timed out waiting for a WPS instance")
+                    self._condition.wait(remaining)
+        finally:
+            self._destroy(retired)
+        return self._create(in_use=True)
+
+    def release(self, instance):
+        """Return an instance, recycling it when worn out or broken"""
+        # The caller still holds the instance, so it can be checked unlocked
+        instance.documents_rendered += 1
+        if not instance.failed:
+            try:
+                instance.reset()
+            except Exception:
+                instance.failed = True
+        retire = (instance.failed or instance.documents_rendered >= self.max_documents
+                  or not instance.is_healthy())
+
+        with self._condition:
+            self._in_use.discard(instance)
+            if retire:
+                self.stats['recycled'] += 1
+            else:
+                self._idle.append(instance)
+            spares = self._reserve_spares()
+            self._condition.notify()
+
+        if retire:
+            self._destroy([instance])
+        self._start_spares(spares)
+
+    def _reserve_spares(self):
+        """Reserve slots for missing spares; call with the lock held"""
+        spares = 0
+        while len(self._idle) + self._starting < self.min_spares and self.size < self.max_size:
+            self._starting += 1
+            spares += 1
+        return spares
+
+    def _start_spares(self, count):
+        for started in range(count):
+            try:
+                self._create(in_use=False)
+            except Exception as e:
+                print(f"WPS pool warm-up error: {e}")
+                with self._condition:
+                    # Hand back the slots that will not be filled either
+                    self._starting -= count - started - 1
+                    self._condition.notify_all()
+                break
+
+    def warm_up(self):
+        """Start the configured number of spare instances"""
+        with self._condition:
+            spares = self._reserve_spares()
+        self._start_spares(spares)
+
+    def shutdown(self):
+        """Quit every idle instance"""
+        with self._condition:
+            idle, self._idle = self._idle, []
+        self._destroy(idle)
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_wps_pool():
+    """Return this worker process's pool, rebuilding it after a fork"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = WPSApplicationPool(
+                max_size=getattr(settings, 'WPS_POOL_MAX_SIZE', 2),
+                min_spares=getattr(settings, 'WPS_POOL_MIN_SPARES', 1),
+                max_documents=getattr(settings, 'WPS_POOL_MAX_DOCUMENTS', 50),
+                acquire_timeout=getattr(settings, 'WPS_POOL_ACQUIRE_TIMEOUT', 120),
+            )
+            _pool_pid = os.getpid()
+        return _pool
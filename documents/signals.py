@@ -0,0 +1,40 @@
+# documents/signals.py
+import hashlib
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import DocumentGenerationTask, DocumentTemplate
+from .services import blob_store
+from .services.template_cache import get_template_cache
+
+
+@receiver(post_save, sender=DocumentTemplate)
+def record_template_hash(sender, instance, **kwargs):
+    """Record the content hash that keys an uploaded template's compiled skeleton
+
+    Compiling happens in the Celery workers, which render the documents: at
+    worker start-up, or on the first render after the file changes, since a
+    new hash misses their caches.
+    """
+    if not instance.file_path:
+        return
+
+    try:
+        with instance.file_path.open('rb') as f:
+            file_hash = hashlib.sha256(f.read()).hexdigest()
+    except (OSError, ValueError) as e:
+        print(f"Template hashing warning: {e}")
+        return
+
+    if file_hash != instance.file_hash:
+        # The file changed: drop the stale skeleton and point renders at the new one
+        if instance.file_hash:
+            get_template_cache().invalidate(instance.file_hash)
+        DocumentTemplate.objects.filter(pk=instance.pk).update(file_hash=file_hash)
+        instance.file_hash = file_hash
+
+
+@receiver(post_delete, sender=DocumentGenerationTask)
+def release_document_blob(sender, instance, **kwargs):
+    """Drop the deleted task's reference to its stored file"""
+    if instance.blob_id:
+        blob_store.release(instance.blob_id)
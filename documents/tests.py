@@ -1,3 +1,1681 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import requests
+from celery import Celery
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from subscriptions.models import SubscriptionPlan, UserSubscription
+from utils.downloads import serve_file, stream_zip
+
+from .routing import FREE_QUEUE, PRIORITY_QUEUE, STANDARD_QUEUE, route_for_plan
+
+from .models import DocumentBlob, DocumentGenerationBatch, DocumentGenerationTask
+from .tasks import _finish_task
+from .services import blob_store, charts, converters, formulas, previews, progress
+from .services.ai_integration import DeepSeekIntegration
+from .services.http_client import AIServiceError, CircuitBreaker, CircuitOpenError, ResilientHTTPClient
+from .services.content_generator import ContentGenerator
+from .services.renderers import BaseRenderer
+from .services.wps_automation import WPSAutomation
+from .services.wps_pool import WPSApplicationPool
+
+
+def make_subscriber(email, max_documents=5, max_words=5000):
+    """A user on a paid plan, with an authenticated API client"""
+    user = get_user_model().objects.create_user(email=email, password='x')
+    plan = SubscriptionPlan.objects.create(
+        name='Basic', tier=SubscriptionPlan.BASIC, description='',
+        max_documents_per_month=max_documents, max_words_per_document=max_words,
+    )
+    UserSubscription.objects.create(user=user, plan=plan, end_date=timezone.now() + timedelta(days=30))
+    client = APIClient()
+    client.force_authenticate(user)
+    return user, client
+
+
+def make_sections(count, words_per_section=100):
+    body = ' '.join(['word'] * words_per_section)
+    return [
+        {'title': f'{i}. Section', 'content': body, 'is_heading': True, 'level': 2}
+        for i in range(1, count + 1)
+    ]
+
+
+class IsolatedServicesMixin:
+    """Point the AI response cache, chart cache and media at a scratch directory
+
+    The per-process prompt cache and HTTP client are dropped before and after
+    each test, so no state leaks between tests or into the working tree.
+    """
+
+    def setUp(self):
+        from .services import ai_cache, http_client
+
+        super().setUp()
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        override = override_settings(
+            MEDIA_ROOT=os.path.join(workdir.name, 'media'),
+            CHART_CACHE_DIR=os.path.join(workdir.name, 'charts'),
+            CACHES=dict(settings.CACHES, ai_responses={
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': os.path.join(workdir.name, 'ai_responses'),
+            }),
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        for module, name in ((ai_cache, '_prompt_cache'), (http_client, '_client')):
+            patcher = mock.patch.object(module, name, None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class FakeFont:
+    Bold = False
+    Size = 12
+    Name = ''
+
+
+class FakeRange:
+    def __init__(self, document):
+        self.document = document
+        self.Font = FakeFont()
+
+    def InsertAfter(self, text):
+        self.document.text += text
+
+    def Collapse(self, direction):
+        pass
+
+    def InsertFile(self, path):
+        # The file is a temporary one, so keep what was in it
+        with open(path, 'rb') as f:
+            self.document.inserted_files.append(f.read())
+
+    def ConvertToTable(self, Separator=None, NumRows=0, NumColumns=0):
+        return FakeTable(self.document, NumRows, NumColumns)
+
+
+class FakeTable:
+    def __init__(self, document, rows, cols):
+        self.document = document
+        self.Style = None
+        document.tables.append((rows, cols))
+
+
+class FakeParagraph:
+    def __init__(self, document):
+        self.Style = 'Normal'
+        self.Range = FakeRange(document)
+
+
+class FakeParagraphs:
+    def __init__(self, document):
+        self.document = document
+
+    @property
+    def Count(self):
+        return self.document.text.count('\n') + 1
+
+    def __call__(self, index):
+        return FakeParagraph(self.document)
+
+
+class FakeDocument:
+    def __init__(self, documents):
+        self.documents = documents
+        self.text = ''
+        self.inserted_files = []
+        self.tables = []
+        self.Paragraphs = FakeParagraphs(self)
+
+    @property
+    def Content(self):
+        return FakeRange(self)
+
+    def Range(self):
+        return FakeRange(self)
+
+    def SaveAs(self, path):
+        self.saved_as = path
+
+    def Close(self, SaveChanges=False):
+        self.documents.open.remove(self)
+
+
+class FakeDocuments:
+    def __init__(self, app):
+        self.app = app
+        self.open = []
+
+    @property
+    def Count(self):
+        if self.app.crashed:
+            raise OSError("RPC server is unavailable")
+        return len(self.open)
+
+    def __call__(self, index):
+        return self.open[index - 1]
+
+    def Add(self, template_path=None):
+        document = FakeDocument(self)
+        self.open.append(document)
+        return document
+
+
+class FakeWPSApplication:
+    """Stand-in for the KWPS.Application COM dispatch object"""
+
+    def __init__(self):
+        self.Visible = True
+        self.crashed = False
+        self.quit_called = False
+        self.Documents = FakeDocuments(self)
+
+    def Quit(self):
+        self.quit_called = True
+
+
+class WPSApplicationPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.apps = []
+        self.pool = WPSApplicationPool(dispatch=self._dispatch, max_size=2,
+                                       min_spares=1, max_documents=3,
+                                       acquire_timeout=0.1)
+
+    def _dispatch(self):
+        app = FakeWPSApplication()
+        self.apps.append(app)
+        return app
+
+    def _render_once(self):
+        automation = WPSAutomation(pool=self.pool)
+        self.assertTrue(automation.initialize())
+        automation.create_document()
+        app = automation.lease.app
+        automation.close()
+        return app
+
+    def test_warm_up_starts_spares(self):
+        self.pool.warm_up()
+        self.assertEqual(len(self.apps), 1)
+        self.assertFalse(self.apps[0].Visible)
+
+    def test_instance_is_reused_across_documents(self):
+        first = self._render_once()
+        second = self._render_once()
+        self.assertIs(first, second)
+        self.assertFalse(first.quit_called)
+        self.assertEqual(first.Documents.Count, 0)
+
+    def test_instance_is_recycled_after_max_documents(self):
+        apps = {self._render_once() for _ in range(4)}
+        self.assertEqual(len(apps), 2)
+        self.assertTrue(self.apps[0].quit_called)
+
+    def test_unhealthy_instance_is_replaced(self):
+        first = self._render_once()
+        first.crashed = True
+        second = self._render_once()
+        self.assertIsNot(first, second)
+        self.assertTrue(first.quit_called)
+
+    def test_failed_render_recycles_instance(self):
+        automation = WPSAutomation(pool=self.pool)
+        automation.initialize()
+        automation.create_document()
+        app = automation.lease.app
+        automation.abort()
+        self.assertTrue(app.quit_called)
+        self.assertIsNot(self._render_once(), app)
+
+    def test_cold_start_does_not_block_other_threads(self):
+        first = self.pool.acquire()
+        dispatching, finish = threading.Event(), threading.Event()
+
+        def slow_dispatch():
+            dispatching.set()
+            finish.wait(5)
+            return self._dispatch()
+
+        self.pool.dispatch = slow_dispatch
+        starting = threading.Thread(target=self.pool.acquire)
+        starting.start()
+        self.assertTrue(dispatching.wait(1))
+
+        # The pool is full while the second instance starts, but the first
+        # can still be returned and handed out again
+        reacquired = []
+
+        def cycle():
+            self.pool.release(first)
+            reacquired.append(self.pool.acquire())
+
+        cycling = threading.Thread(target=cycle)
+        cycling.start()
+        cycling.join(1)
+        self.assertEqual(reacquired, [first])
+        finish.set()
+        starting.join(1)
+        self.assertEqual((self.pool.size, self.pool.stats['created']), (2, 2))
+
+    def test_failed_start_gives_the_slot_back(self):
+        self.pool.dispatch = mock.Mock(side_effect=OSError('no WPS'))
+        with self.assertRaises(OSError):
+            self.pool.acquire()
+        self.assertEqual(self.pool.size, 0)
+
+    def test_acquire_times_out_when_pool_exhausted(self):
+        self.pool.acquire()
+        self.pool.acquire()
+        with self.assertRaises(Exception):
+            self.pool.acquire()
+
+
+class WPSBulkAssemblyTests(SimpleTestCase):
+    def _com_calls_for(self, sections, bulk_assembly):
+        pool = WPSApplicationPool(dispatch=FakeWPSApplication, min_spares=0)
+        automation = WPSAutomation(pool=pool)
+        automation.bulk_assembly = bulk_assembly
+        automation.initialize()
+        automation.create_document()
+        automation.com_calls.reset()
+        automation.render_sections(sections)
+        automation.save_document(os.path.join(tempfile.gettempdir(), 'bulk.docx'))
+        calls = automation.com_calls.count
+        automation.close()
+        return calls
+
+    def test_bulk_assembly_uses_constant_com_calls(self):
+        # 100 sections of 100 words is a 10,000-word paper
+        small = self._com_calls_for(make_sections(8), bulk_assembly=True)
+        large = self._com_calls_for(make_sections(100), bulk_assembly=True)
+        self.assertEqual(small, large)
+        # Splicing the body in and saving
+        self.assertLessEqual(large, 8)
+
+    def test_charts_and_formulas_are_built_into_the_spliced_body(self):
+        from docx import Document
+        from docx.oxml.ns import qn
+
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        image = charts.render_charts([charts.normalize_spec(ChartRenderingTests.spec)],
+                                     cache=charts.ChartImageCache(workdir.name))[0]
+        pool = WPSApplicationPool(dispatch=FakeWPSApplication, min_spares=0)
+        automation = WPSAutomation(pool=pool)
+        automation.initialize()
+        automation.create_document()
+        document = automation.lease.app.Documents.open[0]
+        automation.com_calls.reset()
+        automation.render_sections([
+            {'title': '1. 结果', 'content': '趋势：[图表位置]\n[公式位置]', 'is_heading': True, 'level': 1},
+        ])
+        automation.embed_charts([image])
+        automation.embed_formulas([formulas.latex_to_omml('a')])
+        self.assertEqual(automation.com_calls.count, 0)
+
+        automation.save_document(os.path.join(workdir.name, 'out.docx'))
+        # One InsertFile for body, chart and equation, then SaveAs
+        self.assertEqual(len(document.inserted_files), 1)
+        self.assertLessEqual(automation.com_calls.count, 8)
+        body = Document(io.BytesIO(document.inserted_files[0]))
+        self.assertEqual(len(body.inline_shapes), 1)
+        self.assertEqual(len(list(body.element.body.iter('{%s}oMathPara' % formulas.OMML_NAMESPACE))), 1)
+        self.assertNotIn('[', ''.join(p.text for p in body.paragraphs))
+        automation.close()
+
+    def test_per_section_assembly_grows_with_sections(self):
+        small = self._com_calls_for(make_sections(8), bulk_assembly=False)
+        large = self._com_calls_for(make_sections(100), bulk_assembly=False)
+        self.assertGreater(large, small)
+
+
+class WPSTableInsertionTests(SimpleTestCase):
+    def _table_com_calls(self, rows, cols):
+        pool = WPSApplicationPool(dispatch=FakeWPSApplication, min_spares=0)
+        automation = WPSAutomation(pool=pool)
+        automation.bulk_assembly = False
+        automation.initialize()
+        automation.create_document()
+        data = [[f'{i}\t{j}' for j in range(cols)] for i in range(rows)]
+        automation.render_sections([{'title': '', 'content': '', 'is_heading': False, 'table': data}])
+        self.assertEqual(automation.lease.app.Documents.open[0].tables, [(rows, cols)])
+        calls = automation.com_calls.operations['table']
+        self.assertIn(f'table x1: {calls[0]}', automation.com_calls.summary())
+        automation.close()
+        return calls[0]
+
+    def test_tables_use_constant_com_calls(self):
+        small = self._table_com_calls(2, 2)
+        large = self._table_com_calls(50, 8)
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, 15)
+
+    def test_markdown_tables_are_parsed_and_rendered(self):
+        from .services.docx_renderer import DocxRenderer
+        from .services.section_tokenizer import SectionTokenizer
+
+        tokenizer = SectionTokenizer()
+        sections = tokenizer.tokenize(
+            '1. 数据\n如下表：\n| 指标 | 2024 |\n| --- | ---: |\n| 收入 | 1500 |\n表后说明\n| not | a table |'
+        )
+        self.assertEqual(sections[0]['table'], [['指标', '2024'], ['收入', '1500']])
+        self.assertEqual(sections[0]['content'], '如下表：\n')
+        self.assertEqual(sections[1]['content'], '表后说明\n| not | a table |\n')
+        self.assertEqual(tokenizer.statistics.tables, 1)
+
+        renderer = DocxRenderer()
+        renderer.create_document()
+        renderer.render_sections(sections)
+        table = renderer.doc.tables[0]
+        self.assertEqual([[cell.text for cell in row.cells] for row in table.rows],
+                         [['指标', '2024'], ['收入', '1500']])
+
+
+class SectionTokenizerTests(SimpleTestCase):
+    content = (
+        '摘要\n本文研究市场。\n'
+        '3. 研究方法\n本文的结论是：方法有效。\nIn conclusion, the method holds.\n'
+        '3.1 数据来源\n| 年份 | 收入 |\n| --- | --- |\n| 2024 | 10 |\n'
+        '结论\n研究表明结果显著。'
+    )
+
+    def test_headings_and_levels(self):
+        from .services.section_tokenizer import match_heading
+
+        self.assertEqual(match_heading('3. 研究方法'), ('3. 研究方法', 1))
+        self.assertEqual(match_heading('3.1 数据来源'), ('3.1 数据来源', 2))
+        self.assertEqual(match_heading('（一）样本选择'), ('（一）样本选择', 2))
+        self.assertEqual(match_heading('## Conclusion'), ('Conclusion', 2))
+        # Section keywords inside a sentence are body text
+        self.assertIsNone(match_heading('本文的结论是：方法有效。'))
+        self.assertIsNone(match_heading('In conclusion, the method holds.'))
+
+    def test_sections_and_tables(self):
+        from .services.section_tokenizer import SectionTokenizer
+
+        sections = SectionTokenizer().tokenize(self.content)
+        self.assertEqual([(s['title'], s['level']) for s in sections],
+                         [('摘要', 1), ('3. 研究方法', 1), ('3.1 数据来源', 2), ('结论', 1)])
+        self.assertEqual(sections[1]['content'], '本文的结论是：方法有效。\nIn conclusion, the method holds.\n')
+        self.assertEqual(sections[2]['table'], [['年份', '收入'], ['2024', '10']])
+
+    def test_numbered_lists_stay_in_their_section(self):
+        from .services.section_tokenizer import SectionTokenizer
+
+        content = (
+            '2. 研究方法\n本研究的目标：\n1. 提高效率\n2. 降低成本\n目标均已量化。\n'
+            '3. 研究结果\n3.1 样本\n主要发现：\n1、样本充足\n2、结果显著\n'
+            '3. 结论\n| 指标 | 值 |\n| --- | --- |\n| 效率 | 高 |\n'
+        )
+        tokenizer = SectionTokenizer()
+        sections = tokenizer.tokenize(content)
+        self.assertEqual([(s['title'], s['level']) for s in sections],
+                         [('2. 研究方法', 1), ('3. 研究结果', 1), ('3.1 样本', 2), ('3. 结论', 1)])
+        self.assertEqual(sections[0]['content'], '本研究的目标：\n1. 提高效率\n2. 降低成本\n目标均已量化。\n')
+        # "3. 结论" does not continue the "1、 2、" list
+        self.assertEqual(sections[2]['content'], '主要发现：\n1、样本充足\n2、结果显著\n')
+        self.assertEqual(sections[3]['table'], [['指标', '值'], ['效率', '高']])
+        self.assertEqual(tokenizer.statistics.headings, 4)
+
+        # Fed in pieces, the held-back line gives the same result
+        streaming = SectionTokenizer()
+        streamed = []
+        for line in content.splitlines():
+            streamed += streaming.feed(line)
+        self.assertEqual(streamed + streaming.finish(), sections)
+
+    def test_streamed_chunks_match_batch_tokenizing(self):
+        from .services.section_tokenizer import SectionTokenizer
+        from .services.streaming import IncrementalRenderPipeline
+
+        # Chunk boundaries fall mid-line, mid-heading and mid-table
+        chunks = [self.content[i:i + 7] for i in range(0, len(self.content), 7)]
+        streaming = SectionTokenizer()
+        renderer = RecordingRenderer()
+        self.assertEqual(IncrementalRenderPipeline(renderer, streaming).run(iter(chunks)), self.content)
+
+        batch = SectionTokenizer()
+        self.assertEqual([section for _, section in renderer.rendered], batch.tokenize(self.content))
+        self.assertEqual(streaming.statistics.as_dict(), batch.statistics.as_dict())
+
+
+class ContentStatisticsTests(SimpleTestCase):
+    def test_cjk_counted_per_character_and_latin_per_word(self):
+        from .services.content_stats import ContentStatistics
+
+        statistics = ContentStatistics()
+        statistics.add_line('研究方法', is_heading=True)
+        statistics.add_line("本文使用 DeepSeek API 生成 the author's 3-step plan。")
+        statistics.add_line('收入增长 [图表位置] 见 [公式位置]')
+
+        # 研究方法, 本文使用, 生成, 收入增长, 见: 4 + 4 + 2 + 4 + 1 characters
+        self.assertEqual(statistics.cjk_characters, 15)
+        # DeepSeek, API, the, author's, 3-step, plan; placeholders are not words
+        self.assertEqual(statistics.latin_words, 6)
+        self.assertEqual(statistics.word_count, 21)
+        self.assertEqual((statistics.headings, statistics.paragraphs), (1, 2))
+        self.assertEqual((statistics.charts, statistics.formulas), (1, 1))
+
+
+class FakeRedis:
+    """In-memory stand-in for the Redis commands the progress events use"""
+
+    def __init__(self):
+        self.values = {}
+        self.published = []
+        self.subscribers = []
+
+    def pipeline(self, transaction=True):
+        return FakeRedisPipeline(self)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    def publish(self, channel, payload):
+        self.published.append((channel, json.loads(payload)))
+        for pubsub in self.subscribers:
+            if channel in pubsub.channels:
+                pubsub.messages.append({'type': 'message', 'channel': channel, 'data': payload})
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        pubsub = FakePubSub()
+        self.subscribers.append(pubsub)
+        return pubsub
+
+
+class FakeRedisPipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class FakePubSub:
+    def __init__(self):
+        self.channels = set()
+        self.messages = []
+        self.closed = False
+
+    def subscribe(self, *channels):
+        self.channels.update(channels)
+
+    def get_message(self, timeout=0):
+        return self.messages.pop(0) if self.messages else None
+
+    def close(self):
+        self.closed = True
+
+
+def parse_sse(frames):
+    """Events of the progress frames in an SSE body"""
+    return [json.loads(frame.split('data: ', 1)[1]) for frame in frames.split('\n\n')
+            if frame.startswith('event: progress')]
+
+
+@override_settings(PROGRESS_STREAM_TIMEOUT=5)
+class ProgressEventTests(TestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = mock.patch('documents.services.progress.get_progress_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_events_go_to_task_and_user_channels(self):
+        progress.publish_queued([1, 2], user_id=7)
+        publisher = progress.ProgressPublisher(1, 7)
+        publisher.publish(progress.GENERATING, 10)
+        publisher.publish(progress.GENERATING, 10)  # repeats are dropped
+
+        channels = [channel for channel, _ in self.redis.published]
+        self.assertEqual(channels, ['doc_progress:task:1', 'doc_progress:user:7',
+                                    'doc_progress:task:2', 'doc_progress:user:7',
+                                    'doc_progress:task:1', 'doc_progress:user:7'])
+        last = progress.get_last_events([1, 2, 3])
+        self.assertEqual([(event['task_id'], event['stage']) for event in last],
+                         [(1, progress.GENERATING), (2, progress.QUEUED)])
+
+    def test_stream_replays_last_event_then_follows_live_events(self):
+        progress.ProgressPublisher(1, 7).publish(progress.RENDERING, 50)
+
+        def snapshot():
+            events = progress.get_last_events([1])
+            # Published after subscribing, so the live stream must carry it
+            progress.ProgressPublisher(1, 7).publish(progress.COMPLETED, 100)
+            return events
+
+        frames = ''.join(progress.stream_events([progress.task_channel(1)], snapshot, until_task=1))
+        self.assertTrue(frames.startswith('retry: 3000\n\n'))
+        self.assertEqual([event['stage'] for event in parse_sse(frames)], [progress.RENDERING, progress.COMPLETED])
+        self.assertTrue(self.redis.subscribers[0].closed)
+
+    def test_task_events_view_streams_sse(self):
+        user, client = make_subscriber('events@example.com')
+        task = DocumentGenerationTask.objects.create(user=user, topic='Topic', status=DocumentGenerationTask.COMPLETED)
+
+        response = client.get(f'/api/documents/tasks/{task.id}/events/', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertEqual(response['X-Accel-Buffering'], 'no')
+        body = b''.join(response.streaming_content).decode()
+        # No recent event: the stored status is the snapshot, and it is terminal
+        events = parse_sse(body)
+        self.assertEqual([(event['task_id'], event['stage'], event['percent']) for event in events],
+                         [(task.id, progress.COMPLETED, 100)])
+        self.assertIn(f"id: {events[0]['timestamp']}\n", body)
+
+        missing = client.get('/api/documents/tasks/999999/events/', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(missing.status_code, 404)
+        self.assertTrue(missing.content.startswith(b'event: error\n'))
+
+
+class SSEStandInServer:
+    """Local stand-in for the DeepSeek streaming chat-completions endpoint"""
+
+    def __init__(self, chunks, delay=0.0):
+        self.chunks = chunks
+        self.delay = delay
+        self.requests = []
+        self.finished_at = None
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _send_chunk(self, data):
+                self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                server.requests.append(json.loads(self.rfile.read(length)))
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self._send_chunk(b': keep-alive\n\n')
+                for chunk in server.chunks:
+                    event = {'choices': [{'delta': {'content': chunk}}]}
+                    self._send_chunk(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+                    time.sleep(server.delay)
+                server.finished_at = time.monotonic()
+                self._send_chunk(b'data: [DONE]\n\n')
+                self.wfile.write(b'0\r\n\r\n')
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class RecordingRenderer(BaseRenderer):
+    def __init__(self):
+        self.rendered = []
+
+    def create_document(self, template_path=None):
+        return True
+
+    def render_sections(self, sections):
+        for section in sections:
+            self.rendered.append((time.monotonic(), section))
+        return True
+
+    def save_document(self, file_path):
+        return True
+
+
+STREAMED_PAPER = [
+    '摘要\n本文研究了', '流式生成。\n',
+    '1. 引言\n研究背景', '在此阐述。\n',
+    '结论\n总结研究发现。',
+]
+
+
+class DeepSeekStreamingTests(IsolatedServicesMixin, SimpleTestCase):
+    def test_stream_yields_content_deltas(self):
+        with SSEStandInServer(STREAMED_PAPER) as server:
+            with override_settings(DEEPSEEK_API_KEY='test-key', DEEPSEEK_BASE_URL=server.base_url):
+                deltas = list(DeepSeekIntegration().stream_academic_content('主题', {'use_cache': False}))
+
+        self.assertEqual(deltas, STREAMED_PAPER)
+        self.assertTrue(server.requests[0]['stream'])
+
+    def test_sections_render_before_stream_finishes(self):
+        renderer = RecordingRenderer()
+        generator = ContentGenerator(renderer=renderer)
+
+        with SSEStandInServer(STREAMED_PAPER, delay=0.05) as server:
+            with override_settings(DEEPSEEK_API_KEY='test-key', DEEPSEEK_BASE_URL=server.base_url):
+                generator.ai_service = DeepSeekIntegration()
+                content = generator._render_streamed_content(
+                    generator.ai_service.stream_academic_content('主题', {'use_cache': False})
+                )
+
+        self.assertEqual(content, ''.join(STREAMED_PAPER))
+        self.assertEqual([section for _, section in renderer.rendered],
+                         generator._parse_content_sections(content))
+        first_rendered_at = renderer.rendered[0][0]
+        self.assertLess(first_rendered_at, server.finished_at)
+
+
+class IncrementalRenderPipelineTests(SimpleTestCase):
+    def test_render_failure_stops_and_closes_the_stream(self):
+        from .services.section_tokenizer import SectionTokenizer
+        from .services.streaming import IncrementalRenderPipeline
+
+        produced, closed = [], threading.Event()
+
+        def deltas():
+            try:
+                for i in range(1000):
+                    produced.append(i)
+                    yield f'{i + 1}. 标题\n正文。\n'
+                    time.sleep(0.005)
+            finally:
+                closed.set()
+
+        renderer = mock.Mock(**{'render_sections.side_effect': RuntimeError('render failed')})
+        with self.assertRaisesMessage(RuntimeError, 'render failed'):
+            IncrementalRenderPipeline(renderer, SectionTokenizer()).run(deltas())
+
+        # The producer has finished by the time the error reaches the caller
+        self.assertTrue(closed.is_set())
+        self.assertLess(len(produced), 1000)
+
+
+def http_response(status_code, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.raw = io.BytesIO()
+    response.headers.update(headers or {})
+    return response
+
+
+@mock.patch('documents.services.http_client._shared_cache', return_value=None)
+@mock.patch('documents.services.http_client.time.sleep')
+class ResilientHTTPClientTests(IsolatedServicesMixin, SimpleTestCase):
+    def make_client(self, responses, max_retries=3, failure_threshold=5):
+        client = ResilientHTTPClient(
+            max_retries=max_retries, backoff_base=1.0, backoff_max=20.0,
+            breaker=CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=30),
+        )
+        client.session.post = mock.Mock(side_effect=responses)
+        return client
+
+    def test_retries_with_backoff_then_succeeds(self, sleep, shared_cache):
+        client = self.make_client([
+            requests.exceptions.ConnectionError('reset'),
+            http_response(503, {'Retry-After': '3'}),
+            http_response(200),
+        ])
+        self.assertEqual(client.post('http://ai.test').status_code, 200)
+
+        delays = [call.args[0] for call in sleep.call_args_list]
+        self.assertEqual(len(delays), 2)
+        self.assertLessEqual(delays[0], 1.0)  # full jitter on the first backoff
+        self.assertEqual(delays[1], 3.0)  # Retry-After wins
+        self.assertEqual(client.get_metrics()['retries'], 2)
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_circuit_opens_after_threshold(self, sleep, shared_cache):
+        client = self.make_client([requests.exceptions.Timeout('slow')] * 2, max_retries=0, failure_threshold=2)
+        for _ in range(2):
+            with self.assertRaises(AIServiceError):
+                client.post('http://ai.test')
+
+        with self.assertRaises(CircuitOpenError):
+            client.post('http://ai.test')
+        self.assertEqual(client.session.post.call_count, 2)
+        self.assertEqual(client.get_metrics()['rejected_by_breaker'], 1)
+
+    def test_half_open_probe_recovers_or_reopens(self, sleep, shared_cache):
+        client = self.make_client([ValueError('bad url'), http_response(200)], max_retries=0, failure_threshold=1)
+        client.breaker.record_failure()
+        client.breaker.opened_at -= 30
+
+        # An unexpected error on the probe still reopens the circuit
+        with self.assertRaises(ValueError):
+            client.post('http://ai.test')
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+
+        client.breaker.opened_at -= 30
+        self.assertTrue(client.breaker.allow_request())
+        self.assertFalse(client.breaker.allow_request())  # one probe at a time
+        client.breaker.opened_at -= 30  # the probe never reported back
+        self.assertTrue(client.breaker.allow_request())
+        client.breaker.record_success()
+        self.assertEqual(client.post('http://ai.test').status_code, 200)
+        self.assertEqual(client.breaker.get_state()['consecutive_failures'], 0)
+
+    def test_unreachable_shared_cache_falls_back_to_local_state(self, sleep, shared_cache):
+        from .services.http_client import collect_worker_metrics
+
+        shared_cache.return_value = mock.Mock(**{
+            f'{method}.side_effect': ConnectionError('down') for method in ('get', 'set', 'get_many')
+        })
+        client = self.make_client([http_response(200), requests.exceptions.Timeout('slow')],
+                                  max_retries=0, failure_threshold=1)
+
+        self.assertEqual(client.post('http://ai.test').status_code, 200)
+        with self.assertRaises(AIServiceError):
+            client.post('http://ai.test')
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            client.post('http://ai.test')
+        self.assertEqual(collect_worker_metrics(), {})
+
+    def test_interrupted_stream_counts_as_failure(self, sleep, shared_cache):
+        response = mock.MagicMock(status_code=200)
+        response.iter_lines.side_effect = requests.exceptions.ChunkedEncodingError('cut')
+        client = self.make_client([response], failure_threshold=1)
+        ai = DeepSeekIntegration()
+        ai.api_key, ai.http = 'test-key', client
+
+        with self.assertRaises(AIServiceError):
+            list(ai._stream_api('prompt', use_cache=False))
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(client.get_metrics()['failures'], 1)
+
+
+class QueueRoutingTests(SimpleTestCase):
+    """Queue placement and ordering against Celery's in-memory broker"""
+
+    task_name = 'documents.tasks.generate_document_task'
+
+    def setUp(self):
+        self.app = Celery('routing-tests', broker='memory://', set_as_current=False)
+        self.app.conf.task_queues = settings.CELERY_TASK_QUEUES
+        self.app.conf.task_default_queue = STANDARD_QUEUE
+        self.connection = self.app.connection_for_write()
+        self.channel = self.connection.default_channel
+        for queue in settings.CELERY_TASK_QUEUES:
+            queue(self.channel).declare()
+            self.channel.queue_purge(queue.name)
+
+    def tearDown(self):
+        self.connection.release()
+
+    def plan(self, tier, priority_processing=False):
+        return SubscriptionPlan(tier=tier, priority_processing=priority_processing)
+
+    def submit(self, task_id, plan):
+        self.app.send_task(self.task_name, args=(task_id,), connection=self.connection,
+                           **route_for_plan(plan))
+
+    def next_task_id(self, queue):
+        message = self.channel.basic_get(queue, no_ack=True)
+        if message is None:
+            return None
+        args, kwargs, embed = message.decode()
+        return args[0]
+
+    def test_plans_route_to_their_queue(self):
+        self.assertEqual(route_for_plan(None)['queue'], FREE_QUEUE)
+        self.assertEqual(route_for_plan(self.plan(SubscriptionPlan.FREE))['queue'], FREE_QUEUE)
+        self.assertEqual(route_for_plan(self.plan(SubscriptionPlan.BASIC))['queue'], STANDARD_QUEUE)
+        self.assertEqual(
+            route_for_plan(self.plan(SubscriptionPlan.PROFESSIONAL, True))['queue'], PRIORITY_QUEUE
+        )
+
+    def test_messages_land_on_routed_queue(self):
+        self.submit(1, self.plan(SubscriptionPlan.ENTERPRISE, True))
+        self.submit(2, self.plan(SubscriptionPlan.BASIC))
+        self.submit(3, None)
+
+        self.assertEqual(self.next_task_id(PRIORITY_QUEUE), 1)
+        self.assertEqual(self.next_task_id(STANDARD_QUEUE), 2)
+        self.assertEqual(self.next_task_id(FREE_QUEUE), 3)
+
+    def test_free_backlog_does_not_delay_paid_tasks(self):
+        for task_id in range(100):
+            self.submit(task_id, None)
+        self.submit(1000, self.plan(SubscriptionPlan.PROFESSIONAL, True))
+
+        # The priority pool sees the paid task first, despite the backlog
+        self.assertEqual(self.next_task_id(PRIORITY_QUEUE), 1000)
+        self.assertIsNone(self.next_task_id(PRIORITY_QUEUE))
+        self.assertEqual(self.channel._size(FREE_QUEUE), 100)
+
+    def test_broker_priority_order(self):
+        enterprise = self.plan(SubscriptionPlan.ENTERPRISE, True)
+        professional = self.plan(SubscriptionPlan.PROFESSIONAL, True)
+        with override_settings(CELERY_BROKER_URL='amqp://localhost//'):
+            self.assertGreater(route_for_plan(enterprise)['priority'],
+                               route_for_plan(professional)['priority'])
+        with override_settings(CELERY_BROKER_URL='redis://localhost:6379/0'):
+            # Redis serves the lowest priority step first
+            self.assertLess(route_for_plan(enterprise)['priority'],
+                            route_for_plan(professional)['priority'])
+
+
+class DownloadStrategyTests(SimpleTestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.docx')
+        os.write(handle, bytes(range(100)))
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+        self.factory = RequestFactory()
+
+    def serve(self, **headers):
+        response = serve_file(self.factory.get('/download/', **headers), self.path, '人工智能 报告.docx')
+        self.addCleanup(response.close)
+        return response
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_download_has_validators_and_encoded_filename(self):
+        response = self.serve()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), bytes(range(100)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('ETag', response)
+        self.assertIn("filename*=utf-8''%E4%BA%BA%E5%B7%A5%E6%99%BA%E8%83%BD%20%E6%8A%A5%E5%91%8A.docx",
+                      response['Content-Disposition'])
+
+    def test_range_requests(self):
+        response = self.serve(HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/100')
+        self.assertEqual(self.body(response), bytes(range(10, 20)))
+
+        response = self.serve(HTTP_RANGE='bytes=-5')
+        self.assertEqual(self.body(response), bytes(range(95, 100)))
+
+        self.assertEqual(self.serve(HTTP_RANGE='bytes=200-').status_code, 416)
+
+    def test_conditional_requests(self):
+        etag = self.serve()['ETag']
+        self.assertEqual(self.serve(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # A stale If-Range validator gets the whole file instead of a fragment
+        response = self.serve(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_zip_is_streamed_without_buffering_files(self):
+        entries = [(f'{i}_报告.docx', self.path) for i in range(50)] + [('missing.docx', self.path + '.gone')]
+        chunks = list(stream_zip(entries, chunk_size=16))
+
+        # Everything before the trailing central directory arrives in small pieces
+        self.assertLess(max(len(chunk) for chunk in chunks[:-1]), 200)
+        with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as archive:
+            self.assertEqual(len(archive.namelist()), 50)
+            self.assertEqual(archive.read('49_报告.docx'), bytes(range(100)))
+
+    @override_settings(DOWNLOAD_STRATEGY='x-accel-redirect', MEDIA_ROOT=tempfile.gettempdir())
+    def test_accel_redirect_leaves_the_transfer_to_nginx(self):
+        response = self.serve()
+        self.assertEqual(response['X-Accel-Redirect'],
+                         '/protected-media/' + os.path.basename(self.path))
+        self.assertEqual(response.content, b'')
+
+
+class BlobStoreTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        override = override_settings(MEDIA_ROOT=media_root.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def render(self, data):
+        path = blob_store.new_output_path('academic_paper_1')
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_identical_outputs_are_stored_once(self):
+        first = blob_store.store_output(self.render(b'same bytes'), page_count=3)
+        second = blob_store.store_output(self.render(b'same bytes'))
+        other = blob_store.store_output(self.render(b'other bytes'))
+
+        self.assertEqual(first.pk, second.pk)
+        self.assertNotEqual(first.pk, other.pk)
+        second.refresh_from_db()
+        self.assertEqual((second.ref_count, second.size, second.page_count), (2, 10, 3))
+        self.assertTrue(second.file.name.startswith(f'blobs/{second.sha256[:2]}/'))
+        self.assertEqual(os.listdir(os.path.join(settings.MEDIA_ROOT, blob_store.SCRATCH_DIR)), [])
+
+    def test_last_release_deletes_blob_and_file(self):
+        blob = blob_store.store_output(self.render(b'bytes'), references=2)
+        file_path = os.path.join(settings.MEDIA_ROOT, blob.file.name)
+
+        self.assertFalse(blob_store.release(blob.pk))
+        self.assertTrue(os.path.exists(file_path))
+        self.assertTrue(blob_store.release(blob.pk))
+        self.assertFalse(os.path.exists(file_path))
+        self.assertFalse(DocumentBlob.objects.exists())
+
+
+class PreviewRenderingTests(SimpleTestCase):
+    sections = [
+        {'title': '', 'content': 'Intro <b>text</b>\n', 'is_heading': False, 'level': 0},
+        {'title': '1. 引言', 'content': '第一段\n第二段\n', 'is_heading': True, 'level': 1},
+    ]
+
+    def test_html_escapes_generated_text(self):
+        html = previews.render_html(self.sections)
+        self.assertIn('<p>Intro &lt;b&gt;text&lt;/b&gt;</p>', html)
+        self.assertIn('<h2>1. 引言</h2>', html)
+
+    def test_text_excerpt_is_truncated(self):
+        self.assertEqual(previews.render_text(self.sections), 'Intro <b>text</b>\n1. 引言\n第一段\n第二段')
+        self.assertEqual(previews.render_text(self.sections, max_chars=10), 'Intro <b>t…')
+
+
+class ConversionTests(SimpleTestCase):
+    def test_docx_converts_to_markdown_and_html(self):
+        from .services.docx_renderer import DocxRenderer
+
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        source = os.path.join(workdir.name, 'source.docx')
+        renderer = DocxRenderer()
+        renderer.create_document()
+        renderer.render_sections(PreviewRenderingTests.sections)
+        renderer.save_document(source)
+
+        markdown = converters.convert(source, 'md', os.path.join(workdir.name, 'out.md'))
+        with open(markdown, encoding='utf-8') as f:
+            self.assertEqual(f.read(), 'Intro <b>text</b>\n\n# 1. 引言\n\n第一段\n\n第二段\n')
+
+        html = converters.convert(source, 'html', os.path.join(workdir.name, 'out.html'))
+        with open(html, encoding='utf-8') as f:
+            self.assertIn('<title>1. 引言</title>', f.read())
+
+        with self.assertRaises(Exception):
+            converters.convert(source, 'exe')
+
+
+class ChartRenderingTests(IsolatedServicesMixin, SimpleTestCase):
+    spec = {'type': 'line', 'title': '市场规模', 'labels': ['2022', '2023', '2024'],
+            'series': [{'name': '收入', 'values': [1, '2.5', 4]}, {'name': 'bad', 'values': [1]}]}
+
+    def test_specs_are_validated_and_identical_charts_rendered_once(self):
+        spec = charts.normalize_spec(self.spec)
+        self.assertEqual(spec['series'], [{'name': '收入', 'values': [1.0, 2.5, 4.0]}])
+        self.assertIsNone(charts.normalize_spec({'labels': [], 'series': []}))
+
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        cache = charts.ChartImageCache(workdir.name)
+        paths = charts.render_charts([spec, None, dict(spec)], cache=cache)
+        self.assertEqual(paths[0], paths[2])
+        self.assertIsNone(paths[1])
+        with open(paths[0], 'rb') as f:
+            self.assertEqual(f.read(8), b'\x89PNG\r\n\x1a\n')
+
+        # A cache hit never reaches the pool
+        self.assertEqual(charts.render_charts([spec], cache=cache, pool=object()), paths[:1])
+
+    def test_docx_markers_replaced_in_order(self):
+        from .services.docx_renderer import DocxRenderer
+
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        image = charts.render_charts([charts.normalize_spec(self.spec)],
+                                     cache=charts.ChartImageCache(workdir.name))[0]
+        renderer = DocxRenderer()
+        renderer.create_document()
+        renderer.insert_content('趋势如下：[图表位置]\n[CHART LOCATION] dropped')
+        renderer.embed_charts([image])
+
+        paragraphs = renderer.doc.paragraphs
+        self.assertEqual([p.text for p in paragraphs], ['趋势如下：', ' dropped'])
+        self.assertEqual(len(renderer.doc.inline_shapes), 1)
+
+    def test_docx_markers_in_table_cells_keep_document_order(self):
+        from docx.oxml.ns import qn
+        from .services.docx_renderer import DocxRenderer
+
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        image = charts.render_charts([charts.normalize_spec(self.spec)],
+                                     cache=charts.ChartImageCache(workdir.name))[0]
+        renderer = DocxRenderer()
+        renderer.create_document()
+        renderer.insert_content('[图表位置] 公式 [公式位置]')
+        renderer.insert_table([['[图表位置]', '[公式位置]']], 1, 2)
+        renderer.insert_content('[公式位置]')
+        renderer.embed_charts([None, image])
+        renderer.embed_formulas([None, formulas.latex_to_omml('a'), formulas.latex_to_omml('b')])
+
+        math = '{%s}' % formulas.OMML_NAMESPACE
+        cells = renderer.doc.tables[0].rows[0].cells
+        self.assertEqual(len(cells[0].paragraphs[0]._p.findall('.//' + qn('w:drawing'))), 1)
+        self.assertEqual([t.text for t in cells[1]._tc.iter(math + 't')], ['a'])
+        last = renderer.doc.paragraphs[-1]._p
+        self.assertEqual([t.text for t in last.iter(math + 't')], ['b'])
+        self.assertEqual(renderer.doc.paragraphs[0].text, ' 公式 ')
+
+
+class FormulaConversionTests(SimpleTestCase):
+    def test_latex_converts_to_omml(self):
+        omml = formulas.latex_to_omml(r'\sum_{i=1}^{n} \frac{x_i}{\sqrt{n}}')
+        for tag in ('<m:nary>', '<m:chr m:val="∑"/>', '<m:f>', '<m:rad>', '<m:sSub>'):
+            self.assertIn(tag, omml)
+        with self.assertRaises(formulas.FormulaError):
+            formulas.latex_to_omml(r'\frac{a}{b')
+
+    def test_equivalent_latex_shares_a_cache_entry(self):
+        formulas.clear_formula_cache()
+        first = formulas.latex_to_omml(r'\frac{a}{b} + \alpha x')
+        second = formulas.latex_to_omml(r'$$ \frac {a} {b}+\alpha  x $$')
+        self.assertEqual(first, second)
+        self.assertEqual(formulas.formula_cache_info().hits, 1)
+
+    def test_docx_markers_replaced_with_equations(self):
+        from .services.docx_renderer import DocxRenderer
+
+        renderer = DocxRenderer()
+        renderer.create_document()
+        renderer.insert_content('其中 [公式位置] 为均值\n[FORMULA LOCATION]\n[公式位置]')
+        renderer.embed_formulas([formulas.latex_to_omml(r'\bar{x}'), formulas.latex_to_omml('E=mc^2')])
+
+        paragraphs = renderer.doc.paragraphs
+        self.assertEqual([p.text for p in paragraphs], ['其中  为均值', '', ''])
+        math = '{%s}' % formulas.OMML_NAMESPACE
+        self.assertEqual(len(paragraphs[0]._p.findall(math + 'oMath')), 1)
+        self.assertEqual(len(paragraphs[1]._p.findall(math + 'oMathPara')), 1)
+        self.assertEqual(len(paragraphs[2]._p), 0)  # no formula left for this marker
+
+
+
+class TaskListPaginationTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        from django.utils import timezone
+        from rest_framework.test import APIClient
+        from .models import DocumentGenerationTask
+
+        self.user = get_user_model().objects.create_user(email='list@example.com', password='x')
+        statuses = [DocumentGenerationTask.COMPLETED, DocumentGenerationTask.FAILED]
+        for i in range(25):
+            DocumentGenerationTask.objects.create(user=self.user, topic=f'Topic {i}', status=statuses[i % 2])
+        # Ties on created_at must be broken by id, not skipped or repeated
+        DocumentGenerationTask.objects.filter(user=self.user).update(created_at=timezone.now())
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_pages_cover_every_task_once_in_order(self):
+        ids, url = [], '/api/documents/tasks/?page_size=10'
+        while url:
+            data = self.client.get(url).json()
+            ids += [task['id'] for task in data['results']]
+            url = data['next']
+        self.assertEqual(len(ids), 25)
+        self.assertEqual(ids, sorted(ids, reverse=True))
+
+        second = self.client.get('/api/documents/tasks/?page_size=10').json()['next']
+        first = self.client.get(self.client.get(second).json()['previous']).json()
+        self.assertEqual([task['id'] for task in first['results']], ids[:10])
+        self.assertIsNone(first['previous'])
+
+    def test_filters_are_applied_on_the_server(self):
+        data = self.client.get('/api/documents/tasks/', {'status': 'failed', 'search': 'topic 1'}).json()
+        self.assertEqual(sorted(task['topic'] for task in data['results']),
+                         ['Topic 1', 'Topic 11', 'Topic 13', 'Topic 15', 'Topic 17', 'Topic 19'])
+        self.assertEqual(self.client.get('/api/documents/tasks/', {'cursor': 'nonsense'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/documents/tasks/', {'status': 'unknown'}).status_code, 400)
+
+
+@mock.patch('documents.views.publish_queued')
+@mock.patch('documents.views.generate_document_task.apply_async')
+class IdempotencyAndCoalescingTests(TestCase):
+    def setUp(self):
+        self.user, self.client = make_subscriber('idempotency@example.com')
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        override = override_settings(MEDIA_ROOT=media_root.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def submit(self, topic='Topic', key=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key is not None else {}
+        return self.client.post('/api/documents/generate/', {'topic': topic, 'word_count': 1000},
+                                format='json', **headers)
+
+    def reserved(self):
+        return UserSubscription.objects.get(user=self.user).get_usage().documents_reserved
+
+    def test_same_key_replays_the_original_task(self, apply_async, publish_queued):
+        first = self.submit(key='abc')
+        replay = self.submit(key='abc')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay.json()['task']['id'], first.json()['task']['id'])
+        self.assertEqual(apply_async.call_count, 1)
+
+    def test_key_reused_with_a_different_request_is_rejected(self, apply_async, publish_queued):
+        self.submit(topic='One', key='abc')
+        self.assertEqual(self.submit(topic='Two', key='abc').status_code, 422)
+        self.assertEqual(self.submit(key='k' * 256).status_code, 400)
+
+    def test_identical_in_flight_request_is_coalesced(self, apply_async, publish_queued):
+        leader = self.submit().json()['task']
+        follower = self.submit().json()['task']
+        self.assertEqual(follower['coalesced_into'], leader['id'])
+        self.assertEqual(apply_async.call_count, 1)
+        # Only the request that generates holds quota
+        self.assertEqual(self.reserved(), 1)
+
+    def test_finished_leader_copies_its_result_to_followers(self, apply_async, publish_queued):
+        leader = DocumentGenerationTask.objects.get(id=self.submit().json()['task']['id'])
+        follower_id = self.submit().json()['task']['id']
+
+        path = blob_store.new_output_path('academic_paper_1')
+        with open(path, 'wb') as f:
+            f.write(b'generated')
+        blob = blob_store.store_output(path, page_count=2)
+        leader.blob = blob
+        leader.generated_file.name = blob.file.name
+        leader.file_size = blob.size
+        leader.status = DocumentGenerationTask.COMPLETED
+        leader.word_count = 1200
+        leader.completed_at = timezone.now()
+        self.assertEqual(len(_finish_task(leader)), 1)
+
+        follower = DocumentGenerationTask.objects.get(id=follower_id)
+        self.assertEqual(follower.status, DocumentGenerationTask.COMPLETED)
+        self.assertEqual(follower.generated_file.name, blob.file.name)
+        self.assertEqual(follower.blob_id, blob.id)
+        self.assertEqual(follower.word_count, 1200)
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 2)
+        usage = UserSubscription.objects.get(user=self.user).get_usage()
+        self.assertEqual((usage.documents_used, usage.documents_reserved), (1, 0))
+
+    def test_deleting_an_in_flight_leader_promotes_a_follower(self, apply_async, publish_queued):
+        leader = DocumentGenerationTask.objects.get(id=self.submit().json()['task']['id'])
+        leader_id = leader.id
+        first_id = self.submit().json()['task']['id']
+        second_id = self.submit().json()['task']['id']
+
+        response = self.client.delete(f'/api/documents/tasks/{leader_id}/delete/')
+        self.assertEqual(response.status_code, 200)
+
+        first = DocumentGenerationTask.objects.get(id=first_id)
+        second = DocumentGenerationTask.objects.get(id=second_id)
+        self.assertIsNone(first.coalesced_into_id)
+        self.assertTrue(first.quota_reserved)
+        self.assertEqual(second.coalesced_into_id, first_id)
+        self.assertEqual(apply_async.call_args[0][0], (first_id,))
+        # The leader's reservation moved to its successor
+        self.assertEqual(self.reserved(), 1)
+
+        # The deleted leader's worker finishing later changes nothing
+        leader.status = DocumentGenerationTask.COMPLETED
+        self.assertEqual(_finish_task(leader), [])
+        self.assertFalse(DocumentGenerationTask.objects.filter(id=leader_id).exists())
+        self.assertEqual(self.reserved(), 1)
+
+
+@mock.patch('documents.views.publish_queued')
+class BatchGenerationTests(TestCase):
+    def setUp(self):
+        self.user, self.client = make_subscriber('batch@example.com', max_documents=5)
+        patcher = mock.patch('documents.views.group')
+        self.group = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.group.return_value.apply_async.return_value.id = 'group-1'
+
+    def submit(self, count, **overrides):
+        documents = [dict({'topic': f'Topic {i}', 'word_count': 1000}, **overrides) for i in range(count)]
+        return self.client.post('/api/documents/batches/', {'documents': documents}, format='json')
+
+    def usage(self):
+        usage = UserSubscription.objects.get(user=self.user).get_usage()
+        return usage.documents_used, usage.documents_reserved
+
+    def test_batch_reserves_quota_and_dispatches_one_group(self, publish_queued):
+        response = self.submit(3)
+        self.assertEqual(response.status_code, 201)
+
+        task_ids = response.json()['task_ids']
+        self.assertEqual(self.usage(), (0, 3))
+        self.assertEqual(DocumentGenerationTask.objects.filter(id__in=task_ids, quota_reserved=True).count(), 3)
+        signatures = list(self.group.call_args[0][0])
+        self.assertEqual([signature.args for signature in signatures], [(task_id,) for task_id in task_ids])
+        self.group.return_value.apply_async.assert_called_once_with()
+        publish_queued.assert_called_once_with(task_ids, self.user.id)
+        self.assertEqual(DocumentGenerationBatch.objects.get().group_id, 'group-1')
+
+    def test_batch_over_quota_is_refused_as_a_whole(self, publish_queued):
+        self.submit(3)
+        self.assertEqual(self.submit(3).status_code, 403)
+        self.assertEqual(self.usage(), (0, 3))
+        self.assertEqual(DocumentGenerationTask.objects.count(), 3)
+        self.assertEqual(self.group.call_count, 1)
+
+    def test_invalid_items_are_reported_per_item(self, publish_queued):
+        documents = [{'topic': 'Fine', 'word_count': 1000}, {'topic': 'Short', 'word_count': 10}]
+        response = self.client.post('/api/documents/batches/', {'documents': documents}, format='json')
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['documents']
+        self.assertEqual(errors[0], {})
+        self.assertIn('word_count', errors[1])
+        self.assertFalse(DocumentGenerationTask.objects.exists())
+
+    def test_progress_aggregates_task_statuses(self, publish_queued):
+        task_ids = self.submit(4).json()['task_ids']
+        batch = DocumentGenerationBatch.objects.get()
+        DocumentGenerationTask.objects.filter(id__in=task_ids[:2]).update(status=DocumentGenerationTask.COMPLETED)
+        DocumentGenerationTask.objects.filter(id=task_ids[2]).update(status=DocumentGenerationTask.FAILED)
+
+        progress = self.client.get(f'/api/documents/batches/{batch.id}/').json()['progress']
+        self.assertEqual(progress['counts'], {'pending': 1, 'processing': 0, 'completed': 2, 'failed': 1})
+        self.assertEqual((progress['total'], progress['percent'], progress['finished']), (4, 75, False))
+        self.assertEqual(self.client.get(f'/api/documents/batches/{batch.id}/download/').status_code, 409)
+
+
+class WordLimitTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        override = override_settings(MEDIA_ROOT=media_root.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        for target in ('documents.tasks.ProgressPublisher', 'documents.tasks.previews'):
+            patcher = mock.patch(target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def generate(self, content, max_words):
+        from .services.content_stats import ContentStatistics
+        from .tasks import generate_document_task
+
+        user, _ = make_subscriber(f'words{max_words}@example.com', max_words=max_words)
+        task = DocumentGenerationTask.objects.create(user=user, topic='Topic', requirements={})
+        follower = DocumentGenerationTask.objects.create(user=user, topic='Topic', coalesced_into=task)
+        statistics = ContentStatistics()
+        statistics.add_line(content)
+
+        def generate_academic_paper(topic, requirements, user):
+            path = blob_store.new_output_path('academic_paper_1')
+            with open(path, 'wb') as f:
+                f.write(content.encode('utf-8'))
+            return path, content, statistics
+
+        with mock.patch('documents.tasks.ContentGenerator') as generator:
+            generator.return_value.generate_academic_paper.side_effect = generate_academic_paper
+            self.assertEqual(generate_document_task(task.id)['status'], 'success')
+        task.refresh_from_db()
+        follower.refresh_from_db()
+        return task, follower
+
+    def test_measured_word_count_over_plan_limit_is_flagged(self):
+        task, follower = self.generate('研究表明 the results hold', max_words=5)
+        self.assertEqual(task.word_count, 7)
+        self.assertTrue(task.exceeds_word_limit)
+        self.assertTrue(follower.exceeds_word_limit)
+
+    def test_word_count_within_plan_limit_is_not_flagged(self):
+        task, _ = self.generate('研究表明 the results hold', max_words=7)
+        self.assertEqual(task.status, DocumentGenerationTask.COMPLETED)
+        self.assertFalse(task.exceeds_word_limit)
+
+
+def make_docx(text):
+    from docx import Document
+
+    document = Document()
+    document.add_paragraph(text)
+    data = io.BytesIO()
+    document.save(data)
+    return data.getvalue()
+
+
+class TemplateCacheTests(TestCase):
+    def setUp(self):
+        from .services import template_cache
+
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        override = override_settings(MEDIA_ROOT=media_root.name, DOCUMENT_RENDERER_BACKEND='docx')
+        override.enable()
+        self.addCleanup(override.disable)
+        # Each test starts with a cold process cache
+        patcher = mock.patch.object(template_cache, '_template_cache', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = template_cache.get_template_cache()
+
+    def create_template(self, text):
+        from django.core.files.base import ContentFile
+        from .models import DocumentTemplate
+
+        template = DocumentTemplate(name='Report', template_type=DocumentTemplate.BUSINESS_REPORT)
+        template.file_path.save('report.docx', ContentFile(make_docx(text)))
+        return template
+
+    def test_skeleton_compiled_once_then_served_from_cache(self):
+        source = io.BytesIO(make_docx('Body text'))
+        skeleton = self.cache.get('hash', source)
+
+        self.assertIs(self.cache.get('hash', source), skeleton)
+        self.assertEqual(self.cache.stats, {'hits': 1, 'compiles': 1})
+        # The body is dropped, the section properties are kept
+        document = self.cache.new_document('hash', source)
+        self.assertEqual([p.text for p in document.paragraphs], [])
+        self.assertEqual(len(document.sections), 1)
+
+    def test_worker_start_compiles_active_templates(self):
+        from .tasks import warm_up_template_cache
+
+        template = self.create_template('Body text')
+        # Saving only records the hash: nothing is compiled in the web process
+        self.assertEqual(len(template.file_hash), 64)
+        self.assertEqual(self.cache.stats['compiles'], 0)
+
+        warm_up_template_cache()
+        self.assertEqual(self.cache.stats['compiles'], 1)
+        self.cache.new_document(template.file_hash, template.file_path.path)
+        self.assertEqual(self.cache.stats, {'hits': 1, 'compiles': 1})
+
+    def test_replacing_the_file_invalidates_the_skeleton(self):
+        from django.core.files.base import ContentFile
+
+        template = self.create_template('Old body')
+        old_hash = template.file_hash
+        self.cache.get(old_hash, template.file_path.path)
+
+        template.file_path.save('report.docx', ContentFile(make_docx('New body')))
+        template.refresh_from_db()
+        self.assertNotEqual(template.file_hash, old_hash)
+        self.assertNotIn(old_hash, self.cache._skeletons)
+
+        self.cache.get(template.file_hash, template.file_path.path)
+        self.assertEqual(self.cache.stats, {'hits': 0, 'compiles': 2})
+
+
+class ConvertedDownloadTests(TestCase):
+    def test_file_of_an_unfinished_task_is_not_served(self):
+        user, client = make_subscriber('download@example.com')
+        # A redelivered task still points at the file of its earlier run
+        task = DocumentGenerationTask.objects.create(
+            user=user, topic='Topic', status=DocumentGenerationTask.PROCESSING,
+            generated_file='documents/earlier.docx', file_format='docx',
+        )
+        response = client.get(f'/api/documents/tasks/{task.id}/download/docx/')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'error': 'Document not generated yet'})
+
+
+class RendererBackendTests(SimpleTestCase):
+    def test_configured_backend_is_instantiated(self):
+        from .services.docx_renderer import DocxRenderer
+        from .services.renderers import get_renderer
+
+        with override_settings(DOCUMENT_RENDERER_BACKEND='docx'):
+            self.assertIsInstance(get_renderer(), DocxRenderer)
+        with override_settings(DOCUMENT_RENDERER_BACKEND='docx', WPS_POOL_ENABLED=False):
+            renderer = get_renderer('wps')
+        self.assertIsInstance(renderer, WPSAutomation)
+        self.assertIsNone(renderer.pool)
+
+    def test_wps_backend_leases_from_the_pool_when_enabled(self):
+        from .services.renderers import get_renderer
+
+        pool = object()
+        with override_settings(WPS_POOL_ENABLED=True), \
+                mock.patch('documents.services.wps_pool.get_wps_pool', return_value=pool):
+            self.assertIs(get_renderer('wps').pool, pool)
+            # The pool only serves WPS
+            self.assertFalse(hasattr(get_renderer('docx'), 'pool'))
+
+    def test_unknown_backend_is_an_error(self):
+        from .services.renderers import get_renderer
+
+        with self.assertRaisesMessage(Exception, 'Unknown document renderer backend: pdf'):
+            get_renderer('pdf')
+
+
+class DocxRendererTests(SimpleTestCase):
+    def setUp(self):
+        from .services.docx_renderer import DocxRenderer
+
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.path = os.path.join(workdir.name, 'out', 'report.docx')
+        self.renderer = DocxRenderer()
+        self.renderer.create_document()
+
+    def reopen(self):
+        from docx import Document
+
+        self.assertTrue(self.renderer.save_document(self.path))
+        return Document(self.path)
+
+    def test_headings_and_styles(self):
+        from docx.shared import Inches, Pt
+
+        self.renderer.apply_document_styles()
+        self.renderer.insert_heading(' 1. 引言 ', level=1)
+        self.renderer.insert_heading('Deep', level=7)
+        self.renderer.insert_content('第一段\n\n  Second paragraph  ', style='Quote')
+        self.renderer.insert_content('Plain', style='No Such Style')
+
+        document = self.reopen()
+        self.assertEqual([(p.text, p.style.name) for p in document.paragraphs], [
+            ('1. 引言', 'Heading 1'),
+            ('Deep', 'Heading 3'),
+            ('第一段', 'Quote'),
+            ('Second paragraph', 'Quote'),
+            ('Plain', 'Normal'),
+        ])
+        normal_font = document.styles['Normal'].font
+        self.assertEqual((normal_font.name, normal_font.size), ('Times New Roman', Pt(12)))
+        self.assertEqual(document.sections[0].left_margin, Inches(1))
+
+    def test_table_cells_are_escaped_and_padded(self):
+        rows = [['<b>R&D</b>', '"quoted"'], ['short row']]
+        self.renderer.insert_table(rows, 2, 3)
+
+        table = self.reopen().tables[0]
+        self.assertEqual([[cell.text for cell in row.cells] for row in table.rows],
+                         [['<b>R&D</b>', '"quoted"', ''], ['short row', '', '']])
+        self.assertEqual(table.style.name, 'Table Grid')
+
+    def test_sections_survive_a_save_and_reopen(self):
+        self.renderer.render_sections([
+            {'title': '摘要', 'content': 'Abstract text', 'is_heading': True, 'level': 1},
+            {'title': '', 'content': 'Data', 'is_heading': False,
+             'table': [['年份', '收入'], ['2024', '10']]},
+        ])
+
+        document = self.reopen()
+        self.assertEqual([p.text for p in document.paragraphs], ['摘要', 'Abstract text', 'Data'])
+        self.assertEqual(len(document.tables), 1)
+        self.assertEqual(document.tables[0].cell(1, 1).text, '10')
+
+
+class ParallelSectionGenerationTests(IsolatedServicesMixin, SimpleTestCase):
+    outline = ['引言', '方法', '结果', '结论']
+
+    def setUp(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        super().setUp()
+        self.ai = DeepSeekIntegration()
+        self.ai.api_key = 'test-key'
+        self.ai._generate_outline = mock.Mock(return_value=self.outline)
+        self.started = []
+        self.executors = []
+
+        def make_executor(**kwargs):
+            self.executors.append(ThreadPoolExecutor(**kwargs))
+            return self.executors[-1]
+
+        patcher = mock.patch('documents.services.ai_integration.ThreadPoolExecutor', side_effect=make_executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def generate(self, section):
+        def generate_section(topic, template_type, language, outline, title, word_count, use_cache):
+            self.started.append(title)
+            return section(title)
+
+        self.ai._generate_section = generate_section
+        return self.ai.stream_academic_content('主题', {'generation_mode': 'parallel'})
+
+    def assert_executor_shut_down(self):
+        with self.assertRaises(RuntimeError):
+            self.executors[0].submit(print)
+
+    def test_sections_yielded_in_outline_order(self):
+        def section(title):
+            # Later sections finish first
+            time.sleep(0.02 * (len(self.outline) - self.outline.index(title)))
+            return f'{title}正文'
+
+        self.ai.max_parallel_sections = len(self.outline)
+        self.assertEqual(list(self.generate(section)),
+                         [f'# {title}\n{title}正文\n\n' for title in self.outline])
+        self.assert_executor_shut_down()
+
+    def test_failed_section_propagates_and_cancels_queued_ones(self):
+        def section(title):
+            if title == '方法':
+                raise AIServiceError('section failed')
+            time.sleep(0.2)
+            return title
+
+        self.ai.max_parallel_sections = 1
+        with self.assertRaisesMessage(AIServiceError, 'section failed'):
+            list(self.generate(section))
+        self.assertNotIn('结论', self.started)
+        self.assert_executor_shut_down()
+
+    def test_consumer_stopping_early_shuts_the_executor_down(self):
+        def section(title):
+            time.sleep(0.2)
+            return title
+
+        self.ai.max_parallel_sections = 1
+        sections = self.generate(section)
+        self.assertEqual(next(sections), '# 引言\n引言\n\n')
+        sections.close()
+
+        self.assertNotIn('结论', self.started)
+        self.assert_executor_shut_down()
+
+
+class PromptCacheTests(IsolatedServicesMixin, SimpleTestCase):
+    def make_cache(self, **kwargs):
+        from .services.ai_cache import PromptCache
+
+        return PromptCache(**kwargs)
+
+    def test_lru_evicts_by_entry_count_and_by_size(self):
+        cache = self.make_cache(max_entries=2, shared_alias=None)
+        cache.set('a', 'A')
+        cache.set('b', 'B')
+        cache.get('a')  # 'b' is now the least recently used
+        cache.set('c', 'C')
+        self.assertEqual([cache.get(key) for key in 'abc'], ['A', None, 'C'])
+
+        cache = self.make_cache(max_bytes=12, shared_alias=None)
+        cache.set('a', '12345')
+        cache.set('b', '12345')
+        cache.set('c', '中文')  # 6 bytes of UTF-8 push 'a' out
+        self.assertEqual([cache.get(key) for key in 'abc'], [None, '12345', '中文'])
+        self.assertEqual(cache.get_stats()['bytes'], 11)
+        # A value larger than the whole tier is not kept locally
+        cache.set('d', 'x' * 13)
+        self.assertIsNone(cache.get('d'))
+
+    def test_entries_expire_after_ttl(self):
+        cache = self.make_cache(ttl=60, shared_alias=None)
+        with mock.patch('documents.services.ai_cache.time.monotonic', return_value=1000):
+            cache.set('key', 'value')
+        with mock.patch('documents.services.ai_cache.time.monotonic', return_value=1059):
+            self.assertEqual(cache.get('key'), 'value')
+        with mock.patch('documents.services.ai_cache.time.monotonic', return_value=1061):
+            self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.get_stats()['entries'], 0)
+
+    def test_shared_hit_is_promoted_to_the_local_tier(self):
+        writer, reader = self.make_cache(), self.make_cache()
+        writer.set('key', 'value')
+
+        self.assertEqual(reader.get('key'), 'value')
+        self.assertEqual(reader.get('key'), 'value')
+        stats = reader.get_stats()
+        self.assertEqual((stats['shared_hits'], stats['local_hits'], stats['misses']), (1, 1, 0))
+        self.assertEqual(stats['entries'], 1)
+
+    def test_stats_count_hits_and_misses(self):
+        cache = self.make_cache(shared_alias=None)
+        cache.get('key')
+        cache.set('key', 'value')
+        cache.get('key')
+        cache.get('key')
+        stats = cache.get_stats()
+        self.assertEqual((stats['local_hits'], stats['misses']), (2, 1))
+        self.assertAlmostEqual(stats['hit_rate'], 2 / 3)
+
+    def test_prompts_differing_in_whitespace_share_a_key(self):
+        cache = self.make_cache()
+        key = cache.make_key('写一篇  关于\nAI 的论文', model='deepseek-chat', max_tokens=100)
+        self.assertEqual(cache.make_key(' 写一篇 关于 AI\t的论文 ', max_tokens=100, model='deepseek-chat'), key)
+        # Full-width characters fold to their ASCII forms
+        self.assertEqual(cache.make_key('写一篇 关于 ＡＩ 的论文', model='deepseek-chat', max_tokens=100), key)
+        self.assertNotEqual(cache.make_key('写一篇 关于 AI 的论文', model='deepseek-chat', max_tokens=200), key)
+
+    def test_unreachable_shared_cache_is_a_miss(self):
+        cache = self.make_cache()
+        broken = mock.Mock(**{'get.side_effect': ConnectionError('down'),
+                              'set.side_effect': ConnectionError('down')})
+        with mock.patch.object(cache, '_shared', return_value=broken):
+            self.assertIsNone(cache.get('key'))
+            cache.set('key', 'value')
+            self.assertEqual(cache.get('key'), 'value')
+        self.assertEqual(cache.get_stats()['misses'], 1)
+
+    def test_use_cache_false_bypasses_the_cache(self):
+        ai = DeepSeekIntegration()
+        ai.api_key = 'test-key'
+        ai.http = mock.Mock()
+        ai.http.post.return_value.json.return_value = {'choices': [{'message': {'content': 'answer'}}]}
+
+        self.assertEqual(ai._request_completion('prompt'), 'answer')
+        self.assertEqual(ai._request_completion('prompt'), 'answer')
+        self.assertEqual(ai.http.post.call_count, 1)
+
+        self.assertEqual(ai._request_completion('prompt', use_cache=False), 'answer')
+        self.assertEqual(ai.http.post.call_count, 2)
+        stats = ai.cache.get_stats()
+        self.assertEqual((stats['local_hits'], stats['misses']), (1, 1))
@@ -7,8 +7,18 @@ urlpatterns = [
     path('templates/', views.get_templates, name='templates'),
     path('generate/', views.generate_document, name='generate_document'),
     path('tasks/', views.get_user_tasks, name='user_tasks'),
+    path('tasks/events/', views.user_task_events, name='user_task_events'),
     path('tasks/<int:task_id>/', views.get_task_detail, name='task_detail'),
     path('tasks/<int:task_id>/download/', views.download_document, name='download_document'),
+    path('tasks/<int:task_id>/download/<str:file_format>/', views.download_converted_document,
+         name='download_converted_document'),
+    path('tasks/<int:task_id>/events/', views.task_events, name='task_events'),
     path('tasks/<int:task_id>/preview/', views.get_document_preview, name='document_preview'),
+    path('tasks/<int:task_id>/preview/<str:kind>/', views.get_document_preview_content, name='document_preview_content'),
     path('tasks/<int:task_id>/delete/', views.delete_document, name='delete_document'),
+    path('export/', views.export_documents, name='export_documents'),
+    path('batches/', views.generate_document_batch, name='generate_document_batch'),
+    path('batches/<int:batch_id>/', views.get_batch_detail, name='batch_detail'),
+    path('batches/<int:batch_id>/download/', views.download_batch, name='download_batch'),
+    path('metrics/ai/', views.get_ai_metrics, name='ai_metrics'),
 ]
\ No newline at end of file
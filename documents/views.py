@@ -7,7 +7,20 @@ from .models import DocumentTemplate, DocumentGenerationTask
 from .serializers import (
     DocumentTemplateSerializer, 
     DocumentGenerationTaskSerializer,
-    DocumentGenerationRequestSerializer
+    DocumentGenerationRequestSerializer,
+    DocumentTaskListQuerySerializer
+)
+from utils.pagination import filter_list, paginate_keyset
+
+# Columns read for list rows; the serializer and list.html need nothing else
+TASK_API_LIST_FIELDS = (
+    'id', 'topic', 'requirements', 'status', 'word_count', 'charts_count', 'formulas_count',
+    'exceeds_word_limit', 'coalesced_into', 'file_size', 'file_format', 'created_at', 'completed_at',
+    'blob__sha256', 'blob__mime_type', 'blob__page_count',
+)
+TASK_PAGE_LIST_FIELDS = (
+    'id', 'topic', 'status', 'word_count', 'charts_count', 'formulas_count',
+    'error_message', 'generated_file', 'created_at',
 )
 
 @api_view(['GET'])
@@ -46,10 +59,21 @@ def generate_document(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_user_tasks(request):
-    """Get user's document generation tasks"""
-    tasks = DocumentGenerationTask.objects.filter(user=request.user).order_by('-created_at')
-    serializer = DocumentGenerationTaskSerializer(tasks, many=True)
-    return Response(serializer.data)
+    """Get user's document generation tasks, newest first, one page at a time
+
+    Accepts status, start_date, end_date and search (topic) filters; follow
+    the next/previous links to page through the results.
+    """
+    params = DocumentTaskListQuerySerializer(data=request.query_params)
+    if not params.is_valid():
+        return Response(params.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    tasks = filter_list(DocumentGenerationTask.objects.filter(user=request.user),
+                        params.validated_data, search_fields=('topic',))
+    page = paginate_keyset(tasks.select_related('blob').only(*TASK_API_LIST_FIELDS),
+                           params.validated_data.get('cursor'), params.validated_data.get('page_size'))
+    serializer = DocumentGenerationTaskSerializer(page.items, many=True)
+    return Response(page.response_data(request, serializer.data))
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -66,7 +90,11 @@ def get_task_detail(request, task_id):
 
 
 # documents/views.py - Update generate_document view
+from django.db import IntegrityError, transaction
+from subscriptions import quota
 from .tasks import generate_document_task
+from .routing import get_task_route
+from .services.progress import publish_queued
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -75,25 +103,101 @@ def generate_document(request):
     serializer = DocumentGenerationRequestSerializer(data=request.data)
     
     if serializer.is_valid():
-        # Create generation task
-        task = DocumentGenerationTask.objects.create(
-            user=request.user,
-            topic=serializer.validated_data['topic'],
-            requirements=serializer.validated_data
-        )
+        idempotency_key = request.headers.get('Idempotency-Key', '').strip()
+        if len(idempotency_key) > 255:
+            return Response({"error": "Idempotency-Key is too long"},
+                           status=status.HTTP_400_BAD_REQUEST)
+        
+        topic = serializer.validated_data['topic']
+        fingerprint = DocumentGenerationTask.make_fingerprint(topic, serializer.validated_data)
+        
+        # A retry with the same key gets the original task back
+        if idempotency_key:
+            replay = _replay_idempotent_request(request.user, idempotency_key, fingerprint)
+            if replay:
+                return replay
+        
+        try:
+            task, leader = _create_or_coalesce_task(
+                request.user, topic, serializer.validated_data, idempotency_key, fingerprint
+            )
+        except IntegrityError:
+            # A concurrent request with the same key won the insert
+            return _replay_idempotent_request(request.user, idempotency_key, fingerprint)
+        except quota.QuotaExceeded as e:
+            return Response({"error": str(e)}, status=status.HTTP_403_FORBIDDEN)
         
-        # Start async task
-        generate_document_task.delay(task.id)
+        publish_queued([task.id], request.user.id)
+        if leader is None:
+            # Start async task on the queue for the user's plan
+            generate_document_task.apply_async((task.id,), **get_task_route(request.user))
         
         task_serializer = DocumentGenerationTaskSerializer(task)
         
         return Response({
             'task': task_serializer.data,
-            'message': 'Document generation started successfully'
+            'message': ('Identical request already in progress; result will be shared'
+                        if leader else 'Document generation started successfully')
         }, status=status.HTTP_201_CREATED)
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+def _replay_idempotent_request(user, idempotency_key, fingerprint):
+    """Return the response for an already-seen Idempotency-Key, or None"""
+    task = DocumentGenerationTask.objects.filter(user=user, idempotency_key=idempotency_key).first()
+    if task is None:
+        return None
+    if task.request_fingerprint != fingerprint:
+        return Response({"error": "Idempotency-Key was already used with a different request"},
+                       status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    return Response({
+        'task': DocumentGenerationTaskSerializer(task).data,
+        'message': 'Document generation already requested'
+    }, status=status.HTTP_200_OK)
+
+def _create_or_coalesce_task(user, topic, requirements, idempotency_key, fingerprint):
+    """Create the task, linking it to an identical in-flight one if there is one
+
+    The leader row is locked so it cannot finish (and copy its result to
+    followers) between the lookup and the insert. Quota is reserved first so
+    the transaction starts with a write, and handed back if the request is
+    coalesced; everything rolls back together if the insert fails.
+    """
+    subscription = quota.get_subscription(user)
+    with transaction.atomic():
+        try:
+            period_start = quota.reserve(subscription, word_count=requirements['word_count'])
+            quota_error = None
+        except quota.QuotaExceeded as e:
+            period_start = None
+            quota_error = e
+        
+        leader = DocumentGenerationTask.objects.select_for_update().filter(
+            user=user,
+            request_fingerprint=fingerprint,
+            coalesced_into__isnull=True,
+            status__in=[DocumentGenerationTask.PENDING, DocumentGenerationTask.PROCESSING],
+        ).order_by('created_at').first()
+        
+        # Only a request that actually generates consumes quota
+        if leader is None and quota_error:
+            raise quota_error
+        if leader is not None and period_start is not None:
+            quota.release(user, period_start)
+            period_start = None
+        
+        task = DocumentGenerationTask.objects.create(
+            user=user,
+            topic=topic,
+            requirements=requirements,
+            idempotency_key=idempotency_key,
+            request_fingerprint=fingerprint,
+            coalesced_into=leader,
+            quota_reserved=period_start is not None,
+            quota_period_start=period_start,
+        )
+    return task, leader
+
 
 
 # documents/views.py - Add these imports
@@ -119,8 +223,8 @@ def download_document(request, task_id):
                            status=status.HTTP_404_NOT_FOUND)
         
         # Create download filename
-        filename = f"{task.topic[:50]}.docx".replace(' ', '_')
-        response = FileHandler.create_download_response(task.generated_file, filename)
+        filename = f"{task.topic[:50]}.docx"
+        response = FileHandler.create_download_response(task.generated_file, filename, request)
         
         if response:
             return response
@@ -136,13 +240,13 @@ def download_document(request, task_id):
 def get_document_preview(request, task_id):
     """Get document preview information"""
     try:
-        task = DocumentGenerationTask.objects.get(id=task_id, user=request.user)
+        task = DocumentGenerationTask.objects.select_related('blob').get(id=task_id, user=request.user)
         serializer = DocumentGenerationTaskSerializer(task)
         
-        # Add file info to response
+        # File info comes from the metadata recorded at completion, not the filesystem
         response_data = serializer.data
-        response_data['file_available'] = FileHandler.file_exists(task.generated_file)
-        response_data['file_size'] = FileHandler.get_file_size(task.generated_file)
+        response_data['file_available'] = bool(task.generated_file)
+        response_data['preview_url'] = f"/api/documents/tasks/{task_id}/preview/html/"
         response_data['download_url'] = f"/api/documents/tasks/{task_id}/download/"
         
         return Response(response_data)
@@ -155,25 +259,63 @@ def get_document_preview(request, task_id):
 def delete_document(request, task_id):
     """Delete document and task"""
     try:
-        task = DocumentGenerationTask.objects.get(id=task_id, user=request.user)
-        
-        # Delete physical file
-        if task.generated_file:
-            FileHandler.delete_file(task.generated_file)
+        with transaction.atomic():
+            task = DocumentGenerationTask.objects.select_for_update().get(id=task_id, user=request.user)
+            successor = _promote_follower(task)
+            
+            # Stored files are reference counted and released when the task is
+            # deleted; files from before the store are deleted unless still shared
+            if task.generated_file and not task.blob_id and not DocumentGenerationTask.objects.filter(
+                generated_file=task.generated_file.name
+            ).exclude(id=task.id).exists():
+                FileHandler.delete_file(task.generated_file)
+            
+            # Delete database record
+            task.delete()
         
-        # Delete database record
-        task.delete()
+        if successor:
+            generate_document_task.apply_async((successor.id,), **get_task_route(request.user))
         
         return Response({"message": "Document deleted successfully"})
             
     except DocumentGenerationTask.DoesNotExist:
         return Response({"error": "Task not found"}, status=status.HTTP_404_NOT_FOUND)
+    except quota.QuotaExceeded as e:
+        return Response({"error": str(e)}, status=status.HTTP_403_FORBIDDEN)
+
+def _promote_follower(task):
+    """Make the oldest follower of an in-flight task generate in its place
+
+    Followers are only ever finished by their leader, so deleting a leader
+    that is still running would leave them pending forever. The successor
+    takes over the leader's quota reservation (or reserves its own) and the
+    remaining followers; the caller enqueues it once the delete commits.
+    """
+    if task.status not in (DocumentGenerationTask.PENDING, DocumentGenerationTask.PROCESSING):
+        return None
+    successor = task.coalesced_tasks.order_by('created_at', 'id').first()
+    if successor is None:
+        return None
+    
+    if task.quota_reserved:
+        successor.quota_period_start = task.quota_period_start
+    else:
+        subscription = quota.get_subscription(task.user)
+        successor.quota_period_start = quota.reserve(
+            subscription, word_count=successor.requirements.get('word_count', 0)
+        )
+    successor.quota_reserved = True
+    successor.coalesced_into = None
+    successor.save(update_fields=['coalesced_into', 'quota_reserved', 'quota_period_start'])
+    task.coalesced_tasks.exclude(pk=successor.pk).update(coalesced_into=successor)
+    return successor
 
 
 
 
 # documents/views.py - Add template views
-from django.shortcuts import render
+from django.shortcuts import render, redirect
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 
 @login_required
@@ -190,11 +332,23 @@ def document_generate(request):
 
 @login_required
 def document_list(request):
-    """User's document list"""
-    documents = DocumentGenerationTask.objects.filter(user=request.user).order_by('-created_at')
-    
+    """User's document list, filtered and paginated on the server"""
+    params = DocumentTaskListQuerySerializer(data=request.GET)
+    filters = params.validated_data if params.is_valid() else {}
+    if params.errors:
+        messages.error(request, "筛选条件无效，已显示全部文档")
+
+    documents = filter_list(DocumentGenerationTask.objects.filter(user=request.user),
+                            filters, search_fields=('topic',))
+    page = paginate_keyset(documents.only(*TASK_PAGE_LIST_FIELDS),
+                           filters.get('cursor'), filters.get('page_size'))
+
     context = {
-        'documents': documents
+        'documents': page,
+        'filters': filters,
+        'status_choices': DocumentGenerationTask.STATUS_CHOICES,
+        'next_query': page.query_string(request, page.next_cursor) if page.has_next else '',
+        'previous_query': page.query_string(request, page.previous_cursor) if page.has_previous else '',
     }
     return render(request, 'documents/list.html', context)
 
@@ -210,4 +364,327 @@ def document_detail(request, task_id):
     context = {
         'document': document
     }
-    return render(request, 'documents/detail.html', context)
\ No newline at end of file
+    return render(request, 'documents/detail.html', context)
+
+
+# documents/views.py - AI backend metrics
+from rest_framework.permissions import IsAdminUser
+from .services.ai_cache import get_prompt_cache
+from .services.http_client import get_http_client, collect_worker_metrics
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_ai_metrics(request):
+    """Report circuit breaker state, retry counts and prompt cache statistics"""
+    return Response({
+        'process': get_http_client().get_metrics(),
+        'prompt_cache': get_prompt_cache().get_stats(),
+        'workers': collect_worker_metrics(),
+    })
+
+
+# documents/views.py - Batch generation
+from celery import group
+from .models import DocumentGenerationBatch
+from .serializers import DocumentGenerationBatchRequestSerializer, DocumentGenerationBatchSerializer
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def generate_document_batch(request):
+    """Create many document generation tasks in one request"""
+    serializer = DocumentGenerationBatchRequestSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    payloads = serializer.validated_data['documents']
+    subscription = quota.get_subscription(request.user)
+    try:
+        with transaction.atomic():
+            # One reservation for the whole batch
+            period_start = quota.reserve(subscription, count=len(payloads),
+                          word_count=max(payload['word_count'] for payload in payloads))
+
+            batch = DocumentGenerationBatch.objects.create(user=request.user)
+            tasks = DocumentGenerationTask.objects.bulk_create([
+                DocumentGenerationTask(
+                    user=request.user,
+                    topic=payload['topic'],
+                    requirements=payload,
+                    batch=batch,
+                    quota_reserved=True,
+                    quota_period_start=period_start,
+                )
+                for payload in payloads
+            ])
+    except quota.QuotaExceeded as e:
+        return Response({"error": str(e)}, status=status.HTTP_403_FORBIDDEN)
+
+    publish_queued([task.id for task in tasks], request.user.id)
+
+    # All tasks share the user's plan, so they share one route
+    route = get_task_route(request.user)
+    result = group(
+        generate_document_task.signature((task.id,), **route) for task in tasks
+    ).apply_async()
+    batch.group_id = result.id or ''
+    DocumentGenerationBatch.objects.filter(pk=batch.pk).update(group_id=batch.group_id)
+
+    return Response({
+        'batch': DocumentGenerationBatchSerializer(batch).data,
+        'task_ids': [task.id for task in tasks],
+        'message': 'Batch generation started successfully'
+    }, status=status.HTTP_201_CREATED)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_batch_detail(request, batch_id):
+    """Get aggregate progress for a batch"""
+    try:
+        batch = DocumentGenerationBatch.objects.get(id=batch_id, user=request.user)
+    except DocumentGenerationBatch.DoesNotExist:
+        return Response({"error": "Batch not found"}, status=status.HTTP_404_NOT_FOUND)
+    return Response(DocumentGenerationBatchSerializer(batch).data)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def download_batch(request, batch_id):
+    """Download every completed document of a finished batch as a ZIP archive"""
+    try:
+        batch = DocumentGenerationBatch.objects.get(id=batch_id, user=request.user)
+    except DocumentGenerationBatch.DoesNotExist:
+        return Response({"error": "Batch not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    if not batch.get_progress()['finished']:
+        return Response({"error": "Batch is still running"}, status=status.HTTP_409_CONFLICT)
+
+    tasks = batch.tasks.filter(status=DocumentGenerationTask.COMPLETED).exclude(generated_file='')
+    return stream_zip_response(_export_entries(tasks), f"batch_{batch.id}.zip")
+
+
+# documents/views.py - Server-Sent Events progress streams
+import json
+from django.http import StreamingHttpResponse
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.decorators import authentication_classes, renderer_classes
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from .services import progress as task_progress
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets EventSource clients pass content negotiation; errors become an SSE error event"""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return f"event: error\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8')
+
+STATUS_STAGES = {
+    DocumentGenerationTask.PENDING: task_progress.QUEUED,
+    DocumentGenerationTask.PROCESSING: task_progress.GENERATING,
+    DocumentGenerationTask.COMPLETED: task_progress.COMPLETED,
+    DocumentGenerationTask.FAILED: task_progress.FAILED,
+}
+
+def _event_stream_response(events):
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+    return response
+
+@api_view(['GET'])
+@authentication_classes([SessionAuthentication, JWTAuthentication])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+def task_events(request, task_id):
+    """Stream stage transitions of one task until it completes or fails"""
+    user_id = request.user.id
+    if not DocumentGenerationTask.objects.filter(id=task_id, user=request.user).exists():
+        return Response({"error": "Task not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    def snapshot():
+        last = task_progress.get_last_events([task_id])
+        if last:
+            return last
+        # No recent event (e.g. expired): fall back to the stored status
+        task = DocumentGenerationTask.objects.only('status', 'error_message').get(id=task_id)
+        percent = 100 if task.status == DocumentGenerationTask.COMPLETED else None
+        return [task_progress.make_event(
+            task_id, user_id, STATUS_STAGES[task.status], percent, error=task.error_message
+        )]
+
+    return _event_stream_response(task_progress.stream_events(
+        [task_progress.task_channel(task_id)], snapshot, until_task=task_id
+    ))
+
+@api_view(['GET'])
+@authentication_classes([SessionAuthentication, JWTAuthentication])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+def user_task_events(request):
+    """Stream stage transitions of all of the user's tasks"""
+    user = request.user
+
+    def snapshot():
+        active_ids = list(DocumentGenerationTask.objects.filter(
+            user=user,
+            status__in=[DocumentGenerationTask.PENDING, DocumentGenerationTask.PROCESSING]
+        ).values_list('id', flat=True))
+        return task_progress.get_last_events(active_ids)
+
+    return _event_stream_response(task_progress.stream_events(
+        [task_progress.user_channel(user.id)], snapshot
+    ))
+
+
+# documents/views.py - Streaming ZIP export
+from django.conf import settings
+from utils.downloads import stream_zip_response
+from .serializers import DocumentExportRequestSerializer
+
+def _export_entries(tasks):
+    """Lazily yield (archive name, file path) for tasks with a generated file"""
+    tasks = tasks.exclude(generated_file='').exclude(generated_file__isnull=True).only(
+        'id', 'topic', 'generated_file', 'file_format'
+    ).order_by('id')
+    for task in tasks.iterator(chunk_size=200):
+        topic = task.topic[:50].replace('/', '_').replace('\\', '_')
+        yield f"{task.id}_{topic}.{task.file_format or 'docx'}", FileHandler.get_file_path(task.generated_file)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_documents(request):
+    """Stream completed documents, chosen by ?ids= or a date range, as one ZIP archive"""
+    serializer = DocumentExportRequestSerializer(data={
+        key: request.query_params.getlist(key) if key == 'ids' else request.query_params.get(key)
+        for key in ('ids', 'start_date', 'end_date') if key in request.query_params
+    })
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    data = serializer.validated_data
+    tasks = DocumentGenerationTask.objects.filter(
+        user=request.user, status=DocumentGenerationTask.COMPLETED
+    )
+    if data.get('ids'):
+        tasks = tasks.filter(id__in=data['ids'])
+    if data.get('start_date'):
+        tasks = tasks.filter(completed_at__date__gte=data['start_date'])
+    if data.get('end_date'):
+        tasks = tasks.filter(completed_at__date__lte=data['end_date'])
+
+    max_files = getattr(settings, 'DOCUMENT_EXPORT_MAX_FILES', 1000)
+    if tasks.count() > max_files:
+        return Response({"error": f"An export can contain at most {max_files} documents"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    return stream_zip_response(_export_entries(tasks), "documents.zip")
+
+
+# documents/views.py - Precomputed previews
+import gzip
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from .services import blob_store, previews
+
+@api_view(['GET'])
+@authentication_classes([SessionAuthentication, JWTAuthentication])
+@permission_classes([IsAuthenticated])
+def get_document_preview_content(request, task_id, kind):
+    """Serve the stored HTML rendition or text excerpt of a document"""
+    if kind not in previews.PREVIEW_KINDS:
+        return Response({"error": "Unknown preview type"}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        task = DocumentGenerationTask.objects.select_related('blob').only(
+            'id', 'status', 'generated_file', 'blob'
+        ).get(id=task_id, user=request.user)
+    except DocumentGenerationTask.DoesNotExist:
+        return Response({"error": "Task not found"}, status=status.HTTP_404_NOT_FOUND)
+    if task.status != DocumentGenerationTask.COMPLETED or not task.generated_file:
+        return Response({"error": "Document not generated yet"}, status=status.HTTP_404_NOT_FOUND)
+
+    blob = task.blob or blob_store.adopt_legacy_file(task.generated_file.name)
+    if blob is None:
+        return Response({"error": "File not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    # Revalidation is answered before the preview is even loaded
+    etag = previews.preview_etag(blob, kind)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    try:
+        preview = previews.get_preview(blob, FileHandler.get_file_path(blob.file))
+    except Exception as e:
+        return Response({"error": f"Failed to build preview: {e}"},
+                        status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    body = bytes(preview.html_gz if kind == previews.HTML else preview.text_gz)
+    content_type = 'text/html; charset=utf-8' if kind == previews.HTML else 'text/plain; charset=utf-8'
+    if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        response = HttpResponse(body, content_type=content_type)
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(gzip.decompress(body), content_type=content_type)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+# documents/views.py - Converted downloads (PDF, HTML, Markdown)
+from datetime import timedelta
+from django.utils import timezone
+from utils.downloads import serve_file
+from .models import DocumentConversion
+from .services import converters
+from .tasks import convert_document_task
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def download_converted_document(request, task_id, file_format):
+    """Download a document in another format, converting it on first request
+
+    Answers 202 while the conversion queue works on it; clients retry after
+    the Retry-After interval.
+    """
+    try:
+        task = DocumentGenerationTask.objects.select_related('blob').get(id=task_id, user=request.user)
+    except DocumentGenerationTask.DoesNotExist:
+        return Response({"error": "Task not found"}, status=status.HTTP_404_NOT_FOUND)
+    # A redelivered task keeps its previous file until the new run finishes
+    if task.status != DocumentGenerationTask.COMPLETED or not task.generated_file:
+        return Response({"error": "Document not generated yet"}, status=status.HTTP_404_NOT_FOUND)
+    if file_format == task.file_format:
+        response = FileHandler.create_download_response(
+            task.generated_file, f"{task.topic[:50]}.{file_format}", request
+        )
+        return response or Response({"error": "File not found"}, status=status.HTTP_404_NOT_FOUND)
+    if file_format not in converters.SUPPORTED_FORMATS:
+        return Response({"error": f"Unsupported format: {file_format}"}, status=status.HTTP_404_NOT_FOUND)
+
+    blob = task.blob or blob_store.adopt_legacy_file(task.generated_file.name)
+    if blob is None:
+        return Response({"error": "File not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    # One conversion per stored document and format, shared by every task that produced it
+    conversion, created = DocumentConversion.objects.select_related('output').get_or_create(
+        source=blob, target_format=file_format
+    )
+    if conversion.status == DocumentConversion.COMPLETED:
+        return serve_file(request, FileHandler.get_file_path(conversion.output.file),
+                          f"{task.topic[:50]}.{file_format}")
+    if conversion.status == DocumentConversion.FAILED:
+        # Forget the failure so the next request tries again
+        conversion.delete()
+        return Response({"error": f"Conversion failed: {conversion.error_message}"},
+                        status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    stale_before = timezone.now() - timedelta(seconds=getattr(settings, 'DOCUMENT_CONVERSION_TIMEOUT', 120) * 2)
+    if created or DocumentConversion.objects.filter(
+        id=conversion.id, status=DocumentConversion.PENDING, updated_at__lt=stale_before
+    ).update(updated_at=timezone.now()):
+        convert_document_task.delay(conversion.id)
+
+    response = Response({"status": "converting", "format": file_format}, status=status.HTTP_202_ACCEPTED)
+    response['Retry-After'] = '2'
+    return response
@@ -10,6 +10,6 @@ class SubscriptionPlanAdmin(admin.ModelAdmin):
 
 @admin.register(UserSubscription)
 class UserSubscriptionAdmin(admin.ModelAdmin):
-    list_display = ['user', 'plan', 'start_date', 'end_date', 'is_active', 'documents_used_this_month']
+    list_display = ['user', 'plan', 'start_date', 'end_date', 'is_active', 'documents_used_in_period']
     list_filter = ['is_active', 'plan']
     search_fields = ['user__email', 'user__phone_number']
\ No newline at end of file
@@ -0,0 +1,27 @@
+# subscriptions/billing.py
+import calendar
+from django.utils import timezone
+
+
+def add_months(value, months):
+    """Shift a datetime by whole months, clamping the day to the month's length"""
+    month_index = value.month - 1 + months
+    year = value.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(value.day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)
+
+
+def billing_period(start_date, at):
+    """Return (period_start, period_end) of the monthly period containing at
+
+    Periods start on the start_date anniversary in local time, e.g. a
+    subscription started on Jan 31 renews on Feb 28/29, Mar 31, Apr 30, ...
+    """
+    start_date = timezone.localtime(start_date)
+    at = timezone.localtime(at)
+
+    months = max(0, (at.year - start_date.year) * 12 + (at.month - start_date.month))
+    if months and add_months(start_date, months) > at:
+        months -= 1
+    return add_months(start_date, months), add_months(start_date, months + 1)
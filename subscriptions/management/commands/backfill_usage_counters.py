@@ -0,0 +1,64 @@
+# subscriptions/management/commands/backfill_usage_counters.py
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from subscriptions.models import UserSubscription, UsageCounter
+
+class Command(BaseCommand):
+    help = 'Create billing-period usage counters from the legacy monthly usage columns'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be created without writing')
+    
+    def handle(self, *args, **options):
+        now = timezone.now()
+        batch_size = options['batch_size']
+        subscriptions = UserSubscription.objects.only(
+            'id', 'start_date', 'documents_used_this_month', 'last_reset_date'
+        ).order_by('id')
+        
+        counters = []
+        created = 0
+        for subscription in subscriptions.iterator(chunk_size=batch_size):
+            counter = self._legacy_counter(subscription, now)
+            if counter is None:
+                continue
+            counters.append(counter)
+            if len(counters) >= batch_size:
+                created += self._save(counters, options['dry_run'])
+                counters = []
+        created += self._save(counters, options['dry_run'])
+        
+        verb = 'Would create' if options['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(f'{verb} up to {created} usage counters'))
+    
+    def _legacy_counter(self, subscription, now):
+        """Map the legacy calendar-month counter onto a billing period"""
+        used = subscription.documents_used_this_month
+        if not used:
+            return None
+        
+        last_reset = timezone.localtime(subscription.last_reset_date)
+        local_now = timezone.localtime(now)
+        if (last_reset.year, last_reset.month) == (local_now.year, local_now.month):
+            # Still the live counter: it applies to the current period
+            period_start, period_end = subscription.current_period(now)
+        else:
+            # A stale month, kept for history in the period it was reset in
+            period_start, period_end = subscription.current_period(subscription.last_reset_date)
+        
+        # Reservations were carried over by migration 0005
+        return UsageCounter(
+            subscription_id=subscription.id,
+            period_start=period_start,
+            period_end=period_end,
+            documents_used=used,
+        )
+    
+    def _save(self, counters, dry_run):
+        if not counters or dry_run:
+            return len(counters)
+        # Existing counters win, so the command can be re-run safely
+        UsageCounter.objects.bulk_create(counters, ignore_conflicts=True)
+        return len(counters)
@@ -0,0 +1,175 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('subscriptions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='subscriptionplan',
+            options={'ordering': ['price_monthly'], 'verbose_name': '订阅套餐', 'verbose_name_plural': '订阅套餐'},
+        ),
+        migrations.AlterModelOptions(
+            name='usersubscription',
+            options={'verbose_name': '用户订阅', 'verbose_name_plural': '用户订阅'},
+        ),
+        migrations.RemoveField(
+            model_name='usersubscription',
+            name='is_active',
+        ),
+        migrations.AddField(
+            model_name='subscriptionplan',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='创建时间'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='subscriptionplan',
+            name='priority_processing',
+            field=models.BooleanField(default=False, verbose_name='优先处理'),
+        ),
+        migrations.AddField(
+            model_name='subscriptionplan',
+            name='supports_templates',
+            field=models.BooleanField(default=False, verbose_name='支持模板'),
+        ),
+        migrations.AddField(
+            model_name='subscriptionplan',
+            name='tier',
+            field=models.CharField(choices=[('free', '免费版'), ('basic', '基础版'), ('professional', '专业版'), ('enterprise', '企业版')], default='free', max_length=20, verbose_name='套餐等级'),
+        ),
+        migrations.AddField(
+            model_name='subscriptionplan',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='更新时间'),
+        ),
+        migrations.AddField(
+            model_name='usersubscription',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='创建时间'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='usersubscription',
+            name='documents_reserved',
+            field=models.IntegerField(default=0, verbose_name='预留文档数'),
+        ),
+        migrations.AddField(
+            model_name='usersubscription',
+            name='last_reset_date',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='最后重置时间'),
+        ),
+        migrations.AddField(
+            model_name='usersubscription',
+            name='status',
+            field=models.CharField(choices=[('active', '活跃'), ('canceled', '已取消'), ('expired', '已过期')], default='active', max_length=20, verbose_name='状态'),
+        ),
+        migrations.AddField(
+            model_name='usersubscription',
+            name='stripe_subscription_id',
+            field=models.CharField(blank=True, max_length=100, null=True, verbose_name='Stripe订阅ID'),
+        ),
+        migrations.AddField(
+            model_name='usersubscription',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='更新时间'),
+        ),
+        migrations.AlterField(
+            model_name='subscriptionplan',
+            name='description',
+            field=models.TextField(verbose_name='套餐描述'),
+        ),
+        migrations.AlterField(
+            model_name='subscriptionplan',
+            name='is_active',
+            field=models.BooleanField(default=True, verbose_name='是否激活'),
+        ),
+        migrations.AlterField(
+            model_name='subscriptionplan',
+            name='max_documents_per_month',
+            field=models.IntegerField(default=5, verbose_name='每月最大文档数'),
+        ),
+        migrations.AlterField(
+            model_name='subscriptionplan',
+            name='max_words_per_document',
+            field=models.IntegerField(default=2000, verbose_name='每文档最大字数'),
+        ),
+        migrations.AlterField(
+            model_name='subscriptionplan',
+            name='name',
+            field=models.CharField(max_length=50, verbose_name='套餐名称'),
+        ),
+        migrations.AlterField(
+            model_name='subscriptionplan',
+            name='price_monthly',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='月价格'),
+        ),
+        migrations.AlterField(
+            model_name='subscriptionplan',
+            name='price_yearly',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='年价格'),
+        ),
+        migrations.AlterField(
+            model_name='subscriptionplan',
+            name='supports_charts',
+            field=models.BooleanField(default=False, verbose_name='支持图表'),
+        ),
+        migrations.AlterField(
+            model_name='subscriptionplan',
+            name='supports_formulas',
+            field=models.BooleanField(default=False, verbose_name='支持公式'),
+        ),
+        migrations.AlterField(
+            model_name='usersubscription',
+            name='documents_used_this_month',
+            field=models.IntegerField(default=0, verbose_name='本月已用文档数'),
+        ),
+        migrations.AlterField(
+            model_name='usersubscription',
+            name='end_date',
+            field=models.DateTimeField(verbose_name='结束时间'),
+        ),
+        migrations.AlterField(
+            model_name='usersubscription',
+            name='plan',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='subscriptions.subscriptionplan', verbose_name='套餐'),
+        ),
+        migrations.AlterField(
+            model_name='usersubscription',
+            name='start_date',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='开始时间'),
+        ),
+        migrations.AlterField(
+            model_name='usersubscription',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='用户'),
+        ),
+        migrations.CreateModel(
+            name='PaymentHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='支付金额')),
+                ('currency', models.CharField(default='CNY', max_length=3, verbose_name='货币')),
+                ('payment_method', models.CharField(default='wechat', max_length=50, verbose_name='支付方式')),
+                ('stripe_payment_intent_id', models.CharField(blank=True, max_length=100, null=True, verbose_name='Stripe支付ID')),
+                ('status', models.CharField(default='pending', max_length=20, verbose_name='支付状态')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='subscriptions.subscriptionplan', verbose_name='套餐')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '支付记录',
+                'verbose_name_plural': '支付记录',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
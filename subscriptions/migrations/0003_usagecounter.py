@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0002_quota_and_schema_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsageCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateTimeField(verbose_name='周期开始')),
+                ('period_end', models.DateTimeField(verbose_name='周期结束')),
+                ('documents_used', models.IntegerField(default=0, verbose_name='已用文档数')),
+                ('documents_reserved', models.IntegerField(default=0, verbose_name='预留文档数')),
+                ('subscription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_counters', to='subscriptions.usersubscription', verbose_name='订阅')),
+            ],
+            options={
+                'verbose_name': '用量计数',
+                'verbose_name_plural': '用量计数',
+                'ordering': ['-period_start'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='usagecounter',
+            constraint=models.UniqueConstraint(fields=('subscription', 'period_start'), name='unique_usage_period'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 13:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0003_usagecounter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paymenthistory',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='payment_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-17 13:29
+
+from django.db import migrations
+from django.utils import timezone
+from subscriptions.billing import billing_period
+
+
+def carry_over_reservations(apps, schema_editor):
+    """Give reservations still held in the legacy column a usage counter
+
+    Only live (this calendar month) reservations are carried over, and
+    existing counters win, as in backfill_usage_counters, so nothing is
+    counted twice whichever of the two runs first.
+    """
+    UserSubscription = apps.get_model('subscriptions', 'UserSubscription')
+    UsageCounter = apps.get_model('subscriptions', 'UsageCounter')
+    now = timezone.localtime(timezone.now())
+    counters = []
+    for subscription in UserSubscription.objects.filter(documents_reserved__gt=0).iterator():
+        last_reset = timezone.localtime(subscription.last_reset_date)
+        if (last_reset.year, last_reset.month) != (now.year, now.month):
+            continue
+        period_start, period_end = billing_period(subscription.start_date, now)
+        counters.append(UsageCounter(
+            subscription_id=subscription.id,
+            period_start=period_start,
+            period_end=period_end,
+            documents_used=subscription.documents_used_this_month,
+            documents_reserved=subscription.documents_reserved,
+        ))
+    UsageCounter.objects.bulk_create(counters, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0004_payment_list_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(carry_over_reservations, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='usersubscription',
+            name='documents_reserved',
+        ),
+    ]
@@ -3,6 +3,8 @@ from django.db import models
 from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
+from django.utils.functional import cached_property
+from .billing import billing_period
 
 class SubscriptionPlan(models.Model):
     FREE = 'free'
@@ -60,7 +62,8 @@ class UserSubscription(models.Model):
     start_date = models.DateTimeField(default=timezone.now, verbose_name="开始时间")
     end_date = models.DateTimeField(verbose_name="结束时间")
     
-    # Usage tracking
+    # Legacy usage tracking, superseded by UsageCounter. No longer written;
+    # kept so backfill_usage_counters can migrate existing rows.
     documents_used_this_month = models.IntegerField(default=0, verbose_name="本月已用文档数")
     last_reset_date = models.DateTimeField(default=timezone.now, verbose_name="最后重置时间")
     
@@ -81,22 +84,29 @@ class UserSubscription(models.Model):
         """Check if subscription is active and not expired"""
         return self.status == self.ACTIVE and timezone.now() < self.end_date
 
-    def reset_monthly_usage(self):
-        """Reset monthly usage counter"""
-        now = timezone.now()
-        if now.month != self.last_reset_date.month or now.year != self.last_reset_date.year:
-            self.documents_used_this_month = 0
-            self.last_reset_date = now
-            self.save()
+    def current_period(self, at=None):
+        """Return (period_start, period_end) of the billing period containing at"""
+        return billing_period(self.start_date, at or timezone.now())
+
+    def get_usage(self, at=None):
+        """Return the usage counter for a billing period without writing anything"""
+        period_start, period_end = self.current_period(at)
+        counter = self.usage_counters.filter(period_start=period_start).first()
+        if counter is None:
+            counter = UsageCounter(subscription=self, period_start=period_start, period_end=period_end)
+        return counter
+
+    @cached_property
+    def documents_used_in_period(self):
+        return self.get_usage().documents_used
 
     def can_generate_document(self, word_count=0):
-        """Check if user can generate a new document"""
+        """Check if user can generate a new document (advisory; see subscriptions.quota)"""
         if not self.is_active():
             return False, "订阅已过期或已取消"
         
-        self.reset_monthly_usage()
-        
-        if self.documents_used_this_month >= self.plan.max_documents_per_month:
+        usage = self.get_usage()
+        if usage.documents_used + usage.documents_reserved >= self.plan.max_documents_per_month:
             return False, "本月文档生成次数已用完"
         
         if word_count > self.plan.max_words_per_document:
@@ -106,12 +116,42 @@ class UserSubscription(models.Model):
 
     def record_document_generation(self, word_count=0):
         """Record document generation and update usage"""
-        can_generate, message = self.can_generate_document(word_count)
-        if can_generate:
-            self.documents_used_this_month += 1
-            self.save()
-            return True
-        return False
+        from .quota import QuotaExceeded, commit, reserve
+        try:
+            period_start = reserve(self, word_count=word_count)
+        except QuotaExceeded:
+            return False
+        commit(self.user, period_start)
+        self.__dict__.pop('documents_used_in_period', None)
+        return True
+
+class UsageCounter(models.Model):
+    """Documents used in one billing period of a subscription
+    
+    Periods run monthly from the subscription's start_date anniversary and
+    are identified by their start, so past periods stay queryable.
+    """
+    subscription = models.ForeignKey(
+        UserSubscription,
+        on_delete=models.CASCADE,
+        related_name='usage_counters',
+        verbose_name="订阅"
+    )
+    period_start = models.DateTimeField(verbose_name="周期开始")
+    period_end = models.DateTimeField(verbose_name="周期结束")
+    documents_used = models.IntegerField(default=0, verbose_name="已用文档数")
+    documents_reserved = models.IntegerField(default=0, verbose_name="预留文档数")
+
+    class Meta:
+        verbose_name = "用量计数"
+        verbose_name_plural = "用量计数"
+        ordering = ['-period_start']
+        constraints = [
+            models.UniqueConstraint(fields=['subscription', 'period_start'], name='unique_usage_period'),
+        ]
+
+    def __str__(self):
+        return f"{self.subscription} {self.period_start:%Y-%m-%d}: {self.documents_used}"
 
 class PaymentHistory(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, verbose_name="用户")
@@ -127,6 +167,10 @@ class PaymentHistory(models.Model):
         verbose_name = "支付记录"
         verbose_name_plural = "支付记录"
         ordering = ['-created_at']
+        indexes = [
+            # Serves the keyset-paginated payment history
+            models.Index(fields=['user', '-created_at', '-id'], name='payment_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user} - {self.amount} {self.currency}"
\ No newline at end of file
@@ -0,0 +1,77 @@
+# subscriptions/quota.py
+from datetime import timedelta
+from django.db.models import F
+from django.utils import timezone
+from .models import SubscriptionPlan, UserSubscription, UsageCounter
+
+
+class QuotaExceeded(Exception):
+    """The user's plan does not allow the requested documents"""
+
+
+def get_subscription(user):
+    """Return the user's subscription, starting them on the free plan if they have none"""
+    subscription = UserSubscription.objects.select_related('plan').filter(user=user).first()
+    if subscription is None:
+        free_plan = SubscriptionPlan.objects.filter(tier=SubscriptionPlan.FREE, is_active=True).first()
+        if free_plan is None:
+            return None
+        subscription, _ = UserSubscription.objects.select_related('plan').get_or_create(
+            user=user,
+            defaults={'plan': free_plan, 'end_date': timezone.now() + timedelta(days=365 * 10)}
+        )
+    return subscription
+
+
+def reserve(subscription, count=1, word_count=0):
+    """Reserve quota for count documents and return the billing period start
+
+    Raises QuotaExceeded when the plan does not allow it. The check and the
+    increment are one conditional UPDATE on the period's counter, so
+    concurrent submits can never take more than the plan allows. Look the
+    subscription up with get_subscription before opening a transaction: when
+    reserve() issues the transaction's first statements, which are writes,
+    SQLite queues concurrent writers instead of failing them.
+    """
+    if subscription is None or not subscription.is_active():
+        raise QuotaExceeded("订阅已过期或已取消")
+
+    plan = subscription.plan
+    if word_count > plan.max_words_per_document:
+        raise QuotaExceeded(f"文档字数超过限制（最大{plan.max_words_per_document}字）")
+
+    # The first reservation of a period creates its counter
+    period_start, period_end = subscription.current_period()
+    UsageCounter.objects.bulk_create([
+        UsageCounter(subscription=subscription, period_start=period_start, period_end=period_end)
+    ], ignore_conflicts=True)
+
+    reserved = UsageCounter.objects.filter(
+        subscription=subscription,
+        period_start=period_start,
+        documents_used__lte=plan.max_documents_per_month - count - F('documents_reserved'),
+    ).update(documents_reserved=F('documents_reserved') + count)
+    if not reserved:
+        raise QuotaExceeded("本月文档生成次数已用完")
+    return period_start
+
+
+def _period_counter(user, period_start, count):
+    return UsageCounter.objects.filter(
+        subscription__user=user, period_start=period_start, documents_reserved__gte=count
+    )
+
+
+def commit(user, period_start, count=1):
+    """Turn reserved quota into used quota after a successful generation"""
+    return _period_counter(user, period_start, count).update(
+        documents_reserved=F('documents_reserved') - count,
+        documents_used=F('documents_used') + count,
+    )
+
+
+def release(user, period_start, count=1):
+    """Give reserved quota back after a failed generation"""
+    return _period_counter(user, period_start, count).update(
+        documents_reserved=F('documents_reserved') - count
+    )
@@ -34,6 +34,7 @@ class UserSubscriptionSerializer(serializers.ModelSerializer):
     is_active = serializers.SerializerMethodField()
     days_remaining = serializers.SerializerMethodField()
     usage_percentage = serializers.SerializerMethodField()
+    documents_used_this_month = serializers.IntegerField(source='documents_used_in_period', read_only=True)
 
     class Meta:
         model = UserSubscription
@@ -56,7 +57,7 @@ class UserSubscriptionSerializer(serializers.ModelSerializer):
 
     def get_usage_percentage(self, obj):
         if obj.plan.max_documents_per_month > 0:
-            return min(100, int((obj.documents_used_this_month / obj.plan.max_documents_per_month) * 100))
+            return min(100, int((obj.documents_used_in_period / obj.plan.max_documents_per_month) * 100))
         return 0
 
 class PaymentHistorySerializer(serializers.ModelSerializer):
@@ -1,3 +1,96 @@
-from django.test import TestCase
+import threading
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import quota
+from .billing import billing_period
+from .models import SubscriptionPlan, UsageCounter, UserSubscription
+
+
+class QuotaConcurrencyTests(TransactionTestCase):
+    """Quota reservations must hold under concurrent submits"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='quota@example.com', password='x')
+        self.plan = SubscriptionPlan.objects.create(
+            name='Basic', tier=SubscriptionPlan.BASIC, description='',
+            max_documents_per_month=5, max_words_per_document=5000,
+        )
+        self.subscription = UserSubscription.objects.create(
+            user=self.user, plan=self.plan, end_date=timezone.now() + timedelta(days=30)
+        )
+
+    def submit_concurrently(self, count):
+        barrier = threading.Barrier(count)
+        status_codes = []
+        lock = threading.Lock()
+
+        def submit(i):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            barrier.wait()
+            try:
+                response = client.post('/api/documents/generate/',
+                                       {'topic': f'Topic {i}', 'word_count': 1000}, format='json')
+                with lock:
+                    status_codes.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=submit, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return status_codes
+
+    @mock.patch('documents.views.publish_queued')
+    @mock.patch('documents.views.generate_document_task.apply_async')
+    def test_parallel_submits_never_exceed_plan_limit(self, apply_async, publish_queued):
+        status_codes = self.submit_concurrently(100)
+
+        self.assertEqual(status_codes.count(201), 5)
+        self.assertEqual(status_codes.count(403), 95)
+        self.assertEqual(apply_async.call_count, 5)
+        self.assertEqual(self.subscription.get_usage().documents_reserved, 5)
+
+    def test_usage_reads_do_not_write(self):
+        self.assertEqual(self.subscription.get_usage().documents_used, 0)
+        self.assertTrue(self.subscription.can_generate_document()[0])
+        self.assertFalse(UsageCounter.objects.exists())
+
+    def test_commit_and_release_settle_reservations(self):
+        period_start = quota.reserve(self.subscription, count=3)
+        quota.commit(self.user, period_start)
+        quota.release(self.user, period_start, count=2)
+
+        usage = self.subscription.get_usage()
+        self.assertEqual(usage.documents_used, 1)
+        self.assertEqual(usage.documents_reserved, 0)
+
+        quota.reserve(self.subscription, count=4)
+        with self.assertRaises(quota.QuotaExceeded):
+            quota.reserve(self.subscription)
+
+
+class BillingPeriodTests(SimpleTestCase):
+    def period(self, start, at):
+        tz = timezone.get_current_timezone()
+        start = datetime(*start, tzinfo=tz)
+        period_start, period_end = billing_period(start, datetime(*at, tzinfo=tz))
+        return period_start.timetuple()[:3], period_end.timetuple()[:3]
+
+    def test_periods_follow_start_date_anniversary(self):
+        self.assertEqual(self.period((2026, 1, 15), (2026, 3, 14, 23)), ((2026, 2, 15), (2026, 3, 15)))
+        self.assertEqual(self.period((2026, 1, 15), (2026, 3, 15)), ((2026, 3, 15), (2026, 4, 15)))
+        self.assertEqual(self.period((2025, 11, 20), (2026, 1, 5)), ((2025, 12, 20), (2026, 1, 20)))
+
+    def test_month_end_start_dates_are_clamped(self):
+        self.assertEqual(self.period((2026, 1, 31), (2026, 2, 28)), ((2026, 2, 28), (2026, 3, 31)))
+        self.assertEqual(self.period((2026, 1, 31), (2026, 4, 30)), ((2026, 4, 30), (2026, 5, 31)))
@@ -6,11 +6,17 @@ from rest_framework.response import Response
 from django.utils import timezone
 from datetime import timedelta
 from .models import SubscriptionPlan, UserSubscription, PaymentHistory
+from utils.pagination import ListQuerySerializer, filter_list, paginate_keyset
 from .serializers import (
     SubscriptionPlanSerializer, UserSubscriptionSerializer,
     PaymentHistorySerializer, SubscriptionUpgradeSerializer
 )
 
+# Columns read for payment list rows
+PAYMENT_LIST_FIELDS = (
+    'id', 'plan__name', 'amount', 'currency', 'payment_method', 'status', 'created_at',
+)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_subscription_plans(request):
@@ -105,10 +111,20 @@ def upgrade_subscription(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_payment_history(request):
-    """Get user's payment history"""
-    payments = PaymentHistory.objects.filter(user=request.user).order_by('-created_at')
-    serializer = PaymentHistorySerializer(payments, many=True)
-    return Response(serializer.data)
+    """Get user's payment history, newest first, one page at a time
+
+    Accepts status, start_date, end_date and search (plan name) filters.
+    """
+    params = ListQuerySerializer(data=request.query_params)
+    if not params.is_valid():
+        return Response(params.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    payments = filter_list(PaymentHistory.objects.filter(user=request.user),
+                           params.validated_data, search_fields=('plan__name',))
+    page = paginate_keyset(payments.select_related('plan').only(*PAYMENT_LIST_FIELDS),
+                           params.validated_data.get('cursor'), params.validated_data.get('page_size'))
+    serializer = PaymentHistorySerializer(page.items, many=True)
+    return Response(page.response_data(request, serializer.data))
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -160,10 +176,21 @@ def subscription_plans(request):
 
 @login_required
 def payment_history(request):
-    """User payment history"""
-    payments = PaymentHistory.objects.filter(user=request.user).order_by('-created_at')
-    
+    """User payment history, filtered and paginated on the server"""
+    params = ListQuerySerializer(data=request.GET)
+    filters = params.validated_data if params.is_valid() else {}
+    if params.errors:
+        messages.error(request, "筛选条件无效，已显示全部记录")
+
+    payments = filter_list(PaymentHistory.objects.filter(user=request.user),
+                           filters, search_fields=('plan__name',))
+    page = paginate_keyset(payments.select_related('plan').only(*PAYMENT_LIST_FIELDS),
+                           filters.get('cursor'), filters.get('page_size'))
+
     context = {
-        'payments': payments
+        'payments': page,
+        'filters': filters,
+        'next_query': page.query_string(request, page.next_cursor) if page.has_next else '',
+        'previous_query': page.query_string(request, page.previous_cursor) if page.has_previous else '',
     }
     return render(request, 'subscriptions/payment_history.html', context)
\ No newline at end of file
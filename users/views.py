@@ -309,9 +309,9 @@ def user_dashboard(request):
         'recent_activity': recent_tasks_data,
         'limits': {
             'max_documents': subscription.plan.max_documents_per_month if subscription else 5,
-            'documents_used': subscription.documents_used_this_month if subscription else 0,
+            'documents_used': subscription.documents_used_in_period if subscription else 0,
             'remaining_documents': (
-                subscription.plan.max_documents_per_month - subscription.documents_used_this_month 
+                subscription.plan.max_documents_per_month - subscription.documents_used_in_period 
                 if subscription else 5
             ),
         } if subscription else None
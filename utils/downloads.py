@@ -0,0 +1,240 @@
+# utils/downloads.py
+import mimetypes
+import os
+import re
+import zipfile
+from urllib.parse import quote
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def guess_content_type(file_path):
+    content_type, _ = mimetypes.guess_type(file_path)
+    return content_type or 'application/octet-stream'
+
+
+def file_etag(stat):
+    """Validator built from size and modification time, so no file hashing is needed"""
+    return f'"{stat.st_size:x}-{int(stat.st_mtime_ns):x}"'
+
+
+class RangeFileWrapper:
+    """Iterate over part of a file and close it when the response is closed"""
+
+    def __init__(self, file_obj, offset, length, chunk_size=CHUNK_SIZE):
+        self.file_obj = file_obj
+        self.remaining = length
+        self.chunk_size = chunk_size
+        self.file_obj.seek(offset)
+
+    def __iter__(self):
+        while self.remaining > 0:
+            data = self.file_obj.read(min(self.chunk_size, self.remaining))
+            if not data:
+                break
+            self.remaining -= len(data)
+            yield data
+
+    def close(self):
+        self.file_obj.close()
+
+
+class BaseDownloadStrategy:
+    """Turn a file on disk into a download response"""
+
+    def serve(self, request, file_path, filename, content_type):
+        raise NotImplementedError
+
+    def _headers(self, response, filename):
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+        return response
+
+
+class XAccelRedirectStrategy(BaseDownloadStrategy):
+    """Hand the transfer to nginx, which also handles Range and conditional GET
+
+    Needs an internal location mapping DOWNLOAD_ACCEL_PREFIX to MEDIA_ROOT:
+
+        location /protected-media/ { internal; alias /path/to/media/; }
+    """
+
+    def serve(self, request, file_path, filename, content_type):
+        prefix = getattr(settings, 'DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+        relative_path = os.path.relpath(file_path, settings.MEDIA_ROOT).replace(os.sep, '/')
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(relative_path)
+        return self._headers(response, filename)
+
+
+class XSendfileStrategy(BaseDownloadStrategy):
+    """Hand the transfer to Apache mod_xsendfile (or lighttpd)"""
+
+    def serve(self, request, file_path, filename, content_type):
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = os.path.abspath(file_path)
+        return self._headers(response, filename)
+
+
+class FileResponseStrategy(BaseDownloadStrategy):
+    """Serve from Django with ETag/Last-Modified validation and single byte ranges"""
+
+    def serve(self, request, file_path, filename, content_type):
+        stat = os.stat(file_path)
+        etag = file_etag(stat)
+        last_modified = int(stat.st_mtime)
+
+        byte_range = None
+        if request is not None:
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                return not_modified
+            byte_range = self._requested_range(request, stat.st_size, etag, last_modified)
+
+        if byte_range == 'unsatisfiable':
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+
+        file_obj = open(file_path, 'rb')
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                RangeFileWrapper(file_obj, start, end - start + 1),
+                status=206,
+                content_type=content_type
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+            response['Content-Length'] = str(end - start + 1)
+        else:
+            # FileResponse closes the file when the response is closed
+            response = FileResponse(file_obj, content_type=content_type)
+            response['Content-Length'] = str(stat.st_size)
+
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return self._headers(response, filename)
+
+    def _requested_range(self, request, size, etag, last_modified):
+        """Return (start, end) for a single satisfiable range, None for the whole file"""
+        header = request.META.get('HTTP_RANGE', '').strip()
+        if not header:
+            return None
+
+        # If-Range: only honour the range if the client's copy is current
+        if_range = request.META.get('HTTP_IF_RANGE', '').strip()
+        if if_range:
+            if if_range.startswith(('"', 'W/')):
+                if if_range != etag:
+                    return None
+            elif parse_http_date_safe(if_range) != last_modified:
+                return None
+
+        match = RANGE_PATTERN.match(header)
+        if not match:
+            return None  # Multiple or malformed ranges: send the whole file
+        first, last = match.groups()
+        if not first and not last:
+            return None
+
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(0, size - int(last))
+            end = size - 1
+
+        if start >= size or start > end:
+            return 'unsatisfiable'
+        return start, end
+
+
+DOWNLOAD_STRATEGIES = {
+    'django': FileResponseStrategy,
+    'x-accel-redirect': XAccelRedirectStrategy,
+    'x-sendfile': XSendfileStrategy,
+}
+
+
+def get_download_strategy(name=None):
+    """Return the strategy configured by DOWNLOAD_STRATEGY"""
+    name = name or getattr(settings, 'DOWNLOAD_STRATEGY', 'django')
+    try:
+        return DOWNLOAD_STRATEGIES[name]()
+    except KeyError:
+        raise Exception(f"Unknown download strategy: {name}")
+
+
+def serve_file(request, file_path, filename=None, content_type=None):
+    """Build the download response for a file on disk"""
+    filename = filename or os.path.basename(file_path)
+    if not content_type:
+        content_type = guess_content_type(filename)
+        if content_type.startswith('text/'):
+            content_type += '; charset=utf-8'
+    return get_download_strategy().serve(request, file_path, filename, content_type)
+
+
+class ZipStreamSink:
+    """Write-only, unseekable file object that hands written bytes to a generator
+
+    zipfile detects that it cannot seek and writes data descriptors after each
+    member instead of patching local headers, so the archive can be sent as it
+    is produced.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(entries, compression=zipfile.ZIP_STORED, chunk_size=CHUNK_SIZE):
+    """Yield a ZIP archive of (archive_name, file_path) entries as it is built
+
+    Only one chunk of one file is held at a time, so memory stays flat however
+    many files are included. Entries whose file is missing are skipped. Office
+    files are already compressed, hence ZIP_STORED by default.
+    """
+    sink = ZipStreamSink()
+    with zipfile.ZipFile(sink, 'w', compression=compression) as zf:
+        for archive_name, file_path in entries:
+            try:
+                source = open(file_path, 'rb')
+            except OSError as e:
+                print(f"ZIP export warning: {e}")
+                continue
+            with source:
+                info = zipfile.ZipInfo.from_file(file_path, archive_name)
+                info.compress_type = compression
+                with zf.open(info, 'w') as member:
+                    for chunk in iter(lambda: source.read(chunk_size), b''):
+                        member.write(chunk)
+                        data = sink.drain()
+                        if data:
+                            yield data
+            yield sink.drain()
+    yield sink.drain()
+
+
+def stream_zip_response(entries, filename):
+    """StreamingHttpResponse sending entries as a ZIP archive built on the fly"""
+    response = StreamingHttpResponse(stream_zip(entries), content_type='application/zip')
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
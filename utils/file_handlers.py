@@ -1,8 +1,7 @@
 # utils/file_handlers.py
 import os
 from django.conf import settings
-from django.http import HttpResponse
-from wsgiref.util import FileWrapper
+from utils.downloads import serve_file
 
 class FileHandler:
     @staticmethod
@@ -40,20 +39,13 @@ class FileHandler:
         return False
     
     @staticmethod
-    def create_download_response(file_field, filename=None):
-        """Create HTTP response for file download"""
+    def create_download_response(file_field, filename=None, request=None):
+        """Create HTTP response for file download using the configured DOWNLOAD_STRATEGY"""
         if not FileHandler.file_exists(file_field):
             return None
         
         file_path = FileHandler.get_file_path(file_field)
-        if not filename:
-            filename = os.path.basename(file_path)
-        
         try:
-            wrapper = FileWrapper(open(file_path, 'rb'))
-            response = HttpResponse(wrapper, content_type='application/octet-stream')
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            response['Content-Length'] = os.path.getsize(file_path)
-            return response
-        except IOError:
-            return None
\ No newline at end of file
+            return serve_file(request, file_path, filename)
+        except OSError:
+            return None
@@ -0,0 +1,172 @@
+# utils/pagination.py
+import base64
+import binascii
+import json
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(obj, reverse=False):
+    """Opaque cursor for the position of obj in a (created_at, id) ordering"""
+    payload = json.dumps([obj.created_at.isoformat(), obj.pk, int(reverse)])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (created_at, id, reverse) from a cursor made by encode_cursor"""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, pk, reverse = json.loads(payload)
+        created_at = parse_datetime(created_at)
+        if created_at is None:
+            raise ValueError(cursor)
+        return created_at, int(pk), bool(reverse)
+    except (binascii.Error, TypeError, ValueError):
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+
+
+def start_of_day(day):
+    """Midnight at the start of day, in the current time zone"""
+    moment = datetime.combine(day, time.min)
+    return timezone.make_aware(moment) if settings.USE_TZ else moment
+
+
+def filter_list(queryset, filters, search_fields=()):
+    """Apply the status, date range and search filters of ListQuerySerializer
+
+    Dates become created_at bounds rather than __date lookups, so the
+    (user, created_at, id) index still serves the query.
+    """
+    if filters.get('status'):
+        queryset = queryset.filter(status=filters['status'])
+    if filters.get('start_date'):
+        queryset = queryset.filter(created_at__gte=start_of_day(filters['start_date']))
+    if filters.get('end_date'):
+        queryset = queryset.filter(created_at__lt=start_of_day(filters['end_date'] + timedelta(days=1)))
+    if filters.get('search') and search_fields:
+        condition = Q()
+        for field in search_fields:
+            condition |= Q(**{f'{field}__icontains': filters['search']})
+        queryset = queryset.filter(condition)
+    return queryset
+
+
+class KeysetPage:
+    """One page of rows, newest first, with cursors to its neighbours"""
+
+    def __init__(self, items, next_cursor=None, previous_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def query_string(self, request, cursor):
+        """The request's query string, filters included, pointing at cursor"""
+        params = request.GET.copy()
+        params['cursor'] = cursor
+        return params.urlencode()
+
+    def link(self, request, cursor):
+        if cursor is None:
+            return None
+        return request.build_absolute_uri(f"{request.path}?{self.query_string(request, cursor)}")
+
+    def response_data(self, request, results):
+        """API envelope with absolute links to the neighbouring pages"""
+        return {
+            'next': self.link(request, self.next_cursor),
+            'previous': self.link(request, self.previous_cursor),
+            'results': results,
+        }
+
+
+def paginate_keyset(queryset, cursor=None, page_size=None):
+    """Return the KeysetPage of queryset that follows cursor
+
+    Rows are ordered by (created_at, id) descending and a page starts right
+    after the row its cursor points at, so every page costs one index range
+    scan however deep it is, and rows inserted meanwhile neither shift nor
+    repeat entries. Previous-page cursors walk the index the other way.
+    """
+    page_size = page_size or settings.REST_FRAMEWORK.get('PAGE_SIZE', 20)
+    reverse = False
+    if cursor:
+        created_at, pk, reverse = decode_cursor(cursor)
+        if reverse:
+            queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+        else:
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+
+    ordering = ('created_at', 'pk') if reverse else ('-created_at', '-pk')
+    # One extra row tells whether there is anything beyond this page
+    items = list(queryset.order_by(*ordering)[:page_size + 1])
+    more = len(items) > page_size
+    items = items[:page_size]
+    if reverse:
+        items.reverse()
+        has_next, has_previous = True, more
+    else:
+        has_next, has_previous = more, bool(cursor)
+
+    if not items:
+        return KeysetPage(items)
+    return KeysetPage(
+        items,
+        next_cursor=encode_cursor(items[-1]) if has_next else None,
+        previous_cursor=encode_cursor(items[0], reverse=True) if has_previous else None,
+    )
+
+
+class ListQuerySerializer(serializers.Serializer):
+    """Query parameters shared by the cursor-paginated list endpoints"""
+    cursor = serializers.CharField(required=False)
+    page_size = serializers.IntegerField(required=False, min_value=1)
+    status = serializers.CharField(required=False, max_length=20)
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+    search = serializers.CharField(required=False, max_length=200)
+
+    def to_internal_value(self, data):
+        # Filter forms submit their empty fields too
+        data = {key: value for key, value in data.items() if value != ''}
+        return super().to_internal_value(data)
+
+    def validate_cursor(self, value):
+        try:
+            decode_cursor(value)
+        except InvalidCursor as e:
+            raise serializers.ValidationError(str(e))
+        return value
+
+    def validate_page_size(self, value):
+        return min(value, getattr(settings, 'LIST_MAX_PAGE_SIZE', 100))
+
+    def validate(self, data):
+        if data.get('start_date') and data.get('end_date') and data['start_date'] > data['end_date']:
+            raise serializers.ValidationError("start_date must not be after end_date")
+        return data
@@ -11,6 +11,22 @@ app = Celery('wps_auto')
 # the configuration object to child processes.
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
+# Generation tasks are routed by subscription plan (documents/routing.py) onto
+# the queues declared in CELERY_TASK_QUEUES. Run a dedicated worker pool per
+# queue so paid work never waits behind the free tier:
+#
+#   celery -A wps_auto worker -Q priority -n priority@%h --concurrency=4
+#   celery -A wps_auto worker -Q standard -n standard@%h --concurrency=2
+#   celery -A wps_auto worker -Q free -n free@%h --concurrency=1
+#
+# Scale the priority pool first; the free pool can be shrunk or paused
+# without affecting paid plans.
+#
+# Format conversions (PDF via LibreOffice) are CPU-bound and get a separate
+# prefork pool, sized to the cores left over by the generation workers:
+#
+#   celery -A wps_auto worker -Q conversion -n conversion@%h --concurrency=4
+
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks()
 
@@ -69,6 +69,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file (not in-memory) test database, so concurrency tests get
+        # SQLite's busy timeout instead of immediate table-lock errors
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -117,6 +120,12 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# How downloads are sent: 'django' streams from the app with Range and
+# conditional GET support, 'x-accel-redirect' hands the file to nginx (internal
+# location DOWNLOAD_ACCEL_PREFIX aliased to MEDIA_ROOT), 'x-sendfile' to Apache
+DOWNLOAD_STRATEGY = os.getenv('DOWNLOAD_STRATEGY', 'django')
+DOWNLOAD_ACCEL_PREFIX = os.getenv('DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -133,6 +142,10 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20,
 }
 
+# Largest page_size a client may ask of the cursor-paginated lists
+# (tasks, payments); PAGE_SIZE above is the default
+LIST_MAX_PAGE_SIZE = 100
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -171,4 +184,131 @@ CELERY_RESULT_BACKEND = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
-CELERY_TIMEZONE = 'Asia/Shanghai'
\ No newline at end of file
+CELERY_TIMEZONE = 'Asia/Shanghai'
+
+# Tier-aware task queues. Each queue is consumed by its own worker pool
+# (see wps_auto/celery.py), so a free-tier backlog never occupies the
+# workers that serve paid plans.
+from kombu import Exchange, Queue
+
+CELERY_TASK_QUEUES = (
+    Queue('priority', Exchange('priority'), routing_key='priority',
+          queue_arguments={'x-max-priority': 10}),
+    Queue('standard', Exchange('standard'), routing_key='standard',
+          queue_arguments={'x-max-priority': 10}),
+    Queue('free', Exchange('free'), routing_key='free',
+          queue_arguments={'x-max-priority': 10}),
+    # Format conversions run on their own pool, apart from AI and rendering work
+    Queue('conversion', Exchange('conversion'), routing_key='conversion'),
+)
+CELERY_TASK_DEFAULT_QUEUE = 'standard'
+CELERY_TASK_ROUTES = {
+    'documents.tasks.generate_document_task': {'queue': 'standard'},
+    'documents.tasks.convert_document_task': {'queue': 'conversion'},
+}
+# Redis emulates broker priorities with one list per priority step
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'queue_order_strategy': 'priority',
+    'priority_steps': list(range(10)),
+}
+# Reserve one task at a time so a busy worker doesn't hold queued work
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_ACKS_LATE = True
+
+# Largest number of documents accepted by one batch generation request
+DOCUMENT_BATCH_MAX_SIZE = int(os.getenv('DOCUMENT_BATCH_MAX_SIZE', '500'))
+# Most documents one streamed ZIP export may contain
+DOCUMENT_EXPORT_MAX_FILES = int(os.getenv('DOCUMENT_EXPORT_MAX_FILES', '1000'))
+# Length of the plain-text preview excerpt, in characters
+DOCUMENT_PREVIEW_TEXT_CHARS = int(os.getenv('DOCUMENT_PREVIEW_TEXT_CHARS', '2000'))
+
+# Format conversion (PDF via LibreOffice headless, HTML and Markdown from the
+# document's sections). A pending conversion older than the timeout is re-queued.
+LIBREOFFICE_BINARY = os.getenv('LIBREOFFICE_BINARY', 'soffice')
+DOCUMENT_CONVERSION_TIMEOUT = int(os.getenv('DOCUMENT_CONVERSION_TIMEOUT', '120'))
+
+# Task progress events (Redis pub/sub, streamed to browsers over SSE)
+PROGRESS_REDIS_URL = os.getenv('PROGRESS_REDIS_URL', CELERY_BROKER_URL)
+PROGRESS_EVENT_TTL = int(os.getenv('PROGRESS_EVENT_TTL', '3600'))
+# Each open stream holds a server thread; browsers reconnect when it ends
+PROGRESS_STREAM_TIMEOUT = int(os.getenv('PROGRESS_STREAM_TIMEOUT', '300'))
+PROGRESS_HEARTBEAT_INTERVAL = int(os.getenv('PROGRESS_HEARTBEAT_INTERVAL', '15'))
+
+# Document rendering configuration
+# 'wps' drives WPS Office over COM (Windows only), 'docx' renders with python-docx
+DOCUMENT_RENDERER_BACKEND = os.getenv('DOCUMENT_RENDERER_BACKEND', 'wps')
+
+# Warm WPS application pool (one pool per Celery worker process)
+WPS_POOL_ENABLED = os.getenv('WPS_POOL_ENABLED', 'False') == 'True'
+WPS_POOL_MAX_SIZE = int(os.getenv('WPS_POOL_MAX_SIZE', '2'))
+WPS_POOL_MIN_SPARES = int(os.getenv('WPS_POOL_MIN_SPARES', '1'))
+WPS_POOL_MAX_DOCUMENTS = int(os.getenv('WPS_POOL_MAX_DOCUMENTS', '50'))
+WPS_POOL_ACQUIRE_TIMEOUT = int(os.getenv('WPS_POOL_ACQUIRE_TIMEOUT', '120'))
+
+# Build the document body off-COM and insert it with a single InsertFile call.
+# When off, elements are inserted one by one (tables with one ConvertToTable call)
+WPS_BULK_ASSEMBLY = os.getenv('WPS_BULK_ASSEMBLY', 'True') == 'True'
+
+# DeepSeek AI configuration
+DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY', '')
+DEEPSEEK_BASE_URL = os.getenv('DEEPSEEK_BASE_URL', 'https://api.deepseek.com/v1')
+# Stream completions and render each section as soon as it is finished
+DEEPSEEK_STREAMING = os.getenv('DEEPSEEK_STREAMING', 'False') == 'True'
+# 'single' asks for the whole document in one completion, 'parallel' requests an
+# outline and generates the sections concurrently (always used for priority plans)
+DEEPSEEK_GENERATION_MODE = os.getenv('DEEPSEEK_GENERATION_MODE', 'single')
+DEEPSEEK_MAX_PARALLEL_SECTIONS = int(os.getenv('DEEPSEEK_MAX_PARALLEL_SECTIONS', '4'))
+DEEPSEEK_SECTION_RETRIES = int(os.getenv('DEEPSEEK_SECTION_RETRIES', '2'))
+DEEPSEEK_SECTION_MAX_TOKENS = int(os.getenv('DEEPSEEK_SECTION_MAX_TOKENS', '2000'))
+
+# AI response cache: an in-process LRU in front of a shared tier (Redis when
+# AI_CACHE_REDIS_URL is set, otherwise files on local disk)
+AI_CACHE_ENABLED = os.getenv('AI_CACHE_ENABLED', 'True') == 'True'
+AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', str(60 * 60 * 24)))
+AI_CACHE_MAX_ENTRIES = int(os.getenv('AI_CACHE_MAX_ENTRIES', '256'))
+AI_CACHE_MAX_BYTES = int(os.getenv('AI_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+AI_CACHE_REDIS_URL = os.getenv('AI_CACHE_REDIS_URL', '')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'ai_responses': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': AI_CACHE_REDIS_URL,
+        'TIMEOUT': AI_CACHE_TTL,
+    } if AI_CACHE_REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'ai_responses'),
+        'TIMEOUT': AI_CACHE_TTL,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
+# AI backend HTTP client: pooled keep-alive connections, retries on 429/5xx
+# with jittered exponential backoff, and a circuit breaker shared via the cache
+AI_HTTP_POOL_SIZE = int(os.getenv('AI_HTTP_POOL_SIZE', '10'))
+AI_HTTP_MAX_RETRIES = int(os.getenv('AI_HTTP_MAX_RETRIES', '3'))
+AI_HTTP_BACKOFF_BASE = float(os.getenv('AI_HTTP_BACKOFF_BASE', '1.0'))
+AI_HTTP_BACKOFF_MAX = float(os.getenv('AI_HTTP_BACKOFF_MAX', '20.0'))
+AI_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('AI_CIRCUIT_FAILURE_THRESHOLD', '5'))
+AI_CIRCUIT_RESET_TIMEOUT = int(os.getenv('AI_CIRCUIT_RESET_TIMEOUT', '30'))
+AI_METRICS_CACHE_ALIAS = 'ai_responses'
+
+# Compiled DocumentTemplate skeletons kept per worker process
+TEMPLATE_CACHE_MAX_ENTRIES = int(os.getenv('TEMPLATE_CACHE_MAX_ENTRIES', '32'))
+
+# Chart images for [图表位置] markers: data from the AI service, drawn with Pillow
+# on a per-process thread pool and cached on disk by spec hash
+CHART_RENDER_WORKERS = int(os.getenv('CHART_RENDER_WORKERS', '4'))
+CHART_CACHE_DIR = os.getenv('CHART_CACHE_DIR', os.path.join(MEDIA_ROOT, 'charts'))
+# A font with CJK glyphs; common Windows and Linux fonts are tried when unset
+CHART_FONT_PATH = os.getenv('CHART_FONT_PATH', '')
+CHART_MAX_PER_DOCUMENT = int(os.getenv('CHART_MAX_PER_DOCUMENT', '10'))
+CHART_WIDTH = int(os.getenv('CHART_WIDTH', '800'))
+CHART_HEIGHT = int(os.getenv('CHART_HEIGHT', '480'))
+
+# Formula markers ([公式位置]): LaTeX from the AI service converted to native
+# Office Math, memoized per process on the normalized LaTeX
+FORMULA_CACHE_SIZE = int(os.getenv('FORMULA_CACHE_SIZE', '1024'))
+FORMULA_MAX_PER_DOCUMENT = int(os.getenv('FORMULA_MAX_PER_DOCUMENT', '20'))